@@ -1,25 +1,206 @@
-import requests
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytz
 from streamlit import cache_data
 
+import timetable_cache
+from batch import compare_methods, row_to_timings
+from astro import compute_prayer_times
+from config import ALADHAN_API_URL, ALADHAN_PAGE_DEADLINE, METHOD_NAMES, PRAYER_TIME_SOURCE, TIMETABLE_STORE_PATH
+from instrumentation import timed
+from tz_index import get_tz, timezone_at
+
+# Background Aladhan refreshes for stale-while-revalidate, one per key at a time
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="aladhan-refresh")
+_refresh_lock = threading.Lock()
+_refreshing = set()
+
+# Opened on first use when TIMETABLE_STORE_PATH is set; False if it failed to open
+_store = None
+_store_lock = threading.Lock()
+
+
+def fetch_aladhan_month(lat, lon, method, school, year, month, deadline=None):
+    """
+    Fetches a whole month from Aladhan's calendar endpoint in one request.
+    Returns (days, timezone) where days maps date -> timings. `deadline`
+    (time.monotonic()) bounds the call; see http_client.get_json.
+    """
+    # requests (via http_client) is only loaded once Aladhan is actually needed
+    from http_client import get_json
 
-@cache_data(ttl=3600)
-def fetch_prayer_times(lat, lon, method, school):
     url = (
-      f"https://api.aladhan.com/v1/timings"
+      f"{ALADHAN_API_URL}/v1/calendar/{year}/{month}"
       f"?latitude={lat}&longitude={lon}"
       f"&method={method}&school={school}"
     )
-    resp = requests.get(url, timeout=10)
-    resp.raise_for_status()
-    raw = resp.json()  # DEBUG: show the entire response
-    print("🛠️ Raw Aladhan response:", raw)
-    
-    data = raw["data"]
-    print("🔑 Keys in data:", list(data.keys()))
-    print("⏲️ Keys in timings:", list(data["timings"].keys()))
-    print("🌐 Keys in meta:", list(data["meta"].keys()))
-
-   
-    
-
-    return data["timings"], data["meta"]["timezone"]
+    entries = get_json(url, timeout=10, deadline=deadline)["data"]
+
+    timezone = entries[0]["meta"]["timezone"]
+    days = {}
+    for entry in entries:
+        day = datetime.strptime(entry["date"]["gregorian"]["date"], "%d-%m-%Y").date()
+        # Calendar timings carry a zone suffix, e.g. "05:09 (+03)"
+        days[day] = {k: v.split(" ")[0] for k, v in entry["timings"].items()}
+    return days, timezone
+
+
+def prefetch_month(lat, lon, method, school, year, month, deadline=None):
+    """Pulls a month from Aladhan into the persistent cache. Returns (days, timezone)."""
+    days, timezone = fetch_aladhan_month(lat, lon, method, school, year, month, deadline)
+    timetable_cache.put_many(lat, lon, method, school, timezone, days)
+    return days, timezone
+
+
+def _fetch_today_from_aladhan(lat, lon, method, school, deadline=None):
+    """Fills the current month from Aladhan. Returns (timings, timezone, local_date)."""
+    utc_today = datetime.now(pytz.utc).date()
+    days, timezone = prefetch_month(lat, lon, method, school, utc_today.year, utc_today.month, deadline)
+    today = datetime.now(get_tz(timezone)).date()
+    if today not in days:
+        # Local date is already in the next (or previous) month
+        days, timezone = prefetch_month(lat, lon, method, school, today.year, today.month, deadline)
+    return days[today], timezone, today
+
+
+def _refresh(key, lat, lon, method, school):
+    import requests
+
+    try:
+        _fetch_today_from_aladhan(lat, lon, method, school)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Background refresh failed ({e}); still serving the cached timetable.")
+    finally:
+        with _refresh_lock:
+            _refreshing.discard(key)
+
+
+def _refresh_in_background(lat, lon, method, school, day):
+    key = (timetable_cache.geohash(lat, lon), method, school, day)
+    with _refresh_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    _refresh_executor.submit(_refresh, key, lat, lon, method, school)
+
+
+def _timetable_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    from timetable_store import TimetableStore
+                    _store = TimetableStore(TIMETABLE_STORE_PATH) if TIMETABLE_STORE_PATH else False
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Timetable store unavailable ({e}); ignoring it.")
+                    _store = False
+    return _store
+
+
+def stored_timings(lat, lon, method, school, day=None):
+    """
+    (timings, timezone, day) from the binary timetable store, or None when
+    no store is configured or it lacks this location or day. `day` defaults
+    to today in the location's timezone; timings is a read-only mapping.
+    """
+    store = _timetable_store()
+    if not store:
+        return None
+    i = store.find(lat, lon, method, school)
+    if i is None:
+        return None
+    timezone = store.timezone(i)
+    day = day or datetime.now(get_tz(timezone)).date()
+    timings = store.timings(i, day)
+    return (timings, timezone, day) if timings is not None else None
+
+
+@timed()
+def get_prayer_times(lat, lon, method, school, timezone=None):
+    """
+    Returns (timings, timezone, freshness) for today without waiting on a
+    slow or failing Aladhan when an older timetable for this location exists.
+
+    freshness = {"source": ..., "as_of": date or None, "stale": bool}, where
+    source is "store", "cache", "nearby" (a cached neighbour's timetable, see
+    timetable_cache.get_nearby), "local", "aladhan", "stale" (last known timetable,
+    refresh running in the background) or "fallback" (local engine because
+    Aladhan failed or its circuit breaker is open).
+    """
+    stored = stored_timings(lat, lon, method, school)
+    if stored:
+        timings, timezone, today = stored
+        return timings, timezone, {"source": "store", "as_of": today, "stale": False}
+
+    # Only a polygon-built index is trusted here; without one, Aladhan's
+    # meta.timezone decides and is recorded for the cell
+    timezone = timezone or timetable_cache.get_timezone(lat, lon) or timezone_at(lat, lon, exact=True)
+    if timezone:
+        today = datetime.now(get_tz(timezone)).date()
+        cached = timetable_cache.get(lat, lon, method, school, today)
+        if cached:
+            return cached[0], cached[1], {"source": "cache", "as_of": today, "stale": False}
+        if PRAYER_TIME_SOURCE == "local":
+            timings, timezone = compute_prayer_times(lat, lon, method, school, timezone, today)
+            timetable_cache.put(lat, lon, method, school, today, timings, timezone)
+            return timings, timezone, {"source": "local", "as_of": today, "stale": False}
+        # Checking a neighbour's error takes two engine runs, so this only
+        # pays off against an Aladhan call, not the local engine above
+        nearby = timetable_cache.get_nearby(lat, lon, method, school, today, timezone)
+        if nearby:
+            return nearby[0], timezone, {"source": "nearby", "as_of": today, "stale": False}
+        latest = timetable_cache.get_latest(lat, lon, method, school, today)
+        if latest:
+            as_of, timings, timezone = latest
+            _refresh_in_background(lat, lon, method, school, today)
+            return timings, timezone, {"source": "stale", "as_of": as_of, "stale": True}
+
+    import requests
+
+    try:
+        # The page waits ALADHAN_PAGE_DEADLINE at most; a hung Aladhan is not retried here
+        deadline = time.monotonic() + ALADHAN_PAGE_DEADLINE
+        timings, timezone, today = _fetch_today_from_aladhan(lat, lon, method, school, deadline)
+        return timings, timezone, {"source": "aladhan", "as_of": today, "stale": False}
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Aladhan unavailable ({e}); computing prayer times locally.")
+        timings, timezone = compute_prayer_times(lat, lon, method, school, timezone or timezone_at(lat, lon))
+        return timings, timezone, {"source": "fallback", "as_of": None, "stale": False}
+
+
+@cache_data(ttl=3600)
+@timed()
+def fetch_prayer_times(lat, lon, method, school, timezone=None):
+    """
+    Returns (timings, timezone) for today; see get_prayer_times for how the
+    persistent cache, the local engine and Aladhan are combined.
+    """
+    timings, timezone, _ = get_prayer_times(lat, lon, method, school, timezone)
+    return dict(timings), timezone
+
+
+@cache_data(ttl=86400, max_entries=1000)
+def fetch_method_comparison(lat, lon, timezone, day):
+    """
+    Today's times for `day` under every method in METHOD_NAMES, computed
+    locally in one pass and cached per location-day. Returns one row per
+    method: {"Method", "Fajr", "Sunrise", "Dhuhr", "Asr", "Asr (Hanafi)",
+    "Maghrib", "Isha"}; only Asr depends on the madhab.
+    """
+    pairs, table = compare_methods(lat, lon, day, timezone, list(METHOD_NAMES))
+    rows = {}
+    for (method, school), minutes in zip(pairs, table):
+        timings = row_to_timings(minutes)
+        if school == 1:
+            rows[method]["Asr (Hanafi)"] = timings["Asr"]
+            continue
+        rows[method] = {"Method": METHOD_NAMES[method], "Fajr": timings["Fajr"],
+                        "Sunrise": timings["Sunrise"], "Dhuhr": timings["Dhuhr"],
+                        "Asr": timings["Asr"], "Asr (Hanafi)": None,
+                        "Maghrib": timings["Maghrib"], "Isha": timings["Isha"]}
+    return list(rows.values())
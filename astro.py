@@ -0,0 +1,255 @@
+# astro.py
+"""
+Local astronomical prayer-time engine.
+
+Follows the PrayTimes.org algorithm used by Aladhan, so results line up with
+api.aladhan.com to the minute without a network round trip.
+"""
+import math
+from datetime import datetime
+
+import pytz
+
+from config import METHOD_PARAMS, ASR_FACTORS, IMSAK_MINUTES
+
+# Sun altitude (degrees below horizon) at sunrise/sunset incl. refraction
+SUNRISE_ANGLE = 0.833
+
+# Aladhan response keys, in the order the API returns them
+TIMING_KEYS = [
+    "Fajr", "Sunrise", "Dhuhr", "Asr", "Sunset", "Maghrib",
+    "Isha", "Imsak", "Midnight", "Firstthird", "Lastthird",
+]
+
+
+# ---------- degree-based trigonometry ----------
+
+def _sin(d): return math.sin(math.radians(d))
+def _cos(d): return math.cos(math.radians(d))
+def _tan(d): return math.tan(math.radians(d))
+def _arcsin(x): return math.degrees(math.asin(x))
+def _arccos(x): return math.degrees(math.acos(x))
+def _arccot(x): return math.degrees(math.atan(1 / x))
+def _arctan2(y, x): return math.degrees(math.atan2(y, x))
+
+
+def _fix(a, b):
+    if math.isnan(a):
+        return a
+    a = a - b * math.floor(a / b)
+    return a + b if a < 0 else a
+
+
+def _time_diff(t1, t2):
+    return _fix(t2 - t1, 24)
+
+
+# ---------- solar position ----------
+
+def julian_date(year, month, day):
+    """Julian date at 0h UT for a Gregorian calendar date."""
+    if month <= 2:
+        year -= 1
+        month += 12
+    a = math.floor(year / 100)
+    b = 2 - a + math.floor(a / 4)
+    return math.floor(365.25 * (year + 4716)) + math.floor(30.6001 * (month + 1)) + day + b - 1524.5
+
+
+def sun_position(jd):
+    """Returns (declination in degrees, equation of time in hours) for a Julian date."""
+    d = jd - 2451545.0
+    g = _fix(357.529 + 0.98560028 * d, 360)
+    q = _fix(280.459 + 0.98564736 * d, 360)
+    l = _fix(q + 1.915 * _sin(g) + 0.020 * _sin(2 * g), 360)
+    e = 23.439 - 0.00000036 * d
+
+    ra = _arctan2(_cos(e) * _sin(l), _cos(l)) / 15
+    eqt = q / 15 - _fix(ra, 24)
+    decl = _arcsin(_sin(e) * _sin(l))
+    return decl, eqt
+
+
+def _mid_day(jdate, portion):
+    _, eqt = sun_position(jdate + portion)
+    return _fix(12 - eqt, 24)
+
+
+def _sun_angle_time(jdate, lat, angle, portion, ccw=False):
+    """Hour at which the sun is `angle` degrees below the horizon (NaN if never)."""
+    decl, _ = sun_position(jdate + portion)
+    noon = _mid_day(jdate, portion)
+    cos_t = (-_sin(angle) - _sin(decl) * _sin(lat)) / (_cos(decl) * _cos(lat))
+    if not -1 <= cos_t <= 1:
+        return float("nan")
+    t = _arccos(cos_t) / 15
+    return noon + (-t if ccw else t)
+
+
+def _asr_time(jdate, lat, factor, portion):
+    decl, _ = sun_position(jdate + portion)
+    angle = -_arccot(factor + _tan(abs(lat - decl)))
+    return _sun_angle_time(jdate, lat, angle, portion)
+
+
+# ---------- moonsighting committee seasonal rules ----------
+
+def _days_since_solstice(day, lat):
+    day_of_year = day.timetuple().tm_yday
+    days_in_year = 366 if (day.year % 4 == 0 and day.year % 100 != 0) or day.year % 400 == 0 else 365
+    if lat >= 0:
+        dyy = day_of_year + 10
+        return dyy - days_in_year if dyy >= days_in_year else dyy
+    dyy = day_of_year - (173 if days_in_year == 366 else 172)
+    return dyy + days_in_year if dyy < 0 else dyy
+
+
+def _seasonal_minutes(dyy, a, b, c, d):
+    if dyy < 91:
+        return a + (b - a) / 91 * dyy
+    if dyy < 137:
+        return b + (c - b) / 46 * (dyy - 91)
+    if dyy < 183:
+        return c + (d - c) / 46 * (dyy - 137)
+    if dyy < 229:
+        return d + (c - d) / 46 * (dyy - 183)
+    if dyy < 275:
+        return c + (b - c) / 46 * (dyy - 229)
+    return b + (a - b) / 91 * (dyy - 275)
+
+
+def moonsighting_fajr_minutes(day, lat):
+    """Minutes before sunrise for Fajr under the Moonsighting Committee rules."""
+    k = abs(lat) / 55
+    return _seasonal_minutes(_days_since_solstice(day, lat),
+                             75 + 28.65 * k, 75 + 19.44 * k, 75 + 32.74 * k, 75 + 48.10 * k)
+
+
+def moonsighting_isha_minutes(day, lat):
+    """Minutes after sunset for Isha (general shafaq) under the Moonsighting Committee rules."""
+    k = abs(lat) / 55
+    return _seasonal_minutes(_days_since_solstice(day, lat),
+                             75 + 25.60 * k, 75 + 2.050 * k, 75 - 9.21 * k, 75 + 6.14 * k)
+
+
+# ---------- prayer times ----------
+
+def _adjust_high_lat(time, base, angle, night, ccw=False):
+    """Angle-based high latitude rule (Aladhan's default latitudeAdjustmentMethod=3)."""
+    portion = angle / 60 * night
+    if math.isnan(time):
+        return base + (-portion if ccw else portion)
+    diff = _time_diff(time, base) if ccw else _time_diff(base, time)
+    if diff > portion:
+        return base + (-portion if ccw else portion)
+    return time
+
+
+def compute_day(lat, lon, method, school, day, utc_offset):
+    """
+    Computes prayer times for one day as local hours (floats).
+    `utc_offset` is the location's offset from UTC in hours on `day`.
+    """
+    params = METHOD_PARAMS.get(method, METHOD_PARAMS[3])
+    factor = ASR_FACTORS.get(school, 1)
+    jdate = julian_date(day.year, day.month, day.day) - lon / (15 * 24)
+
+    fajr_angle = params["fajr"]
+    isha_angle = params.get("isha")
+    maghrib_angle = params.get("maghrib", SUNRISE_ANGLE)
+
+    # Single refinement step starting from nominal times, as PrayTimes does
+    fajr = _sun_angle_time(jdate, lat, fajr_angle, 5 / 24, ccw=True)
+    sunrise = _sun_angle_time(jdate, lat, SUNRISE_ANGLE, 6 / 24, ccw=True)
+    dhuhr = _mid_day(jdate, 12 / 24)
+    asr = _asr_time(jdate, lat, factor, 13 / 24)
+    sunset = _sun_angle_time(jdate, lat, SUNRISE_ANGLE, 18 / 24)
+    maghrib = _sun_angle_time(jdate, lat, maghrib_angle, 18 / 24)
+    isha = _sun_angle_time(jdate, lat, isha_angle, 18 / 24) if isha_angle is not None else float("nan")
+
+    shift = utc_offset - lon / 15
+    fajr, sunrise, dhuhr, asr, sunset, maghrib, isha = (
+        t + shift for t in (fajr, sunrise, dhuhr, asr, sunset, maghrib, isha)
+    )
+
+    night = _time_diff(sunset, sunrise)
+    fajr = _adjust_high_lat(fajr, sunrise, fajr_angle, night, ccw=True)
+    if "maghrib" in params:
+        maghrib = _adjust_high_lat(maghrib, sunset, maghrib_angle, night)
+    if isha_angle is not None:
+        isha = _adjust_high_lat(isha, sunset, isha_angle, night)
+
+    if params.get("shafaq"):
+        safe_fajr = sunrise - moonsighting_fajr_minutes(day, lat) / 60
+        if math.isnan(fajr) or safe_fajr > fajr:
+            fajr = safe_fajr
+        safe_isha = sunset + moonsighting_isha_minutes(day, lat) / 60
+        if math.isnan(isha) or safe_isha < isha:
+            isha = safe_isha
+
+    maghrib += params.get("maghrib_minutes", 0) / 60
+    if "isha_minutes" in params:
+        isha = maghrib + params["isha_minutes"] / 60
+    imsak = fajr - IMSAK_MINUTES / 60
+
+    # Aladhan's midnightMode defaults to Standard (sunset to sunrise) for every
+    # method; "jafari" (sunset to Fajr) is its midnightMode=1. The thirds
+    # divide the same night.
+    if params.get("midnight") == "jafari":
+        night = _time_diff(sunset, fajr)
+
+    return {
+        "Fajr": fajr,
+        "Sunrise": sunrise,
+        "Dhuhr": dhuhr,
+        "Asr": asr,
+        "Sunset": sunset,
+        "Maghrib": maghrib,
+        "Isha": isha,
+        "Imsak": imsak,
+        "Midnight": sunset + night / 2,
+        "Firstthird": sunset + night / 3,
+        "Lastthird": sunset + night * 2 / 3,
+    }
+
+
+def format_time(hours):
+    """Formats float hours as Aladhan's "HH:MM" (rounded to the nearest minute)."""
+    if math.isnan(hours):
+        return "-----"
+    hours = _fix(hours + 0.5 / 60, 24)
+    h = math.floor(hours)
+    m = math.floor((hours - h) * 60)
+    return f"{h:02d}:{m:02d}"
+
+
+def utc_offset_hours(timezone, day):
+    """UTC offset of `timezone` (IANA name) at local noon on `day`, in hours."""
+    tz = pytz.timezone(timezone)
+    return tz.utcoffset(datetime(day.year, day.month, day.day, 12)).total_seconds() / 3600
+
+
+def compute_prayer_times(lat, lon, method, school, timezone, day=None):
+    """
+    Offline equivalent of api.fetch_prayer_times.
+    Returns (timings, timezone) where timings maps prayer -> "HH:MM".
+    `day` defaults to today in `timezone`.
+    """
+    if day is None:
+        day = datetime.now(pytz.timezone(timezone)).date()
+    elif isinstance(day, datetime):
+        day = day.date()
+    hours = compute_day(lat, lon, method, school, day, utc_offset_hours(timezone, day))
+    return {key: format_time(hours[key]) for key in TIMING_KEYS}, timezone
+
+
+def nominal_timezone(lon):
+    """
+    Fixed-offset Etc/GMT zone nearest to the solar meridian of `lon`.
+    Last resort when neither the caller nor the API can supply a real zone.
+    """
+    offset = int(round(lon / 15))
+    if offset == 0:
+        return "Etc/GMT"
+    # Etc/GMT zones use POSIX sign convention: Etc/GMT-3 is UTC+3
+    return f"Etc/GMT{'-' if offset > 0 else '+'}{abs(offset)}"
@@ -0,0 +1,257 @@
+# batch.py
+"""
+Vectorized timetable generation for many locations over a date range.
+
+Same algorithm as astro.py, evaluated as one NumPy pass over
+locations x days. Solar declination and equation of time are computed once
+per day and shared by every location; each location only interpolates them
+to its own longitude.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytz
+
+from astro import SUNRISE_ANGLE, TIMING_KEYS
+from config import METHOD_PARAMS, ASR_FACTORS, IMSAK_MINUTES
+
+# Sentinel for times that do not occur (e.g. sunrise during polar day)
+MISSING = np.iinfo(np.uint16).max
+
+# Day portions PrayTimes starts from: Fajr, Sunrise, Dhuhr, Asr, Sunset
+_PORTIONS = np.array([5, 6, 12, 13, 18]) / 24
+_FAJR, _SUNRISE, _DHUHR, _ASR, _SUNSET = range(5)
+
+# Julian date at 0h UT = proleptic Gregorian ordinal + this offset
+_JD_ORDINAL_OFFSET = 1721424.5
+
+
+def _fix(a, b):
+    return a - b * np.floor(a / b)
+
+
+def _sun_table(jd):
+    """Declination (deg) and equation of time (h) for an array of Julian dates."""
+    d = jd - 2451545.0
+    g = np.radians(_fix(357.529 + 0.98560028 * d, 360))
+    q = _fix(280.459 + 0.98564736 * d, 360)
+    l = np.radians(_fix(q + 1.915 * np.sin(g) + 0.020 * np.sin(2 * g), 360))
+    e = np.radians(23.439 - 0.00000036 * d)
+
+    ra = np.degrees(np.arctan2(np.cos(e) * np.sin(l), np.cos(l))) / 15
+    # Keep eqt continuous across the equinox wrap so it can be interpolated
+    eqt = _fix(q / 15 - _fix(ra, 24) + 12, 24) - 12
+    decl = np.degrees(np.arcsin(np.sin(e) * np.sin(l)))
+    return decl, eqt
+
+
+def _method_arrays(methods):
+    """Per-location calculation parameters gathered from config.METHOD_PARAMS."""
+    fallback = METHOD_PARAMS[3]
+    params = [METHOD_PARAMS.get(int(m), fallback) for m in methods]
+    nan = np.nan
+    return {
+        "fajr": np.array([p["fajr"] for p in params], dtype=float),
+        "isha": np.array([p.get("isha", nan) for p in params], dtype=float),
+        "isha_minutes": np.array([p.get("isha_minutes", nan) for p in params], dtype=float),
+        "maghrib": np.array([p.get("maghrib", SUNRISE_ANGLE) for p in params], dtype=float),
+        "maghrib_angle": np.array(["maghrib" in p for p in params]),
+        "maghrib_minutes": np.array([p.get("maghrib_minutes", 0) for p in params], dtype=float),
+        "jafari": np.array([p.get("midnight") == "jafari" for p in params]),
+        "shafaq": np.array([bool(p.get("shafaq")) for p in params]),
+    }
+
+
+def _zone_offsets(name, days):
+    """UTC offsets in hours of one zone at local noon on each of `days`."""
+    tz = pytz.timezone(name)
+    transitions = getattr(tz, "_utc_transition_times", None)
+    if not transitions:
+        return np.full(len(days), tz.utcoffset(datetime(2000, 1, 1)).total_seconds() / 3600)
+    # Look the offsets up in pytz's transition table instead of localizing
+    # every day; the second pass re-anchors UTC noon to local noon.
+    times = np.array(transitions, dtype="datetime64[s]")
+    offsets = np.array([info[0].total_seconds() for info in tz._transition_info], dtype=np.int64)
+    noon = np.array(days, dtype="datetime64[D]").astype("datetime64[s]") + np.timedelta64(12, "h")
+    instant = noon
+    for _ in range(2):
+        offset = offsets[np.maximum(np.searchsorted(times, instant, side="right") - 1, 0)]
+        instant = noon - offset.astype("timedelta64[s]")
+    return offset / 3600
+
+
+def _utc_offsets(timezones, days, n_locations):
+    """(locations x days) UTC offsets in hours, evaluated at local noon."""
+    if timezones is None:
+        return np.zeros((n_locations, len(days)))
+    by_zone = {name: _zone_offsets(name, days) for name in set(timezones)}
+    return np.stack([by_zone[name] for name in timezones])
+
+
+def _days_since_solstice(days, north):
+    """Moonsighting Committee day counter, for one hemisphere."""
+    doy = np.array([d.timetuple().tm_yday for d in days])
+    leap = np.array([(d.year % 4 == 0 and d.year % 100 != 0) or d.year % 400 == 0 for d in days])
+    days_in_year = np.where(leap, 366, 365)
+    if north:
+        dyy = doy + 10
+        return np.where(dyy >= days_in_year, dyy - days_in_year, dyy)
+    dyy = doy - np.where(leap, 173, 172)
+    return np.where(dyy < 0, dyy + days_in_year, dyy)
+
+
+def _seasonal_minutes(dyy, a, b, c, d):
+    return np.select(
+        [dyy < 91, dyy < 137, dyy < 183, dyy < 229, dyy < 275],
+        [a + (b - a) / 91 * dyy,
+         b + (c - b) / 46 * (dyy - 91),
+         c + (d - c) / 46 * (dyy - 137),
+         d + (c - d) / 46 * (dyy - 183),
+         c + (b - c) / 46 * (dyy - 229)],
+        b + (a - b) / 91 * (dyy - 275),
+    )
+
+
+def _adjust_high_lat(time, base, angle, night, ccw=False):
+    portion = angle[:, None] / 60 * night
+    diff = _fix(base - time, 24) if ccw else _fix(time - base, 24)
+    fallback = base - portion if ccw else base + portion
+    return np.where(np.isnan(time) | (diff > portion), fallback, time)
+
+
+def compute_timetable(lats, lons, methods, schools, start, end, timezones=None):
+    """
+    Computes prayer times for every location and every day in [start, end].
+
+    lats, lons, methods, schools: equal-length sequences, one entry per location.
+    timezones: optional IANA names per location; times are UTC when omitted.
+
+    Returns (dates, table) where dates is a datetime64[D] array and table is a
+    uint16 array of shape (locations, days, len(TIMING_KEYS)) holding minutes
+    since local midnight, with MISSING where a time does not occur.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    n_days = (end - start).days + 1
+    days = [start + timedelta(days=i) for i in range(n_days)]
+
+    # Sun position per day and portion, with one day of padding on each side
+    # so each location can interpolate to its own longitude.
+    jd0 = start.toordinal() + _JD_ORDINAL_OFFSET + np.arange(-1, n_days + 1)
+    decl_grid, eqt_grid = _sun_table(jd0[None, :] + _PORTIONS[:, None])
+    frac = (-lons / 360)[None, :, None]  # (1, L, 1)
+
+    def at_longitude(grid):
+        slope = (grid[:, 2:] - grid[:, :-2]) / 2
+        return grid[:, None, 1:-1] + frac * slope[:, None, :]  # (P, L, D)
+
+    decl = at_longitude(decl_grid)
+    noon = _fix(12 - at_longitude(eqt_grid), 24)
+
+    lat = lats[:, None]
+    sin_lat, cos_lat = np.sin(np.radians(lat)), np.cos(np.radians(lat))
+    sin_decl, cos_decl = np.sin(np.radians(decl)), np.cos(np.radians(decl))
+
+    def angle_time(angle, p, ccw=False):
+        with np.errstate(invalid="ignore"):
+            t = np.degrees(np.arccos(
+                (-np.sin(np.radians(angle)) - sin_decl[p] * sin_lat) / (cos_decl[p] * cos_lat)
+            )) / 15
+        return noon[p] - t if ccw else noon[p] + t
+
+    m = _method_arrays(methods)
+    factor = np.array([ASR_FACTORS.get(int(s), 1) for s in schools], dtype=float)[:, None]
+
+    fajr = angle_time(m["fajr"][:, None], _FAJR, ccw=True)
+    sunrise = angle_time(SUNRISE_ANGLE, _SUNRISE, ccw=True)
+    dhuhr = noon[_DHUHR]
+    asr_angle = -np.degrees(np.arctan(1 / (factor + np.tan(np.radians(np.abs(lat - decl[_ASR]))))))
+    asr = angle_time(asr_angle, _ASR)
+    sunset = angle_time(SUNRISE_ANGLE, _SUNSET)
+    maghrib = angle_time(m["maghrib"][:, None], _SUNSET)
+    isha = angle_time(m["isha"][:, None], _SUNSET)
+
+    shift = _utc_offsets(timezones, days, len(lats)) - lons[:, None] / 15
+    fajr, sunrise, dhuhr, asr, sunset, maghrib, isha = (
+        t + shift for t in (fajr, sunrise, dhuhr, asr, sunset, maghrib, isha)
+    )
+
+    night = _fix(sunrise - sunset, 24)
+    fajr = _adjust_high_lat(fajr, sunrise, m["fajr"], night, ccw=True)
+    maghrib = np.where(m["maghrib_angle"][:, None],
+                       _adjust_high_lat(maghrib, sunset, m["maghrib"], night), maghrib)
+    isha = np.where(np.isnan(m["isha"])[:, None], isha,
+                    _adjust_high_lat(isha, sunset, m["isha"], night))
+
+    if m["shafaq"].any():
+        k = (np.abs(lats) / 55)[:, None]
+        dyy = np.where(lat >= 0, _days_since_solstice(days, True), _days_since_solstice(days, False))
+        safe_fajr = sunrise - _seasonal_minutes(dyy, 75 + 28.65 * k, 75 + 19.44 * k,
+                                                75 + 32.74 * k, 75 + 48.10 * k) / 60
+        safe_isha = sunset + _seasonal_minutes(dyy, 75 + 25.60 * k, 75 + 2.050 * k,
+                                               75 - 9.21 * k, 75 + 6.14 * k) / 60
+        shafaq = m["shafaq"][:, None]
+        fajr = np.where(shafaq & (np.isnan(fajr) | (safe_fajr > fajr)), safe_fajr, fajr)
+        isha = np.where(shafaq & (np.isnan(isha) | (safe_isha < isha)), safe_isha, isha)
+
+    maghrib = maghrib + m["maghrib_minutes"][:, None] / 60
+    isha_minutes = m["isha_minutes"][:, None]
+    isha = np.where(np.isnan(isha_minutes), isha, maghrib + isha_minutes / 60)
+    imsak = fajr - IMSAK_MINUTES / 60
+
+    # Midnight and the thirds divide the same night; see astro.compute_day
+    night = np.where(m["jafari"][:, None], _fix(fajr - sunset, 24), night)
+
+    columns = {
+        "Fajr": fajr, "Sunrise": sunrise, "Dhuhr": dhuhr, "Asr": asr,
+        "Sunset": sunset, "Maghrib": maghrib, "Isha": isha, "Imsak": imsak,
+        "Midnight": sunset + night / 2,
+        "Firstthird": sunset + night / 3,
+        "Lastthird": sunset + night * 2 / 3,
+    }
+    hours = np.stack([columns[key] for key in TIMING_KEYS], axis=-1)
+
+    # Round to the nearest minute exactly as astro.format_time does
+    table = np.full(hours.shape, MISSING, dtype=np.uint16)
+    valid = ~np.isnan(hours)
+    table[valid] = np.floor(_fix(hours[valid] + 0.5 / 60, 24) * 60).astype(np.uint16)
+
+    dates = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    return dates, table
+
+
+def compare_methods(lat, lon, day, timezone, methods):
+    """
+    One location and day under every (method, school) pair, in a single
+    compute_timetable pass: the sun position is computed once and only the
+    per-method angles and offsets differ between rows.
+
+    Returns (pairs, table) where table[i] is the uint16 row for pairs[i].
+    """
+    pairs = [(m, s) for m in methods for s in sorted(ASR_FACTORS)]
+    n = len(pairs)
+    _, table = compute_timetable([lat] * n, [lon] * n, [m for m, _ in pairs], [s for _, s in pairs],
+                                 day, day, [timezone] * n)
+    return pairs, table[:, 0]
+
+
+def to_utc_epochs(dates, table, timezones=None):
+    """
+    Converts a compute_timetable result to float64 UTC epoch seconds of the
+    same shape, NaN where MISSING. Times are taken to fall on their row's
+    date, using the same local-noon UTC offset the table was built with.
+    """
+    days = list(dates.astype(object))
+    offsets = _utc_offsets(timezones, days, table.shape[0])
+    midnight = dates.astype("datetime64[s]").astype(np.int64).astype(float)
+    epochs = midnight[None, :, None] + table * 60.0 - offsets[:, :, None] * 3600
+    epochs[table == MISSING] = np.nan
+    return epochs
+
+
+def row_to_timings(row):
+    """Converts one (location, day) row of a timetable to Aladhan-style {"Fajr": "HH:MM", ...}."""
+    return {
+        key: "-----" if minutes == MISSING else f"{minutes // 60:02d}:{minutes % 60:02d}"
+        for key, minutes in zip(TIMING_KEYS, (int(v) for v in row))
+    }
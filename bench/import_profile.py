@@ -0,0 +1,85 @@
+# bench/import_profile.py
+"""
+Import-time profile of the app's modules.
+
+    python bench/import_profile.py [ui service scheduler ...] [--top 15] [--runs 3]
+
+Imports each module in a fresh interpreter with `python -X importtime`
+(--runs times, keeping the fastest) and prints JSON: total import time, the
+slowest top-level packages (cumulative), this repo's own modules, and which
+heavy optional dependencies were loaded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Only needed for SMS, GPS or upstream calls respectively; should load lazily
+OPTIONAL = ["twilio", "streamlit_geolocation", "requests"]
+
+
+def _importtime(module):
+    """
+    {dotted name: (self_us, cumulative_us, depth)} for `module` and everything
+    it imported, from one -X importtime run (interpreter startup excluded).
+    """
+    code = f"import sys; sys.path.insert(0, {str(ROOT)!r}); import {module}"
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True,
+                          text=True, env=env, cwd=ROOT)
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    # A module is reported after its imports, so the subtree is the run of
+    # nested entries just before the final top-level line
+    start = len(entries) - 1
+    while start > 0 and entries[start - 1][3] > 0:
+        start -= 1
+    return {name: (s, c, d) for name, s, c, d in entries[start:]}
+
+
+def profile(module, top=15, runs=3):
+    fastest = None
+    for _ in range(runs):
+        modules = _importtime(module)
+        if fastest is None or modules[module][1] < fastest[module][1]:
+            fastest = modules
+    packages = {}
+    for name, (_, cumulative, _) in fastest.items():
+        package = name.split(".")[0]
+        # The outermost import of a package carries its whole subtree
+        packages[package] = max(packages.get(package, 0), cumulative)
+    own = {p.stem for p in ROOT.glob("*.py")}
+    ms = lambda us: round(us / 1000, 1)  # noqa: E731
+    return {
+        "module": module,
+        "total_ms": ms(fastest[module][1]),
+        "slowest_packages_ms": {p: ms(us) for p, us in
+                                sorted(packages.items(), key=lambda kv: -kv[1])[:top] if p != module},
+        "own_modules_ms": {name: {"self": ms(s), "cumulative": ms(c)}
+                           for name, (s, c, _) in sorted(fastest.items(), key=lambda kv: -kv[1][1])
+                           if name in own},
+        "optional_loaded": [name for name in OPTIONAL if name in fastest],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time profile of app modules")
+    parser.add_argument("modules", nargs="*", default=["ui"])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3, help="fresh imports per module; the fastest is kept")
+    args = parser.parse_args(argv)
+    print(json.dumps([profile(m, args.top, args.runs) for m in args.modules], indent=2))
+
+
+if __name__ == "__main__":
+    main()
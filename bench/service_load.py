@@ -0,0 +1,102 @@
+# bench/service_load.py
+"""
+Load test for service.py.
+
+    python service.py --port 8080 &
+    python bench/service_load.py --url http://127.0.0.1:8080 --connections 50 --seconds 10
+
+Opens N keep-alive connections that each send requests back to back over a
+pool of locations, then reports requests/second and latency percentiles.
+The first pass over the pool warms the service cache; with --warmup (on by
+default) it is excluded from the measurement so the figure is the cache-hit
+rate. Run it on a different core than the server (e.g. `taskset -c 1`).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_LOCATIONS = [
+    (21.4225, 39.8262), (24.4672, 39.6024), (51.5074, -0.1278), (40.7128, -74.006),
+    (41.0082, 28.9784), (30.0444, 31.2357), (-6.2088, 106.8456), (33.6844, 73.0479),
+    (3.139, 101.6869), (25.2048, 55.2708), (43.6532, -79.3832), (-33.8688, 151.2093),
+]
+PATHS = ["/v1/today", "/v1/next", "/v1/calendar"]
+
+
+def _targets(locations):
+    return [f"{path}?lat={lat}&lon={lon}&method=2&school=0"
+            for lat, lon in locations for path in PATHS]
+
+
+async def _request(reader, writer, host, target):
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def _worker(host, port, targets, deadline, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            target = random.choice(targets)
+            started = time.perf_counter()
+            status = await _request(reader, writer, host, target)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(url, connections, seconds, warmup=True):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    targets = _targets(DEFAULT_LOCATIONS)
+    if warmup:
+        reader, writer = await asyncio.open_connection(host, port)
+        for target in targets:
+            await _request(reader, writer, host, target)
+        writer.close()
+
+    latencies, statuses = [], {}
+    started = time.perf_counter()
+    deadline = started + seconds
+    await asyncio.gather(*(_worker(host, port, targets, deadline, latencies, statuses)
+                           for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "requests": n,
+        "seconds": round(elapsed, 2),
+        "rps": round(n / elapsed, 1),
+        "latency_ms": {
+            "p50": round(latencies[n // 2] * 1000, 3) if n else None,
+            "p95": round(latencies[int(n * 0.95)] * 1000, 3) if n else None,
+            "p99": round(latencies[int(n * 0.99)] * 1000, 3) if n else None,
+            "max": round(latencies[-1] * 1000, 3) if n else None,
+        },
+        "statuses": statuses,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the JSON timetable service")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args.url, args.connections, args.seconds, args.warmup)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# bench/stubs.py
+"""
+Local stand-ins for the external services, with injected latency.
+
+    python bench/stubs.py --latency-ms 80 [--jitter-ms 20]
+
+prints the environment to point the app at them (ALADHAN_API_URL, IPAPI_URL,
+IPINFO_URL, TWILIO_API_URL and test Twilio credentials) and serves until
+Ctrl-C. bench/suite.py starts the same stubs in-process.
+
+- aladhan  GET /v1/calendar/<year>/<month>?latitude=&longitude=&method=&school=
+           answers in Aladhan's shape with times from batch.compute_timetable
+- ipapi    GET /json/ and /<ip>/json/
+- ipinfo   GET /json and /<ip>/json
+- twilio   POST /2010-04-01/Accounts/<sid>/Messages.json returns a queued message
+"""
+import argparse
+import calendar
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+import zlib
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# IP lookups resolve to one of these, chosen by a hash of the IP
+CITIES = [
+    ("Mecca", 21.4225, 39.8262), ("London", 51.5074, -0.1278), ("New York", 40.7128, -74.006),
+    ("Istanbul", 41.0082, 28.9784), ("Cairo", 30.0444, 31.2357), ("Jakarta", -6.2088, 106.8456),
+    ("Karachi", 24.8607, 67.0011), ("Toronto", 43.6532, -79.3832),
+]
+TWILIO_SID = "AC" + "0" * 32
+TWILIO_ENV = {
+    "TWILIO_ACCOUNT_SID": TWILIO_SID,
+    "TWILIO_AUTH_TOKEN": "stub-token",
+    "TWILIO_PHONE_NUMBER": "+15005550006",
+    "TWILIO_TO_PHONE_NUMBER": "+15005550010",
+}
+
+
+class StubServer:
+    """
+    Threaded HTTP/1.1 server on 127.0.0.1 whose `route(method, path, query, body)`
+    returns (status, json_obj); every response is delayed by latency ± jitter seconds.
+    """
+
+    def __init__(self, name, route, latency=0.0, jitter=0.0, port=0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; without this the
+            # client's delayed ACK adds ~40 ms to every response
+            disable_nagle_algorithm = True
+
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                parts = urlsplit(self.path)
+                with stub._lock:
+                    stub.requests += 1
+                delay = stub.latency + random.uniform(-stub.jitter, stub.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    status, obj = route(self.command, parts.path, parse_qs(parts.query), body)
+                except (KeyError, ValueError) as e:
+                    status, obj = 400, {"error": str(e)}
+                except Exception as e:
+                    status, obj = 500, {"error": repr(e)}
+                data = json.dumps(obj).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"stub-{self.name}",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _city(ip):
+    return CITIES[zlib.crc32((ip or "").encode()) % len(CITIES)]
+
+
+def _aladhan(method, path, query, body):
+    # Imported here so config.py is only read after stub_environ() is applied
+    from batch import compute_timetable, row_to_timings
+    from tz_index import get_tz, timezone_at
+
+    _, version, endpoint, year, month = path.split("/")
+    if (version, endpoint) != ("v1", "calendar"):
+        return 404, {"code": 404, "status": "Not Found"}
+    lat, lon = float(query["latitude"][0]), float(query["longitude"][0])
+    calc, school = int(query.get("method", ["2"])[0]), int(query.get("school", ["0"])[0])
+    year, month = int(year), int(month)
+    timezone = timezone_at(lat, lon)
+    first = date(year, month, 1)
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    days, table = compute_timetable([lat], [lon], [calc], [school], first, last, [timezone])
+    tz = get_tz(timezone)
+    data = []
+    for day, row in zip(days.astype(object), table[0]):
+        # Aladhan suffixes each time with the zone, e.g. "05:09 (+03)"
+        suffix = tz.localize(datetime(day.year, day.month, day.day, 12)).strftime("%z")[:3]
+        timings = {k: f"{v} ({suffix})" for k, v in row_to_timings(row).items()}
+        data.append({
+            "timings": timings,
+            "date": {"gregorian": {"date": day.strftime("%d-%m-%Y")}},
+            "meta": {"latitude": lat, "longitude": lon, "timezone": timezone,
+                     "method": {"id": calc}, "school": "HANAFI" if school else "STANDARD"},
+        })
+    return 200, {"code": 200, "status": "OK", "data": data}
+
+
+def _ipapi(method, path, query, body):
+    ip = path.strip("/").split("/")[0] if path.count("/") > 2 else None
+    city, lat, lon = _city(ip)
+    return 200, {"ip": ip or "203.0.113.1", "city": city, "latitude": lat, "longitude": lon}
+
+
+def _ipinfo(method, path, query, body):
+    ip = path.strip("/").split("/")[0] if path.count("/") > 1 else None
+    city, lat, lon = _city(ip)
+    return 200, {"ip": ip or "203.0.113.1", "city": city, "loc": f"{lat},{lon}"}
+
+
+def _twilio(method, path, query, body):
+    if method != "POST" or not path.endswith("/Messages.json"):
+        return 404, {"code": 20404, "message": "Not Found", "status": 404}
+    form = parse_qs(body)
+    return 201, {
+        "sid": "SM" + uuid.uuid4().hex,
+        "account_sid": path.split("/")[3],
+        "to": form["To"][0],
+        "from": form["From"][0],
+        "body": form["Body"][0],
+        "status": "queued",
+        "num_segments": "1",
+        "direction": "outbound-api",
+        "api_version": "2010-04-01",
+    }
+
+
+ROUTES = {"aladhan": _aladhan, "ipapi": _ipapi, "ipinfo": _ipinfo, "twilio": _twilio}
+ENV_VARS = {"aladhan": "ALADHAN_API_URL", "ipapi": "IPAPI_URL", "ipinfo": "IPINFO_URL",
+            "twilio": "TWILIO_API_URL"}
+
+
+def start_stubs(latency=0.0, jitter=0.0):
+    """Starts every stub; `latency` is seconds, or a {name: seconds} dict. Returns {name: StubServer}."""
+    stubs = {}
+    for name, route in ROUTES.items():
+        delay = latency.get(name, 0.0) if isinstance(latency, dict) else latency
+        stubs[name] = StubServer(name, route, delay, jitter).start()
+    return stubs
+
+
+def stub_environ(stubs):
+    """Environment variables that point config.py and notifier.py at the stubs."""
+    env = {ENV_VARS[name]: stub.url for name, stub in stubs.items()}
+    env.update(TWILIO_ENV)
+    return env
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run local stubs for Aladhan, ipapi, ipinfo and Twilio")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    args = parser.parse_args(argv)
+    stubs = start_stubs(args.latency_ms / 1000, args.jitter_ms / 1000)
+    for key, value in stub_environ(stubs).items():
+        print(f"export {key}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
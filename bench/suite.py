@@ -0,0 +1,343 @@
+# bench/suite.py
+"""
+Benchmark suite for the app, run against the local stubs in bench/stubs.py.
+
+    python bench/suite.py [--latency-ms 50] [--sessions 4] [--reruns 10] [--seconds 2]
+                          [--only rerun,sessions,...] [--out results.json] [--compare old.json]
+
+- rerun        AppTest run of app.py: the first (cold) run, then --reruns reruns of ui.main()
+- cold_start   first run in a fresh process for a session whose location is already known
+               (no upstream calls), and which of import_profile.OPTIONAL it loaded
+- sessions     --sessions concurrent sessions doing --reruns runs each at their own location;
+               AppTest keeps one Streamlit runtime per process, so each session is a process
+- next_prayer  ui.get_next_prayer calls per second
+- fetch_cache  fetch_prayer_times served from st.cache_data (inside an AppTest script run:
+               outside a Streamlit runtime cache_data does not cache), and get_prayer_times
+               served from the SQLite timetable cache
+- upstream     fetch_aladhan_month and get_ip_location(refresh=True) through the stubs
+- sms          send_sms latency, and SmsDispatcher throughput for --messages messages
+
+Caches and the SMS dedupe log go to a temporary directory, so every run starts cold.
+The result is one JSON document (commit, environment, arguments, results; latencies in
+ms). With --compare, the change in every metric shared with an earlier result file is
+printed to stderr.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+from import_profile import OPTIONAL  # noqa: E402
+from stubs import start_stubs, stub_environ  # noqa: E402
+
+BENCHMARKS = ["rerun", "cold_start", "sessions", "next_prayer", "fetch_cache", "upstream", "sms"]
+# Mecca; sessions spread out from here ~1 km apart so each has its own cache entries
+BASE_LOCATION = (21.4225, 39.8262)
+SPAWN = multiprocessing.get_context("spawn")
+
+
+def _summary(seconds):
+    """Latency percentiles in ms."""
+    samples = sorted(seconds)
+    n = len(samples)
+    if not n:
+        return {"n": 0}
+    ms = lambda s: round(s * 1000, 3)  # noqa: E731
+    return {"n": n, "mean_ms": ms(sum(samples) / n), "p50_ms": ms(samples[n // 2]),
+            "p95_ms": ms(samples[int(n * 0.95)]), "max_ms": ms(samples[-1])}
+
+
+def _throughput(func, seconds):
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        func()
+        calls += 1
+    elapsed = time.perf_counter() - started
+    return {"calls": calls, "per_second": round(calls / elapsed, 1),
+            "mean_us": round(elapsed / calls * 1e6, 3)}
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+# ---------- Streamlit script runs ----------
+
+def _app_test(location=None):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=60)
+    if location:
+        # As if the session had already resolved its IP location
+        at.session_state["ip_location"] = (*location, "Bench", time.time())
+    return at
+
+
+def _run(at):
+    # AppTest cannot send back a selectbox whose format_func changes its labels
+    # (the method and madhab pickers), so pin those to their default option
+    for box in at.selectbox:
+        if str(box.value) not in box.options:
+            box.select_index(box.proto.default)
+    return _timed(at.run)
+
+
+def _problems(at):
+    return sorted({e.value for e in at.exception} | {e.value for e in at.error})
+
+
+def _rerun(reruns):
+    at = _app_test()
+    first = _run(at)
+    latencies = [_run(at) for _ in range(reruns)]
+    return {"first_run_ms": round(first * 1000, 3), "reruns": _summary(latencies), "errors": _problems(at)}
+
+
+def bench_rerun(args):
+    # In a fresh process, so the first run includes importing the app. AppTest
+    # also replaces sys.modules["__main__"], which would break later spawns here.
+    with ProcessPoolExecutor(1, mp_context=SPAWN) as pool:
+        return pool.submit(_rerun, args.reruns).result()
+
+
+def _cold_start():
+    at = _app_test(BASE_LOCATION)
+    first = _run(at)
+    return {"first_run_ms": round(first * 1000, 3),
+            "optional_loaded": [name for name in OPTIONAL if name in sys.modules], "errors": _problems(at)}
+
+
+def bench_cold_start(args):
+    with ProcessPoolExecutor(1, mp_context=SPAWN) as pool:
+        return pool.submit(_cold_start).result()
+
+
+def _session(index, reruns, barrier):
+    location = (BASE_LOCATION[0] + index * 0.01, BASE_LOCATION[1])
+    at = _app_test(location)
+    first = _run(at)
+    barrier.wait()
+    started = time.time()
+    latencies = [_run(at) for _ in range(reruns)]
+    return first, latencies, started, time.time(), _problems(at)
+
+
+def bench_sessions(args):
+    with SPAWN.Manager() as manager, ProcessPoolExecutor(args.sessions, mp_context=SPAWN) as pool:
+        barrier = manager.Barrier(args.sessions)
+        results = list(pool.map(_session, range(args.sessions), [args.reruns] * args.sessions,
+                                [barrier] * args.sessions))
+    firsts = [r[0] for r in results]
+    latencies = [s for r in results for s in r[1]]
+    wall = max(r[3] for r in results) - min(r[2] for r in results)
+    return {
+        "sessions": args.sessions,
+        "first_run": _summary(firsts),
+        "reruns": _summary(latencies),
+        "reruns_per_second": round(len(latencies) / wall, 2),
+        "errors": sorted({e for r in results for e in r[4]}),
+    }
+
+
+# ---------- functions ----------
+
+def bench_next_prayer(args):
+    from astro import compute_prayer_times
+    from tz_index import timezone_at
+    from ui import get_next_prayer
+
+    tz = timezone_at(*BASE_LOCATION)
+    times, _ = compute_prayer_times(*BASE_LOCATION, 4, 0, tz)
+    return _throughput(lambda: get_next_prayer(times, tz, times), args.seconds)
+
+
+def _cache_data_script(lat, lon, seconds):
+    # Runs as an AppTest script, so only its own imports are in scope
+    import time
+    import streamlit as st
+    import api
+
+    misses = []
+    get_prayer_times = api.get_prayer_times
+    api.get_prayer_times = lambda *a, **k: misses.append(a) or get_prayer_times(*a, **k)
+    started = time.perf_counter()
+    api.fetch_prayer_times(lat, lon, 4, 0)
+    cold = time.perf_counter() - started
+    calls = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        api.fetch_prayer_times(lat, lon, 4, 0)
+        calls += 1
+    st.session_state["result"] = (cold, calls, time.perf_counter() - started, len(misses))
+
+
+def _cache_data_hits(seconds):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_function(_cache_data_script, args=(*BASE_LOCATION, seconds), default_timeout=60 + seconds)
+    at.run()
+    cold, calls, elapsed, misses = at.session_state["result"]
+    return {"cold_ms": round(cold * 1000, 3), "calls": calls, "per_second": round(calls / elapsed, 1),
+            "mean_us": round(elapsed / calls * 1e6, 3), "misses": misses}
+
+
+def bench_fetch_cache(args):
+    from api import get_prayer_times
+
+    # AppTest replaces sys.modules["__main__"], so it runs in a process of its own
+    with ProcessPoolExecutor(1, mp_context=SPAWN) as pool:
+        fetch = pool.submit(_cache_data_hits, args.seconds).result()
+    lat, lon = BASE_LOCATION
+    return {
+        "fetch_prayer_times": fetch,
+        "get_prayer_times": _throughput(lambda: get_prayer_times(lat, lon, 4, 0), args.seconds),
+    }
+
+
+def bench_upstream(args):
+    from api import fetch_aladhan_month
+    from geo import get_ip_location
+
+    today = datetime.now().date()
+    lat, lon = BASE_LOCATION
+    aladhan = [_timed(fetch_aladhan_month, lat + i * 0.05, lon, 4, 0, today.year, today.month)
+               for i in range(args.calls)]
+    ip = [_timed(get_ip_location, f"198.51.100.{i % 250 + 1}", True) for i in range(args.calls)]
+    return {"aladhan_month": _summary(aladhan), "ip_location": _summary(ip)}
+
+
+def bench_sms(args):
+    from dispatch import DedupeStore, Message, SmsDispatcher
+    from notifier import send_sms
+
+    single = []
+    for _ in range(args.calls):
+        started = time.perf_counter()
+        ok, detail = send_sms("Fajr", "05:00")
+        single.append(time.perf_counter() - started)
+        if not ok:
+            raise RuntimeError(f"send_sms failed: {detail}")
+
+    store = DedupeStore(os.path.join(os.environ["BENCH_TMP"], "dispatch.sqlite3"))
+    dispatcher = SmsDispatcher(store=store, rate=1e6, burst=1e6)
+    messages = [Message(f"bench|{i}", f"+1500555{i:04d}", "🕌 Reminder: Fajr at 05:00.")
+                for i in range(args.messages)]
+    try:
+        started = time.perf_counter()
+        failed = dispatcher.send_batch(messages)
+        elapsed = time.perf_counter() - started
+        stats = dispatcher.stats()
+    finally:
+        dispatcher.shutdown()
+    return {
+        "send_sms": _summary(single),
+        "dispatch": {"messages": len(messages), "failed": failed,
+                     "per_second": round(len(messages) / elapsed, 1),
+                     "latency_p50_ms": round(stats.get("latency_p50", 0) * 1000, 3),
+                     "latency_p95_ms": round(stats.get("latency_p95", 0) * 1000, 3)},
+    }
+
+
+# ---------- driver ----------
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(obj, prefix=""):
+    flat = {}
+    for key, value in obj.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(old, new):
+    """Lines of `metric old new change%` for every numeric result in both documents."""
+    before, after = _flatten(old["results"]), _flatten(new["results"])
+    lines = []
+    for key in sorted(before.keys() & after.keys()):
+        change = (after[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+        lines.append(f"{key:48} {before[key]:>12} {after[key]:>12} {change:+8.1f}%")
+    return lines
+
+
+def run(args):
+    stubs = start_stubs(args.latency_ms / 1000, args.jitter_ms / 1000)
+    tmp = tempfile.mkdtemp(prefix="prayer-bench-")
+    os.environ.update(stub_environ(stubs))
+    os.environ.update({
+        "BENCH_TMP": tmp,
+        "PRAYER_CACHE_PATH": os.path.join(tmp, "cache.sqlite3"),
+        "SCHEDULER_DB_PATH": os.path.join(tmp, "scheduler.sqlite3"),
+    })
+    results = {}
+    for name in args.only:
+        started = time.perf_counter()
+        results[name] = globals()[f"bench_{name}"](args)
+        results[name]["seconds"] = round(time.perf_counter() - started, 2)
+    for stub in stubs.values():
+        stub.stop()
+    return {
+        "commit": _commit(),
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "stub_requests": {name: stub.requests for name, stub in stubs.items()},
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app against local service stubs")
+    parser.add_argument("--latency-ms", type=float, default=50, help="injected stub latency")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=2, help="duration of throughput loops")
+    parser.add_argument("--calls", type=int, default=20, help="sequential upstream / send_sms calls")
+    parser.add_argument("--messages", type=int, default=200, help="messages through SmsDispatcher")
+    parser.add_argument("--only", type=lambda s: s.split(","), default=BENCHMARKS,
+                        help="comma-separated subset of " + ",".join(BENCHMARKS))
+    parser.add_argument("--out", help="also write the JSON result here")
+    parser.add_argument("--compare", help="earlier result file to diff against")
+    args = parser.parse_args(argv)
+    unknown = set(args.only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(json.load(f), result)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
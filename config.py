@@ -1,6 +1,8 @@
+import os
+
 METHOD_NAMES = {
-    1: "Islamic Society of North America (ISNA)", 
-    2: "University of Islamic Sciences, Karachi",
+    1: "University of Islamic Sciences, Karachi",
+    2: "Islamic Society of North America (ISNA)",
     3: "Muslim World League (MWL)",
     4: "Umm Al-Qura University, Makkah",
     5: "Egyptian General Authority of Survey",
@@ -24,10 +26,10 @@ METHOD_NAMES = {
 
 #Regional recommendations for better user experience
 REGION_RECOMMENDATIONS = {
-    "US North America": [1], #ISNA
+    "US North America": [2], #ISNA
     "🇸🇦 Saudi Arabia": [4],   # Umm Al-Qura, Makkah
     "🌍 Most Muslim Countries": [3],  # MWL
-    "🇵🇰 Pakistan/India": [2], # Karachi
+    "🇵🇰 Pakistan/India": [1], # Karachi
     "🇪🇬 Egyptian General Authority of Survey": [5],  # Egyptian
     "🇮🇷 Iran": [7],           # Tehran
     "🇦🇪 UAE": [8],            # Gulf Region
@@ -70,5 +72,115 @@ METHOD_DESCRIPTIONS = {
     99: "Allows custom Fajr and Isha angles (advanced users only)."
 }
 
+# Calculation parameters for the local astronomical engine (astro.py).
+# Angles are degrees below the horizon; *_minutes are fixed offsets
+# (Maghrib after sunset, Isha after Maghrib). Mirrors METHOD_DESCRIPTIONS.
+METHOD_PARAMS = {
+    1: {"fajr": 18, "isha": 18},
+    2: {"fajr": 15, "isha": 15},
+    3: {"fajr": 18, "isha": 17},
+    4: {"fajr": 18.5, "isha_minutes": 90},
+    5: {"fajr": 19.5, "isha": 17.5},
+    7: {"fajr": 17.7, "isha": 14, "maghrib": 4.5},
+    8: {"fajr": 19.5, "isha_minutes": 90},
+    9: {"fajr": 18, "isha": 17.5},
+    10: {"fajr": 18, "isha_minutes": 90},
+    11: {"fajr": 20, "isha": 18},
+    12: {"fajr": 12, "isha": 12},
+    14: {"fajr": 16, "isha": 15},
+    15: {"fajr": 18, "isha": 18, "shafaq": "general"},
+    17: {"fajr": 20, "isha": 18},
+    18: {"fajr": 18, "isha": 18},
+    19: {"fajr": 18, "isha": 17},
+    20: {"fajr": 20, "isha": 18},
+    21: {"fajr": 19, "isha": 17},
+    22: {"fajr": 18, "maghrib_minutes": 3, "isha_minutes": 77},
+    23: {"fajr": 18, "isha": 18, "maghrib_minutes": 5},
+    99: {"fajr": 18, "isha": 17},
+}
+
+# Asr shadow factor per school: 0 = Shafi'i/Maliki/Hanbali, 1 = Hanafi
+ASR_FACTORS = {0: 1, 1: 2}
+
+# Minutes between Imsak and Fajr, as used by Aladhan
+IMSAK_MINUTES = 10
+
+
+PRAYER_ORDER = ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]
+
+# Persistent timetable cache (timetable_cache.py)
+CACHE_DB_PATH = os.getenv("PRAYER_CACHE_PATH", "prayer_cache.sqlite3")
+# Geohash length used to quantize locations; 6 chars ~ 1.2 km x 0.6 km cells
+CACHE_GEOHASH_PRECISION = int(os.getenv("PRAYER_CACHE_PRECISION", "6"))
+CACHE_MAX_ENTRIES = int(os.getenv("PRAYER_CACHE_MAX_ENTRIES", "200000"))
+# A miss may reuse the timetable of a cached location this close by (0 disables)
+# when, by the local engine, its times are within NEIGHBOUR_MAX_ERROR seconds of
+# the requester's own for every prayer. Under 60 s, a shown minute is never more
+# than one off.
+NEIGHBOUR_RADIUS_KM = float(os.getenv("PRAYER_NEIGHBOUR_RADIUS_KM", "5"))
+NEIGHBOUR_MAX_ERROR = float(os.getenv("PRAYER_NEIGHBOUR_MAX_ERROR", "30"))
+# Neighbour lookups give up past this many geohash cells. Cells narrow towards
+# the poles, so the default stops them around 81°, where a neighbour's times
+# rarely stay within NEIGHBOUR_MAX_ERROR anyway
+NEIGHBOUR_MAX_CELLS = int(os.getenv("PRAYER_NEIGHBOUR_MAX_CELLS", "1000"))
+
+# IP geolocation caching (geo.py)
+IP_CACHE_TTL = 6 * 3600       # seconds a process-wide IP -> location entry stays valid
+IP_CACHE_SIZE = 10_000        # max IPs kept in the process-wide LRU
+SESSION_LOCATION_TTL = 3600   # seconds before a session re-resolves its IP location
+
+# Upstream base URLs; override to point at local stubs (bench/stubs.py)
+ALADHAN_API_URL = os.getenv("ALADHAN_API_URL", "https://api.aladhan.com")
+# Seconds a page render waits on Aladhan in total before computing times locally;
+# background refreshes keep the full timeout and retries
+ALADHAN_PAGE_DEADLINE = float(os.getenv("ALADHAN_PAGE_DEADLINE", "3"))
+IPAPI_URL = os.getenv("IPAPI_URL", "https://ipapi.co")
+IPINFO_URL = os.getenv("IPINFO_URL", "https://ipinfo.io")
+
+# Shared outbound HTTP client (http_client.py)
+HTTP_POOL_SIZE = 20        # keep-alive connections kept open per host
+HTTP_MAX_PER_HOST = 8      # concurrent requests allowed to one host
+HTTP_RETRIES = 2           # retries after the first attempt
+HTTP_BACKOFF_BASE = 0.25   # seconds; retry n sleeps up to base * 2**n
+HTTP_BREAKER_FAILURES = 3  # consecutive failed calls before a host's breaker opens
+HTTP_BREAKER_RESET = 30    # seconds an open breaker waits before a half-open probe
+
+# "local": compute with astro.py whenever the timezone is known.
+# "aladhan": treat Aladhan as authoritative, serving the last cached
+# timetable while it is refreshed in the background.
+PRAYER_TIME_SOURCE = os.getenv("PRAYER_TIME_SOURCE", "local")
+
+# SMS reminder scheduler (scheduler.py)
+SCHEDULER_DB_PATH = os.getenv("SCHEDULER_DB_PATH", "scheduler.sqlite3")
+SCHEDULER_POLL_SECONDS = 60  # how often new/removed subscriptions are picked up
+
+# SMS dispatch pipeline (dispatch.py). Match the sender's Twilio throughput:
+# ~1 msg/s per long code, 3/s toll-free, 100/s short code or a pooled service.
+SMS_RATE_PER_SECOND = float(os.getenv("SMS_RATE_PER_SECOND", "10"))
+SMS_BURST = int(os.getenv("SMS_BURST", "10"))
+SMS_CONCURRENCY = int(os.getenv("SMS_CONCURRENCY", "16"))
+SMS_MAX_ATTEMPTS = 3
+# A reminder still unsent this long after its prayer time is dropped; with a
+# lead time of 0 it is due exactly at the prayer, so this must be > 0
+SMS_LATE_GRACE_SECONDS = int(os.getenv("SMS_LATE_GRACE_SECONDS", "120"))
+
+# JSON timetable service (service.py)
+SERVICE_CACHE_SIZE = int(os.getenv("SERVICE_CACHE_SIZE", "50000"))  # cached responses kept in memory
+
+# Offline timezone index (tz_index.py); unpacked from the shipped tz_index.bin.gz on first use
+TZ_INDEX_PATH = os.getenv("TZ_INDEX_PATH", "tz_index.bin")
+
+# Binary timetable store (timetable_store.py); served ahead of the cache when set
+TIMETABLE_STORE_PATH = os.getenv("TIMETABLE_STORE_PATH")
+
+# Logging and metrics (instrumentation.py)
+LOG_LEVEL = os.getenv("PRAYER_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("PRAYER_LOG_FORMAT", "text")  # "text" or "json"
+METRICS_ENABLED = os.getenv("PRAYER_METRICS", "0") == "1"
+METRICS_HOST = os.getenv("PRAYER_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("PRAYER_METRICS_PORT", "9464"))
 
-PRAYER_ORDER = ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]
\ No newline at end of file
+# Startup warm-up (warmup.py): CSV of popular locations (id, lat, lon[, method,
+# school, timezone]) whose timetables are cached in the background at startup
+WARMUP_LOCATIONS = os.getenv("WARMUP_LOCATIONS")
+WARMUP_DAYS = int(os.getenv("WARMUP_DAYS", "2"))
@@ -0,0 +1,222 @@
+# dispatch.py
+"""
+Batched SMS dispatch for the reminder scheduler.
+
+- sends to many recipients concurrently through notifier's pooled client
+- a token bucket keeps the send rate within the provider's throughput
+  (SMS_RATE_PER_SECOND, bursts of SMS_BURST)
+- a durable SQLite dedupe log claims each (phone, prayer, date) before
+  sending, so retries and restarts never text someone twice for the same
+  prayer; a crash mid-send errs on the side of not resending
+- throttling (429/503) and connection errors are retried with jittered
+  backoff; failure counts are tracked, and latency is measured from when a
+  message was due, so time spent queued behind the rate limit shows up
+- a message still unsent at its deadline (shortly after the prayer it
+  announces) is dropped and counted as expired rather than sent late
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import NamedTuple, Optional
+
+import requests
+from twilio.base.exceptions import TwilioRestException
+
+import notifier
+from config import (
+    SCHEDULER_DB_PATH, SMS_RATE_PER_SECOND, SMS_BURST, SMS_CONCURRENCY, SMS_MAX_ATTEMPTS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Dedupe rows older than this are pruned; reminders are never retried that late
+DEDUPE_RETENTION = 3 * 86400
+# Recent latencies kept for percentiles
+LATENCY_WINDOW = 10_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sms_log (
+    dedupe_key TEXT PRIMARY KEY,
+    status     TEXT NOT NULL,
+    sid        TEXT,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class Message(NamedTuple):
+    dedupe_key: str
+    to: str
+    body: str
+    due_at: Optional[float] = None    # epoch seconds the reminder should go out; default: when submitted
+    deadline: Optional[float] = None  # epoch seconds after which it is not sent (prayer time + grace)
+
+
+def dedupe_key(phone, prayer, day):
+    """Identity of one reminder: the same person, prayer and local date is sent at most once."""
+    return f"{phone}|{prayer}|{day}"
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+class DedupeStore:
+    """SQLite log of claimed/sent reminders, one connection per thread."""
+
+    def __init__(self, path=SCHEDULER_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("DELETE FROM sms_log WHERE updated_at < ?", (time.time() - DEDUPE_RETENTION,))
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def claim(self, key):
+        """True if this caller may send `key`: never claimed before, or previously failed."""
+        conn = self._conn()
+        now = time.time()
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO sms_log (dedupe_key, status, updated_at) VALUES (?, 'sending', ?)",
+            (key, now),
+        )
+        if cur.rowcount:
+            return True
+        cur = conn.execute(
+            "UPDATE sms_log SET status = 'sending', updated_at = ? "
+            "WHERE dedupe_key = ? AND status = 'failed'",
+            (now, key),
+        )
+        return cur.rowcount > 0
+
+    def finish(self, key, ok, sid=None, attempts=1):
+        self._conn().execute(
+            "UPDATE sms_log SET status = ?, sid = ?, attempts = attempts + ?, updated_at = ? "
+            "WHERE dedupe_key = ?",
+            ("sent" if ok else "failed", sid, attempts, time.time(), key),
+        )
+
+
+def _retryable(e):
+    """Only errors where the provider certainly did not accept the message are retried."""
+    if isinstance(e, TwilioRestException):
+        return e.status in (429, 503)
+    # ReadTimeout is deliberately excluded: the message may already be queued
+    return isinstance(e, requests.exceptions.ConnectionError)
+
+
+class SmsDispatcher:
+    """Sends batches of messages concurrently, rate-limited and deduplicated."""
+
+    def __init__(self, send=notifier.create_message, store=None, rate=SMS_RATE_PER_SECOND,
+                 burst=SMS_BURST, concurrency=SMS_CONCURRENCY, max_attempts=SMS_MAX_ATTEMPTS):
+        self.send = send
+        self.store = store or DedupeStore()
+        self.bucket = TokenBucket(rate, burst)
+        self.max_attempts = max_attempts
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sms")
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._counters = {"submitted": 0, "sent": 0, "failed": 0, "expired": 0, "duplicates": 0, "retries": 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def _expired(self, message):
+        if message.deadline is None or time.time() < message.deadline:
+            return False
+        logger.warning(f"SMS {message.dedupe_key} dropped: "
+                       f"{time.time() - message.deadline:.0f}s past its deadline")
+        self._count("expired")
+        return True
+
+    def _deliver(self, message, submitted_at):
+        if self._expired(message):
+            return False
+        if not self.store.claim(message.dedupe_key):
+            self._count("duplicates")
+            return True
+        for attempt in range(1, self.max_attempts + 1):
+            self.bucket.acquire()
+            # Waiting for a token can take long in a burst; check again
+            if self._expired(message):
+                self.store.finish(message.dedupe_key, ok=False, attempts=attempt - 1)
+                return False
+            try:
+                sid = self.send(message.to, message.body)
+            except Exception as e:
+                if attempt < self.max_attempts and _retryable(e):
+                    self._count("retries")
+                    time.sleep(random.uniform(0, 2 ** attempt))
+                    continue
+                logger.warning(f"SMS {message.dedupe_key} failed after {attempt} attempt(s): {e}")
+                self.store.finish(message.dedupe_key, ok=False, attempts=attempt)
+                self._count("failed")
+                return False
+            due_at = submitted_at if message.due_at is None else message.due_at
+            with self._lock:
+                self._latencies.append(time.time() - due_at)
+            self.store.finish(message.dedupe_key, ok=True, sid=sid, attempts=attempt)
+            self._count("sent")
+            return True
+
+    def submit(self, messages):
+        """
+        Queues messages for delivery and returns their futures (result: True if
+        delivered or a duplicate, False if it failed or expired).
+        """
+        self._count("submitted", len(messages))
+        now = time.time()
+        return [self._pool.submit(self._deliver, m, now) for m in messages]
+
+    def send_batch(self, messages):
+        """Delivers messages and blocks until all are done. Returns the number that failed or expired."""
+        futures = self.submit(messages)
+        wait(futures)
+        return sum(1 for f in futures if not f.result())
+
+    def stats(self):
+        """Counters plus p50/p95/max latency in seconds from when each sent message was due."""
+        with self._lock:
+            result = dict(self._counters)
+            latencies = sorted(self._latencies)
+        if latencies:
+            result["latency_p50"] = latencies[len(latencies) // 2]
+            result["latency_p95"] = latencies[int(len(latencies) * 0.95)]
+            result["latency_max"] = latencies[-1]
+        return result
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
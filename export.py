@@ -0,0 +1,343 @@
+# export.py
+"""
+Bulk timetable export: yearly CSV, iCalendar and JSON files for every
+masjid in a locations CSV.
+
+    python export.py masjids.csv --year 2026 --out exports --formats csv,ics,json
+
+masjids.csv columns: id, lat, lon and optionally name, methods (e.g. "2;4",
+every one must be in config.METHOD_NAMES; falls back to a single "method"
+column, then 2), school and timezone (looked up offline when blank).
+
+The input is read lazily and fanned out over a process pool in chunks, with
+a bounded number of chunks in flight, so memory stays flat however long the
+file is. Each output file is written row by row to a ".part" file and
+renamed when complete; a rerun skips (masjid, method) pairs whose files all
+exist, so an interrupted export resumes where it stopped.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from typing import NamedTuple
+
+import numpy as np
+
+from astro import TIMING_KEYS
+from batch import MISSING, compute_timetable, to_utc_epochs
+from config import METHOD_NAMES, PRAYER_ORDER
+from tz_index import timezone_at
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ics", "json")
+REQUIRED_COLUMNS = ("id", "lat", "lon")
+# Jobs per task sent to a worker; each task is one compute_timetable call
+CHUNK_SIZE = 32
+_PRAYER_COLUMNS = [TIMING_KEYS.index(p) for p in PRAYER_ORDER]
+
+# uint16 minutes -> "HH:MM", indexed by the table value itself (MISSING -> "-----")
+_MINUTE_STRINGS = np.full(MISSING + 1, "-----", dtype=object)
+_MINUTE_STRINGS[:1440] = [f"{m // 60:02d}:{m % 60:02d}" for m in range(1440)]
+
+
+class ExportJob(NamedTuple):
+    id: str
+    name: str
+    lat: float
+    lon: float
+    method: int
+    school: int
+    timezone: str
+    line: int  # input line, for error messages
+
+
+# ---------- input ----------
+
+def _methods(row):
+    raw = row.get("methods") or row.get("method") or "2"
+    return [int(m) for m in re.split(r"[;,\s]+", raw.strip()) if m]
+
+
+def check_columns(path):
+    """Raises ValueError naming the required columns missing from the header of `path`."""
+    with open(path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"{path}: missing required column(s) {', '.join(missing)}")
+
+
+def iter_jobs(path):
+    """Yields one ExportJob per (masjid, requested method), reading `path` lazily."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                masjid_id = row["id"]
+                if not masjid_id:
+                    raise ValueError("empty id")
+                lat, lon = float(row["lat"]), float(row["lon"])
+                methods = _methods(row)
+                school = int(row.get("school") or 0)
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Line {line}: skipped, invalid row ({e})")
+                continue
+            timezone = row.get("timezone") or timezone_at(lat, lon)
+            for method in methods:
+                if method not in METHOD_NAMES:
+                    logger.warning(f"Line {line}: skipped unknown method {method} for {masjid_id}")
+                    continue
+                yield ExportJob(masjid_id, row.get("name") or masjid_id, lat, lon,
+                                method, school, timezone, line)
+
+
+def _chunks(jobs, size):
+    chunk = []
+    for job in jobs:
+        chunk.append(job)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---------- output ----------
+
+def output_paths(out_dir, job, year, formats):
+    safe_id = re.sub(r"[^\w.-]+", "_", job.id)
+    stem = os.path.join(out_dir, safe_id, f"{year}-method{job.method}-school{job.school}")
+    return {fmt: f"{stem}.{fmt}" for fmt in formats}
+
+
+@contextmanager
+def _atomic_open(path):
+    part = f"{path}.part"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with open(part, "w", newline="", encoding="utf-8") as f:
+            yield f
+        os.replace(part, path)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+
+
+def write_csv(path, dates, rows):
+    """rows: per day, the "HH:MM" strings for TIMING_KEYS (as batch.row_to_timings gives them)."""
+    with _atomic_open(path) as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", *TIMING_KEYS])
+        for day, row in zip(dates, rows):
+            writer.writerow([day, *row])
+
+
+def write_json(path, job, year, dates, rows):
+    with _atomic_open(path) as f:
+        header = {"id": job.id, "name": job.name, "lat": job.lat, "lon": job.lon,
+                  "method": job.method, "method_name": METHOD_NAMES[job.method],
+                  "school": job.school, "timezone": job.timezone, "year": year}
+        f.write(json.dumps(header)[:-1] + ', "days": [')
+        for i, (day, row) in enumerate(zip(dates, rows)):
+            timings = dict(zip(TIMING_KEYS, row))
+            f.write(("," if i else "") + "\n" + json.dumps({"date": day, "timings": timings}))
+        f.write("\n]}\n")
+
+
+def _ics_text(value):
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_line(line):
+    """A content line with its CRLF, folded at 75 octets (RFC 5545 3.1)."""
+    if len(line) <= 75 and line.isascii():
+        return line + "\r\n"
+    data = line.encode()
+    folded = []
+    while len(data) > 75:
+        cut = 75
+        while data[cut] & 0xC0 == 0x80:  # never split a UTF-8 sequence
+            cut -= 1
+        folded.append(data[:cut].decode())
+        data = data[cut:]
+    folded.append(data.decode())
+    return "\r\n ".join(folded) + "\r\n"
+
+
+def _utc_stamps(epochs):
+    """Epoch seconds (NaN allowed) -> "YYYYMMDDTHHMMSSZ" strings, "" for NaN."""
+    valid = ~np.isnan(epochs)
+    text = np.datetime_as_string(np.where(valid, epochs, 0).astype("datetime64[s]"))
+    stamps = np.char.add(np.char.replace(np.char.replace(text, "-", ""), ":", ""), "Z")
+    return np.where(valid, stamps, "")
+
+
+def write_ics(path, job, year, dates, starts):
+    """One event per prayer in PRAYER_ORDER per day. starts: per day, _utc_stamps of each prayer."""
+    stamp = datetime.now(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    name = _ics_text(job.name)
+    uid = f"{_ics_text(job.id)}-{job.method}-{job.school}"
+    with _atomic_open(path) as f:
+        f.write("".join(_ics_line(line) for line in (
+            "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//prayertime-app//export//EN",
+            "CALSCALE:GREGORIAN", f"X-WR-CALNAME:{name} prayer times {year}",
+            f"X-WR-TIMEZONE:{job.timezone}",
+        )))
+        for day, day_starts in zip(dates, starts):
+            compact_day = day.replace("-", "")
+            f.write("".join(
+                "BEGIN:VEVENT\r\n"
+                + _ics_line(f"UID:{uid}-{compact_day}-{prayer}@prayertime-app")
+                + f"DTSTAMP:{stamp}\r\nDTSTART:{start}\r\n"
+                + _ics_line(f"SUMMARY:{prayer} - {name}")
+                + "END:VEVENT\r\n"
+                for prayer, start in zip(PRAYER_ORDER, day_starts) if start
+            ))
+        f.write("END:VCALENDAR\r\n")
+
+
+# ---------- workers ----------
+
+def _aladhan_table(job, days):
+    from api import fetch_aladhan_month
+    from timetable_store import parse_minutes
+
+    table = np.full((len(days), len(TIMING_KEYS)), MISSING, dtype=np.uint16)
+    for year, month in sorted({(d.year, d.month) for d in days}):
+        month_days, _ = fetch_aladhan_month(job.lat, job.lon, job.method, job.school, year, month)
+        for j, day in enumerate(days):
+            if day in month_days:
+                table[j] = [parse_minutes(month_days[day].get(k)) for k in TIMING_KEYS]
+    return table
+
+
+def export_chunk(jobs, year, out_dir, formats, source="local"):
+    """Worker: computes and writes every file for `jobs`. Returns (jobs done, location-days)."""
+    start, end = date(year, 1, 1), date(year, 12, 31)
+    timezones = [job.timezone for job in jobs]
+    if source == "aladhan":
+        days = [start + timedelta(days=j) for j in range((end - start).days + 1)]
+        dates = np.array(days, dtype="datetime64[D]")
+        table = np.stack([_aladhan_table(job, days) for job in jobs])
+    else:
+        dates, table = compute_timetable(
+            [j.lat for j in jobs], [j.lon for j in jobs], [j.method for j in jobs],
+            [j.school for j in jobs], start, end, timezones,
+        )
+    day_strings = [str(d) for d in dates]
+    strings = _MINUTE_STRINGS[table]
+    if "ics" in formats:
+        starts = _utc_stamps(to_utc_epochs(dates, table[:, :, _PRAYER_COLUMNS], timezones))
+
+    for k, job in enumerate(jobs):
+        paths = output_paths(out_dir, job, year, formats)
+        rows = strings[k].tolist()
+        if "csv" in paths:
+            write_csv(paths["csv"], day_strings, rows)
+        if "json" in paths:
+            write_json(paths["json"], job, year, day_strings, rows)
+        if "ics" in paths:
+            write_ics(paths["ics"], job, year, day_strings, starts[k].tolist())
+    return len(jobs), len(jobs) * len(dates)
+
+
+def run_export(locations_path, year, out_dir, formats=FORMATS, workers=None, source="local",
+               force=False, progress_every=5.0):
+    """Exports every job in `locations_path`; returns a summary dict."""
+    check_columns(locations_path)
+    workers = workers or os.cpu_count() or 1
+    timezone_at(0, 0)  # load (or build) the timezone index once, before forking
+    stats = {"jobs": 0, "skipped": 0, "failed": 0, "location_days": 0}
+
+    def pending():
+        for job in iter_jobs(locations_path):
+            if not force and all(os.path.exists(p) for p in output_paths(out_dir, job, year, formats).values()):
+                stats["skipped"] += 1
+                continue
+            yield job
+
+    started = last_report = time.perf_counter()
+    chunks = _chunks(pending(), CHUNK_SIZE)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    in_flight = {}
+
+    def refill():
+        while len(in_flight) < workers * 2:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            in_flight[pool.submit(export_chunk, chunk, year, out_dir, formats, source)] = chunk
+
+    try:
+        refill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = in_flight.pop(future)
+                try:
+                    n_jobs, n_days = future.result()
+                    stats["jobs"] += n_jobs
+                    stats["location_days"] += n_days
+                except Exception as e:
+                    stats["failed"] += len(chunk)
+                    logger.error(f"Export failed for lines {chunk[0].line}-{chunk[-1].line}: {e}")
+            refill()
+            now = time.perf_counter()
+            if now - last_report >= progress_every:
+                last_report = now
+                elapsed = now - started
+                logger.info(f"{stats['jobs']} timetables written, {stats['skipped']} already done, "
+                            f"{stats['jobs'] / elapsed:.1f}/s ({stats['location_days'] / elapsed:.0f} location-days/s)")
+    except KeyboardInterrupt:
+        # Chunks already running finish (their files are renamed atomically);
+        # queued ones are dropped and picked up by the next run.
+        logger.warning("Interrupted; rerun the same command to resume.")
+        stats["interrupted"] = True
+        pool.shutdown(wait=False, cancel_futures=True)
+    else:
+        pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 2)
+    stats["jobs_per_second"] = round(stats["jobs"] / elapsed, 1) if elapsed else None
+    return stats
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export yearly prayer timetables for many masjids")
+    parser.add_argument("locations", help="CSV with id, lat, lon[, name, methods, school, timezone]")
+    parser.add_argument("--year", type=int, default=date.today().year)
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--formats", default=",".join(FORMATS),
+                        help="comma separated subset of csv,ics,json")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--source", choices=["local", "aladhan"], default="local")
+    parser.add_argument("--force", action="store_true", help="rewrite files that already exist")
+    args = parser.parse_args(argv)
+
+    formats = tuple(f.strip() for f in args.formats.split(",") if f.strip())
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(sorted(unknown))}")
+    try:
+        check_columns(args.locations)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    stats = run_export(args.locations, args.year, args.out, formats, args.workers, args.source, args.force)
+    print(json.dumps(stats))
+    if stats.get("interrupted"):
+        raise SystemExit(130)
+    if stats["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,126 @@
 import streamlit as st
-from streamlit_geolocation import streamlit_geolocation
-import requests
 import logging
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from config import IP_CACHE_TTL, IP_CACHE_SIZE, IPAPI_URL, IPINFO_URL, SESSION_LOCATION_TTL
+from instrumentation import record_cache, timed
+
+# Process-wide LRU of IP -> (lat, lon, city), shared by all sessions
+_ip_cache = OrderedDict()
+_ip_cache_lock = threading.Lock()
+_ip_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ip-location")
 
 def get_user_coords():
     """Get coordinates from the browser's geolocation API."""
-    print("DEBUG: Entering get_user_coords")
+    # Imported on first use: most sessions never pick Browser GPS
+    from streamlit_geolocation import streamlit_geolocation
+
     try:
         coords = streamlit_geolocation()
         if coords and coords.get("latitude") is not None and coords.get("longitude") is not None:
             lat, lon = coords["latitude"], coords["longitude"]
             if lat == 0 and lon == 0:
                 logging.warning("Received invalid coordinates (0, 0) from browser GPS.")
-                print("DEBUG: GPS returned (0,0)")
                 return None, None
-            print(f"DEBUG: GPS coordinates received: {lat}, {lon}")
+            logging.debug(f"GPS coordinates received: {lat}, {lon}")
             return lat, lon
     except Exception as e:
         logging.error(f"An error occurred in streamlit_geolocation: {e}")
-        print(f"DEBUG: Error in get_user_coords: {e}")
-    print("DEBUG: Exiting get_user_coords with None")
     return None, None
 
-def get_ip_location():
-    """
-    Get location from IP address using a primary and a fallback service.
-    """
-    print("DEBUG: Entering get_ip_location")
-    # 1. Primary Service: ipapi.co
+def get_client_ip():
+    """Public IP of the browser session, from proxy headers; None if unknown or private."""
     try:
-        print("DEBUG: Trying ipapi.co...")
-        response = requests.get('https://ipapi.co/json/', timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        if data.get('latitude') and data.get('longitude'):
-            logging.info("Successfully retrieved location from ipapi.co")
-            print(f"DEBUG: ipapi.co successful: {data.get('city', 'Unknown')}")
-            return data['latitude'], data['longitude'], data.get('city', 'Unknown')
-    except requests.exceptions.RequestException as e:
-        logging.warning(f"ipapi.co failed: {e}. Trying fallback service.")
-        print(f"DEBUG: ipapi.co failed: {e}\nDEBUG: Trying fallback service ipinfo.io...")
-
-    # 2. Fallback Service: ipinfo.io
+        from streamlit.web.server.websocket_headers import _get_websocket_headers
+        headers = _get_websocket_headers() or {}
+    except Exception:
+        return None
+    ip = (headers.get("X-Forwarded-For") or headers.get("X-Real-Ip") or "").split(",")[0].strip()
     try:
-        response = requests.get('https://ipinfo.io/json', timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        if 'loc' in data:
-            lat, lon = map(float, data['loc'].split(','))
-            city = data.get('city', 'Unknown')
-            logging.info("Successfully retrieved location from ipinfo.io")
-            print(f"DEBUG: ipinfo.io successful: {city}")
-            return lat, lon, city
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Fallback service ipinfo.io also failed: {e}")
-        print(f"DEBUG: ipinfo.io failed: {e}")
+        return ip if ip and ipaddress.ip_address(ip).is_global else None
+    except ValueError:
+        return None
+
+def _cache_get(ip):
+    with _ip_cache_lock:
+        entry = _ip_cache.get(ip)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > IP_CACHE_TTL:
+            del _ip_cache[ip]
+            return None
+        _ip_cache.move_to_end(ip)
+        return entry[0]
+
+def _cache_put(ip, location):
+    with _ip_cache_lock:
+        _ip_cache[ip] = (location, time.monotonic())
+        _ip_cache.move_to_end(ip)
+        while len(_ip_cache) > IP_CACHE_SIZE:
+            _ip_cache.popitem(last=False)
+
+def _query_ipapi(ip):
+    from http_client import get_json
+
+    url = f"{IPAPI_URL}/{ip}/json/" if ip else f"{IPAPI_URL}/json/"
+    # No retries: the other provider is already the fallback
+    data = get_json(url, timeout=5, retries=0)
+    if data.get('latitude') and data.get('longitude'):
+        return data['latitude'], data['longitude'], data.get('city', 'Unknown')
+    return None
+
+def _query_ipinfo(ip):
+    from http_client import get_json
+
+    url = f"{IPINFO_URL}/{ip}/json" if ip else f"{IPINFO_URL}/json"
+    # No retries: the other provider is already the fallback
+    data = get_json(url, timeout=5, retries=0)
+    if 'loc' in data:
+        lat, lon = map(float, data['loc'].split(','))
+        return lat, lon, data.get('city', 'Unknown')
+    return None
 
-    print("DEBUG: Exiting get_ip_location with None")
+@timed()
+def get_ip_location(ip=None, refresh=False):
+    """
+    Get location from IP address. ipapi.co and ipinfo.io are queried
+    concurrently and the first valid answer wins. Results are cached per IP
+    (None = this server's own address) for IP_CACHE_TTL seconds.
+    """
+    if not refresh:
+        cached = _cache_get(ip)
+        record_cache("ip_location", "hit" if cached else "miss")
+        if cached:
+            return cached
+
+    # requests (via http_client) is only loaded once a lookup is needed
+    import requests
+
+    futures = {
+        _ip_executor.submit(_query_ipapi, ip): "ipapi.co",
+        _ip_executor.submit(_query_ipinfo, ip): "ipinfo.io",
+    }
+    for future in as_completed(futures):
+        try:
+            location = future.result()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.warning(f"{futures[future]} failed: {e}")
+            continue
+        if location:
+            logging.info(f"Successfully retrieved location from {futures[future]}")
+            _cache_put(ip, location)
+            return location
+
+    logging.error("All IP location services failed.")
     return None, None, None
 
+@timed()
 def location_ui():
     """UI for selecting location input method, all within the sidebar context."""
-    print("DEBUG: Entering location_ui for sidebar rendering")
-    
     choice = st.sidebar.radio(
         "Location input method:",
         ["Browser GPS", "Auto IP Location", "Manual"],
@@ -73,43 +128,43 @@ def location_ui():
         help="Browser GPS requires HTTPS and permissions. Auto IP uses your public IP. Manual lets you enter coordinates."
     )
 
+    logging.debug(f"Location input method: {choice}")
     if choice == "Browser GPS":
-        print("DEBUG: Sidebar choice: Browser GPS")
         st.sidebar.warning("Browser GPS requires browser permissions and a secure connection (HTTPS). It might not work in all environments.", icon="⚠️")
         lat, lon = get_user_coords()
         if lat is None or lon is None:
             st.sidebar.warning("GPS unavailable or permission denied. Try another option.", icon="⚠️")
-            print("DEBUG: Browser GPS failed or denied in sidebar")
             return None, None, None
         else:
             st.sidebar.success(f"📍 GPS location: {lat:.4f}, {lon:.4f}", icon="✅")
-            print("DEBUG: Browser GPS successful in sidebar")
             return lat, lon, None
 
     elif choice == "Auto IP Location":
-        print("DEBUG: Sidebar choice: Auto IP Location")
-        # Changed to st.spinner - this spinner will appear in the main content area
-        with st.spinner("Getting location from IP..."): # <--- FIX: Changed to st.spinner
-            lat, lon, city = get_ip_location()
-            if lat is None or lon is None:
-                st.sidebar.error("Automatic IP location failed. Please use Manual input.", icon="❌")
-                print("DEBUG: Auto IP location failed in sidebar")
-                return None, None, None
-            else:
-                st.sidebar.success(f"📍 IP location: {city} ({lat:.4f}, {lon:.4f})", icon="✅")
-                print("DEBUG: Auto IP location successful in sidebar")
-                return lat, lon, city
+        refresh = st.sidebar.button("🔄 Refresh location", help="Look up your IP location again.")
+        cached = st.session_state.get("ip_location")
+        if refresh or not cached or time.time() - cached[3] > SESSION_LOCATION_TTL:
+            # Changed to st.spinner - this spinner will appear in the main content area
+            with st.spinner("Getting location from IP..."): # <--- FIX: Changed to st.spinner
+                lat, lon, city = get_ip_location(get_client_ip(), refresh=refresh)
+            if lat is not None and lon is not None:
+                st.session_state["ip_location"] = (lat, lon, city, time.time())
+        else:
+            lat, lon, city = cached[:3]
+
+        if lat is None or lon is None:
+            st.sidebar.error("Automatic IP location failed. Please use Manual input.", icon="❌")
+            return None, None, None
+        else:
+            st.sidebar.success(f"📍 IP location: {city} ({lat:.4f}, {lon:.4f})", icon="✅")
+            return lat, lon, city
 
     else:  # Manual
-        print("DEBUG: Sidebar choice: Manual")
         st.sidebar.info("Enter your coordinates manually:", icon="📝")
         lat = st.sidebar.number_input("Latitude", min_value=-90.0, max_value=90.0, value=0.0, format="%.6f", key="manual_lat")
         lon = st.sidebar.number_input("Longitude", min_value=-180.0, max_value=180.0, value=0.0, format="%.6f", key="manual_lon")
 
         if lat == 0.0 and lon == 0.0:
             st.sidebar.warning("Please enter your actual coordinates for accurate times.", icon="⚠️")
-            print("DEBUG: Manual input (0,0) - prompting for actual coords in sidebar")
             return None, None, None
 
-        print(f"DEBUG: Manual input successful in sidebar: {lat}, {lon}")
         return lat, lon, "Manual"
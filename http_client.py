@@ -0,0 +1,220 @@
+# http_client.py
+"""
+Shared outbound HTTP client for every upstream call (Aladhan, IP lookup).
+
+- one keep-alive connection pool for the whole process
+- single-flight: identical GETs already in flight are awaited, not repeated
+- per-host concurrency limit
+- retry with full-jitter exponential backoff on connection errors, 429 and 5xx
+- optional overall deadline for callers that have a fallback (a page
+  render): attempts and backoff are cut to the time left, and a timed-out
+  attempt is not retried
+- per-host circuit breaker: after HTTP_BREAKER_FAILURES failed calls the host
+  is skipped for HTTP_BREAKER_RESET seconds, then one probe call half-opens it
+- get_json_async() for asyncio callers, sharing the same pool and coalescing
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    HTTP_POOL_SIZE, HTTP_MAX_PER_HOST, HTTP_RETRIES, HTTP_BACKOFF_BASE,
+    HTTP_BREAKER_FAILURES, HTTP_BREAKER_RESET,
+)
+from instrumentation import observe
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+_lock = threading.Lock()
+_inflight = {}
+_host_limits = {}
+_breakers = {}
+_counters = {"requests": 0, "retries": 0, "coalesced": 0, "errors": 0, "short_circuited": 0}
+
+# Threads backing get_json_async; sized to the pool so none wait on a socket
+_executor = ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix="http")
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while a host's circuit breaker is open."""
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def _host_limit(url):
+    host = urlsplit(url).netloc
+    with _lock:
+        if host not in _host_limits:
+            _host_limits[host] = threading.BoundedSemaphore(HTTP_MAX_PER_HOST)
+        return _host_limits[host]
+
+
+def _breaker(host):
+    return _breakers.setdefault(host, {"failures": 0, "opened_at": None, "probing": False})
+
+
+def _breaker_allow(host):
+    with _lock:
+        b = _breaker(host)
+        if b["opened_at"] is None:
+            return True
+        if not b["probing"] and time.monotonic() - b["opened_at"] >= HTTP_BREAKER_RESET:
+            b["probing"] = True  # half-open: let exactly one call through
+            return True
+        return False
+
+
+def _breaker_record(host, ok):
+    with _lock:
+        b = _breaker(host)
+        if ok:
+            b.update(failures=0, opened_at=None, probing=False)
+            return
+        b["failures"] += 1
+        if b["probing"] or b["failures"] >= HTTP_BREAKER_FAILURES:
+            if b["opened_at"] is None or b["probing"]:
+                logging.warning(f"Circuit breaker for {host} opened")
+            b.update(opened_at=time.monotonic(), probing=False)
+
+
+def breaker_state(url_or_host):
+    """Breaker state for the host of `url_or_host`: closed, open or half-open."""
+    host = urlsplit(url_or_host).netloc or url_or_host
+    with _lock:
+        b = _breaker(host)
+        if b["opened_at"] is None:
+            return "closed"
+        if b["probing"] or time.monotonic() - b["opened_at"] >= HTTP_BREAKER_RESET:
+            return "half-open"
+        return "open"
+
+
+def _is_upstream_failure(e):
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(e, "response", None)
+    return response is not None and response.status_code in RETRY_STATUSES
+
+
+def _time_left(url, deadline):
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise requests.exceptions.Timeout(f"GET {url}: deadline exceeded")
+    return left
+
+
+def _fetch_guarded(url, params, timeout, retries, deadline=None):
+    host = urlsplit(url).netloc
+    if not _breaker_allow(host):
+        _count("short_circuited")
+        raise CircuitOpenError(f"Circuit open for {host}")
+    ok = False
+    try:
+        result = _fetch(url, params, timeout, retries, deadline)
+        ok = True
+        return result
+    except requests.exceptions.RequestException as e:
+        # Client errors (bad coordinates etc.) say nothing about upstream health
+        ok = not _is_upstream_failure(e)
+        raise
+    finally:
+        _breaker_record(host, ok)
+
+
+def _get(url, params, timeout):
+    host, status = urlsplit(url).netloc, "error"
+    started = time.perf_counter()
+    try:
+        resp = _session.get(url, params=params, timeout=timeout)
+        status = resp.status_code
+        return resp
+    finally:
+        observe("upstream_request_seconds", time.perf_counter() - started, host=host, status=status)
+
+
+def _fetch(url, params, timeout, retries, deadline=None):
+    limit = _host_limit(url)
+    for attempt in range(retries + 1):
+        try:
+            with limit:
+                _count("requests")
+                resp = _get(url, params, timeout if deadline is None else min(timeout, _time_left(url, deadline)))
+            if resp.status_code not in RETRY_STATUSES or attempt == retries:
+                resp.raise_for_status()
+                return resp.json()
+            logging.warning(f"GET {url} returned {resp.status_code}; retrying")
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            timed_out = isinstance(e, requests.exceptions.Timeout) and deadline is not None
+            if attempt == retries or timed_out:
+                raise
+            logging.warning(f"GET {url} failed ({e}); retrying")
+        _count("retries")
+        backoff = random.uniform(0, HTTP_BACKOFF_BASE * 2 ** attempt)
+        if deadline is not None:
+            backoff = min(backoff, _time_left(url, deadline))
+        time.sleep(backoff)
+
+
+def get_json(url, params=None, timeout=10, retries=HTTP_RETRIES, deadline=None):
+    """
+    GETs `url` and returns the decoded JSON body.
+
+    Concurrent calls for the same URL and params share one request and
+    receive the same object, so callers must not mutate the result. Raises
+    requests.exceptions.RequestException subclasses like requests.get would.
+
+    `deadline` (a time.monotonic() value) bounds the whole call, including
+    waiting on a coalesced request; past it, requests.exceptions.Timeout
+    is raised.
+    """
+    key = url + ("?" + urlencode(sorted(params.items())) if params else "")
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        _count("coalesced")
+        try:
+            return future.result(None if deadline is None else _time_left(url, deadline))
+        except FutureTimeoutError:
+            raise requests.exceptions.Timeout(f"GET {url}: deadline exceeded") from None
+
+    try:
+        result = _fetch_guarded(url, params, timeout, retries, deadline)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        _count("errors")
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+async def get_json_async(url, params=None, timeout=10, retries=HTTP_RETRIES):
+    """asyncio variant of get_json; coalesces with sync callers too."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, get_json, url, params, timeout, retries)
+
+
+def stats():
+    """Request/retry/coalesced/error/short-circuit counters for this process."""
+    with _lock:
+        return dict(_counters)
@@ -0,0 +1,258 @@
+# instrumentation.py
+"""
+Logging setup, timing spans and Prometheus metrics.
+
+Logs: configure_logging() sets the root level (PRAYER_LOG_LEVEL) and either
+the usual text lines or one JSON object per line (PRAYER_LOG_FORMAT=json).
+Extra fields passed as log(..., key=value) become JSON keys, or key=value
+pairs in text mode.
+
+Metrics (PRAYER_METRICS=1): counters and histograms kept in process, served
+in Prometheus text format on http://127.0.0.1:PRAYER_METRICS_PORT/metrics
+(and on service.py's /metrics). When metrics are disabled, @timed returns
+the function unchanged and the recording helpers return immediately.
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import LOG_FORMAT, LOG_LEVEL, METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+ENABLED = METRICS_ENABLED
+# Seconds; covers sub-millisecond renders up to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_help = {
+    "span_duration_seconds": "Duration of instrumented functions",
+    "cache_requests_total": "Cache lookups by cache and result",
+    "upstream_request_seconds": "Latency of outbound HTTP requests by host and outcome",
+    "neighbour_error_seconds": "Largest prayer-time error of timetables reused from a nearby location",
+    "neighbour_distance_km": "Distance to the nearby location a timetable was reused from",
+    "neighbour_rejected_total": "Nearby timetables found but rejected for exceeding the error bound",
+}
+_server = None
+
+
+# ---------- logging ----------
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Installs the root handler once; later calls only adjust the level."""
+    root = logging.getLogger()
+    root.setLevel(level)
+    if any(getattr(h, "_prayer_handler", False) for h in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler._prayer_handler = True
+    handler.setFormatter(_JsonFormatter() if fmt == "json" else
+                         _TextFormatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root.addHandler(handler)
+
+
+def log(logger_, level, msg, **fields):
+    """log(logger, logging.INFO, "message", key=value, ...) with structured fields."""
+    if logger_.isEnabledFor(level):
+        logger_.log(level, msg, extra={"fields": fields})
+
+
+# ---------- metrics ----------
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def count(name, n=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    if ENABLED:
+        _observe(_key(name, labels), value, buckets)
+
+
+def _observe(key, value, buckets=DEFAULT_BUCKETS):
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [buckets, [0] * len(buckets), 0.0, 0]
+        i = bisect_left(buckets, value)
+        if i < len(buckets):
+            hist[1][i] += 1
+        hist[2] += value
+        hist[3] += 1
+
+
+def record_cache(cache, result):
+    """result: "hit", "miss" or "stale"."""
+    count("cache_requests_total", cache=cache, result=result)
+
+
+class _Span:
+    __slots__ = ("name", "key", "started")
+
+    def __init__(self, name):
+        self.name = name
+        self.key = _key("span_duration_seconds", {"span": name})
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _end_span(self.name, self.key, self.started, exc_type)
+        return False
+
+
+def _end_span(name, key, started, exc_type=None):
+    elapsed = time.perf_counter() - started
+    _observe(key, elapsed)
+    if logger.isEnabledFor(logging.DEBUG):
+        log(logger, logging.DEBUG, "span", span=name, ms=round(elapsed * 1000, 3),
+            error=exc_type.__name__ if exc_type else None)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Context manager timing a block into span_duration_seconds{span=name}."""
+    return _Span(name) if ENABLED else _NO_SPAN
+
+
+def timed(name=None):
+    """Decorator form of span(); a no-op that returns `func` itself when metrics are disabled."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+        span_name = name or func.__name__
+        key = _key("span_duration_seconds", {"span": span_name})
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                _end_span(span_name, key, started, type(e))
+                raise
+            _end_span(span_name, key, started)
+            return result
+        return wrapper
+    return decorate
+
+
+def _labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus():
+    """All metrics in Prometheus text exposition format (0.0.4)."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: (v[0], list(v[1]), v[2], v[3]) for k, v in _histograms.items()}
+    lines = []
+    for metric in sorted({name for name, _ in counters}):
+        lines.append(f"# HELP {metric} {_help.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{name}{_labels(labels)} {value}")
+    for metric in sorted({name for name, _ in histograms}):
+        lines.append(f"# HELP {metric} {_help.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, labels), (buckets, counts, total, n) in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, c in zip(buckets, counts):
+                cumulative += c
+                lines.append(f"{name}_bucket{_labels(labels, ('le', bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, ('le', '+Inf'))} {n}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {n}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serves /metrics from a daemon thread, once per process. No-op when disabled."""
+    global _server
+    if not ENABLED:
+        return None
+    with _lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                # Another process (e.g. a second Streamlit worker) already has the port
+                logger.warning(f"Metrics endpoint not started on {host}:{port}: {e}")
+                _server = False
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+            logger.info(f"Metrics on http://{host}:{port}/metrics")
+    return _server or None
@@ -1,38 +1,69 @@
 # notifier.py
 import os
 import logging
-from twilio.rest import Client
+import threading
 from twilio.base.exceptions import TwilioRestException
-from typing import Tuple
+from typing import Optional, Tuple
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# One Client (and so one pooled HTTP session) per credential set
+_clients = {}
+_clients_lock = threading.Lock()
+
 def make_twilio_client():
     sid   = os.getenv("TWILIO_ACCOUNT_SID")
     token = os.getenv("TWILIO_AUTH_TOKEN")
     frm   = os.getenv("TWILIO_PHONE_NUMBER")
     to    = os.getenv("TWILIO_TO_PHONE_NUMBER")
-    
-    if sid and token and frm and to:
-        return Client(sid, token), frm, to
-    
+    # Point at a fake Twilio endpoint for local testing
+    api_url = os.getenv("TWILIO_API_URL")
+
+    if sid and token and frm:
+        key = (sid, token, api_url)
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                # The REST SDK takes ~100 ms to import; load it only once SMS is used
+                from twilio.rest import Client
+
+                client = Client(sid, token)
+                if api_url:
+                    client.api.base_url = api_url
+                _clients[key] = client
+        return client, frm, to
+
     logger.warning("Twilio credentials missing")
     return None, None, None
 
-def send_sms(prayer: str, time_str: str) -> Tuple[bool, str]:
+def reminder_body(prayer: str, time_str: str) -> str:
+    return f"🕌 Reminder: {prayer} at {time_str}. Wudhu & prepare!"
+
+def create_message(to: str, body: str) -> str:
     """
-    Returns (success, message). No UI calls here.
+    Sends one SMS through the shared client and returns its SID.
+    Raises TwilioRestException (or a requests error) on failure.
     """
-    client, frm, to = make_twilio_client()
+    client, frm, _ = make_twilio_client()
     if not client:
+        raise RuntimeError("SMS_NOT_CONFIGURED")
+    return client.messages.create(body=body, from_=frm, to=to).sid
+
+def send_sms(prayer: str, time_str: str, to: Optional[str] = None) -> Tuple[bool, str]:
+    """
+    Returns (success, message). No UI calls here.
+    `to` defaults to TWILIO_TO_PHONE_NUMBER.
+    """
+    client, frm, default_to = make_twilio_client()
+    to = to or default_to
+    if not client or not to:
         return False, "SMS_NOT_CONFIGURED"
-    
-    body = f"🕌 Reminder: {prayer} at {time_str}. Wudhu & prepare!"
+
     try:
-        msg = client.messages.create(body=body, from_=frm, to=to)
-        logger.info(f"SMS sent, SID={msg.sid}")
-        return True, f"SMS queued (SID: {msg.sid})"
+        sid = create_message(to, reminder_body(prayer, time_str))
+        logger.info(f"SMS sent, SID={sid}")
+        return True, f"SMS queued (SID: {sid})"
     except TwilioRestException as e:
         logger.exception("Twilio API error")
         return False, f"SMS_ERROR: {e.msg}"
@@ -0,0 +1,128 @@
+# prayer_schedule.py
+"""
+Compiled prayer schedules for fast "next prayer" lookups.
+
+A multi-day timetable is converted once into a sorted list of UTC epoch
+seconds; each lookup is then a bisect, correct across midnight and DST
+changes because every time was localized on its own date.
+"""
+import bisect
+import time
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+from config import PRAYER_ORDER
+from tz_index import get_tz
+
+
+class CompiledSchedule:
+    """Sorted UTC epochs for a location's prayers over several days."""
+
+    def __init__(self, epochs, names, days, timezone):
+        self.epochs = epochs
+        self.names = names
+        self.days = days
+        self.timezone = timezone
+        self.tz = get_tz(timezone)
+
+    @classmethod
+    def from_days(cls, days, timezone, prayers=PRAYER_ORDER):
+        """
+        days: {date: {"Fajr": "HH:MM", ...}} as returned by fetch_prayer_times.
+        Entries that are missing or unparsable are skipped.
+        """
+        tz = get_tz(timezone)
+        entries = []
+        for day, timings in days.items():
+            for prayer in prayers:
+                try:
+                    hour, minute = map(int, timings[prayer].split(":"))
+                except (KeyError, ValueError):
+                    continue
+                local = tz.localize(datetime(day.year, day.month, day.day, hour, minute))
+                entries.append((local.timestamp(), prayer, day))
+        entries.sort()
+        return cls([e[0] for e in entries], [e[1] for e in entries], [e[2] for e in entries], timezone)
+
+    def next_index(self, now=None):
+        """Index of the first prayer strictly after `now` (epoch seconds), or None."""
+        now = time.time() if now is None else now
+        i = bisect.bisect_right(self.epochs, now)
+        return i if i < len(self.epochs) else None
+
+    def next_prayer(self, now=None):
+        """
+        Returns (prayer, local datetime, seconds remaining), or (None, None, 0)
+        when the schedule has no later prayer. Prayers on a later local date
+        than `now` are labelled "(Tomorrow)".
+        """
+        now = time.time() if now is None else now
+        i = self.next_index(now)
+        if i is None:
+            return None, None, 0
+        prayer_dt = datetime.fromtimestamp(self.epochs[i], self.tz)
+        today = datetime.fromtimestamp(now, self.tz).date()
+        name = self.names[i]
+        if self.days[i] > today:
+            name = f"{name} (Tomorrow)"
+        return name, prayer_dt, int(self.epochs[i] - now)
+
+
+@lru_cache(maxsize=1024)
+def _compile_cached(frozen_days, timezone):
+    return CompiledSchedule.from_days({day: dict(timings) for day, timings in frozen_days}, timezone)
+
+
+def compile_schedule(days, timezone):
+    """CompiledSchedule.from_days, memoized on the timetable contents."""
+    frozen = tuple((day, tuple(sorted(timings.items()))) for day, timings in sorted(days.items()))
+    return _compile_cached(frozen, timezone)
+
+
+# ---------- vectorized lookups ----------
+
+def stack_schedules(schedules):
+    """
+    Packs schedules into a (users, max_entries) float64 matrix, rows padded
+    with +inf, for next_prayer_many.
+    """
+    width = max((len(s.epochs) for s in schedules), default=0)
+    matrix = np.full((len(schedules), width), np.inf)
+    for row, s in enumerate(schedules):
+        matrix[row, :len(s.epochs)] = s.epochs
+    return matrix
+
+
+def epochs_from_timetable(epochs):
+    """
+    Turns batch.to_utc_epochs output restricted to prayer columns, shape
+    (users, days, prayers), into a sorted matrix for next_prayer_many.
+    Also returns, per row, the flat (day * prayers + prayer) position of each
+    sorted entry so results can be mapped back to a day and prayer.
+    """
+    flat = epochs.reshape(epochs.shape[0], -1)
+    flat = np.where(np.isnan(flat), np.inf, flat)
+    order = np.argsort(flat, axis=1, kind="stable")
+    return np.take_along_axis(flat, order, axis=1), order
+
+
+def next_prayer_many(matrix, rows, nows):
+    """
+    Answers "next prayer" for many (user, now) pairs at once.
+
+    matrix: (users, entries) sorted epochs padded with +inf (stack_schedules).
+    rows: user row for each query; nows: epoch seconds for each query.
+    Returns (entry index, seconds remaining); index -1 / inf when none is left.
+    """
+    rows = np.asarray(rows)
+    nows = np.asarray(nows, dtype=float)
+    # Count entries <= now per query; rows are short so a broadcast compare
+    # beats per-row searchsorted.
+    candidates = matrix[rows]
+    index = (candidates <= nows[:, None]).sum(axis=1)
+    last = matrix.shape[1] - 1
+    next_epoch = candidates[np.arange(len(rows)), np.minimum(index, last)]
+    has_next = (index <= last) & np.isfinite(next_epoch)
+    return np.where(has_next, index, -1), np.where(has_next, next_epoch - nows, np.inf)
@@ -0,0 +1,297 @@
+# scheduler.py
+"""
+Standalone SMS reminder scheduler.
+
+Subscriptions (phone, location, method, school, lead time) live in SQLite so
+the Streamlit app can add them while this process runs:
+
+    python scheduler.py add --phone +15551234567 --lat 40.71 --lon -74.01 \\
+        --timezone America/New_York --method 2 --school 0 --lead 10
+    python scheduler.py run
+
+Fire times are computed a UTC day at a time for all subscribers in one
+batch.compute_timetable pass and kept in a min-heap, so each wakeup costs
+O(log n) however many subscribers there are. Due reminders are handed to
+dispatch.SmsDispatcher, which rate-limits, deduplicates and sends them
+concurrently. Set TWILIO_API_URL to point notifier at a fake Twilio
+endpoint for local testing.
+"""
+import argparse
+import heapq
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import NamedTuple
+
+import numpy as np
+import pytz
+
+from astro import TIMING_KEYS
+from batch import compute_timetable, to_utc_epochs
+from config import PRAYER_ORDER, SCHEDULER_DB_PATH, SCHEDULER_POLL_SECONDS, SMS_LATE_GRACE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+# Plan the next UTC day this long before it starts
+PLAN_AHEAD = 600
+
+_PRAYER_COLUMNS = [TIMING_KEYS.index(p) for p in PRAYER_ORDER]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    phone        TEXT    NOT NULL,
+    lat          REAL    NOT NULL,
+    lon          REAL    NOT NULL,
+    timezone     TEXT    NOT NULL,
+    method       INTEGER NOT NULL,
+    school       INTEGER NOT NULL,
+    lead_minutes INTEGER NOT NULL,
+    active       INTEGER NOT NULL DEFAULT 1
+);
+"""
+
+
+class Subscription(NamedTuple):
+    id: int
+    phone: str
+    lat: float
+    lon: float
+    timezone: str
+    method: int
+    school: int
+    lead_minutes: int
+
+
+class Reminder(NamedTuple):
+    fire_at: float
+    subscription: Subscription
+    prayer: str
+    time_str: str
+    day: str  # local date of the prayer, ISO format
+
+
+# ---------- subscription store ----------
+
+def _connect():
+    conn = sqlite3.connect(SCHEDULER_DB_PATH, timeout=5, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def add_subscription(phone, lat, lon, timezone, method=2, school=0, lead_minutes=5):
+    """Stores a subscription and returns its id. A running scheduler picks it up on its next poll."""
+    pytz.timezone(timezone)  # reject unknown zones up front
+    with closing(_connect()) as conn:
+        cur = conn.execute(
+            "INSERT INTO subscriptions (phone, lat, lon, timezone, method, school, lead_minutes) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (phone, lat, lon, timezone, method, school, lead_minutes),
+        )
+        return cur.lastrowid
+
+
+def remove_subscription(subscription_id):
+    with closing(_connect()) as conn:
+        conn.execute("UPDATE subscriptions SET active = 0 WHERE id = ?", (subscription_id,))
+
+
+def load_subscriptions(after_id=0):
+    """Active subscriptions with id > after_id, in id order."""
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            "SELECT id, phone, lat, lon, timezone, method, school, lead_minutes "
+            "FROM subscriptions WHERE active = 1 AND id > ? ORDER BY id",
+            (after_id,),
+        ).fetchall()
+    return [Subscription(*row) for row in rows]
+
+
+def _active_ids():
+    with closing(_connect()) as conn:
+        return {row[0] for row in conn.execute("SELECT id FROM subscriptions WHERE active = 1")}
+
+
+# ---------- fire time computation ----------
+
+def reminders_between(subs, start, end):
+    """All reminders for `subs` firing in [start, end) (UTC epoch seconds), unsorted."""
+    if not subs:
+        return []
+    # Local dates around the window cover every zone's offset from UTC
+    first = datetime.fromtimestamp(start, dt_timezone.utc).date() - timedelta(days=1)
+    last = datetime.fromtimestamp(end, dt_timezone.utc).date() + timedelta(days=1)
+
+    timezones = [s.timezone for s in subs]
+    dates, table = compute_timetable(
+        [s.lat for s in subs], [s.lon for s in subs],
+        [s.method for s in subs], [s.school for s in subs],
+        first, last, timezones,
+    )
+    table = table[:, :, _PRAYER_COLUMNS]
+    leads = np.array([s.lead_minutes for s in subs], dtype=float)[:, None, None] * 60
+    fire = to_utc_epochs(dates, table, timezones) - leads
+
+    with np.errstate(invalid="ignore"):
+        due = (fire >= start) & (fire < end)
+    day_strings = [str(d) for d in dates]
+    reminders = []
+    for i, j, k in zip(*np.nonzero(due)):
+        minutes = int(table[i, j, k])
+        reminders.append(Reminder(float(fire[i, j, k]), subs[i], PRAYER_ORDER[k],
+                                  f"{minutes // 60:02d}:{minutes % 60:02d}", day_strings[j]))
+    return reminders
+
+
+# ---------- scheduler ----------
+
+class NotificationScheduler:
+    """
+    Min-heap of reminders for the current UTC day plus a planning event that
+    loads the next day shortly before it starts.
+    """
+
+    def __init__(self, dispatcher=None, poll_seconds=SCHEDULER_POLL_SECONDS):
+        if dispatcher is None:
+            from dispatch import SmsDispatcher
+            dispatcher = SmsDispatcher()
+        self.dispatcher = dispatcher
+        self.poll_seconds = poll_seconds
+        self._heap = []
+        self._seq = itertools.count()  # tie-breaker so heap never compares payloads
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._subs = {}
+        self._last_id = 0
+        self._window_end = None
+        self.stats = {"scheduled": 0, "dispatched": 0}
+
+    def _push(self, when, kind, payload=None):
+        heapq.heappush(self._heap, (when, next(self._seq), kind, payload))
+
+    def add(self, subs, now=None):
+        """Schedules the rest of the current window for newly added subscriptions."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._window_end is None:
+                self._window_end = (now // DAY + 1) * DAY
+                self._push(self._window_end - PLAN_AHEAD, "plan")
+            for sub in subs:
+                self._subs[sub.id] = sub
+                self._last_id = max(self._last_id, sub.id)
+            reminders = reminders_between(subs, now, self._window_end)
+            for r in reminders:
+                self._push(r.fire_at, "send", r)
+            self.stats["scheduled"] += len(reminders)
+        self._wake.set()
+
+    def _plan_next_window(self):
+        start, end = self._window_end, self._window_end + DAY
+        reminders = reminders_between(list(self._subs.values()), start, end)
+        for r in reminders:
+            self._push(r.fire_at, "send", r)
+        self.stats["scheduled"] += len(reminders)
+        self._window_end = end
+        self._push(end - PLAN_AHEAD, "plan")
+        logger.info(f"Planned {len(reminders)} reminders for the next UTC day")
+
+    def _dispatch(self, reminders):
+        from dispatch import Message, dedupe_key
+        from notifier import reminder_body
+        self.dispatcher.submit([
+            Message(dedupe_key(r.subscription.phone, r.prayer, r.day),
+                    r.subscription.phone, reminder_body(r.prayer, r.time_str),
+                    due_at=r.fire_at,
+                    deadline=r.fire_at + r.subscription.lead_minutes * 60 + SMS_LATE_GRACE_SECONDS)
+            for r in reminders
+        ])
+        self.stats["dispatched"] += len(reminders)
+
+    def _poll(self):
+        new = load_subscriptions(after_id=self._last_id)
+        if new:
+            self.add(new)
+        active = _active_ids()
+        with self._lock:
+            for sub_id in [i for i in self._subs if i not in active]:
+                del self._subs[sub_id]
+
+    def run_pending(self, now=None):
+        """Dispatches everything due by `now`. Returns seconds until the next event."""
+        now = time.time() if now is None else now
+        with self._lock:
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                _, _, kind, payload = heapq.heappop(self._heap)
+                if kind == "plan":
+                    self._plan_next_window()
+                elif payload.subscription.id in self._subs:  # skip unsubscribed
+                    due.append(payload)
+            if due:
+                self._dispatch(due)
+            return self._heap[0][0] - now if self._heap else None
+
+    def run_forever(self):
+        self.add(load_subscriptions())
+        next_poll = time.time() + self.poll_seconds
+        while not self._stop.is_set():
+            self._wake.clear()
+            wait = self.run_pending()
+            now = time.time()
+            if now >= next_poll:
+                self._poll()
+                next_poll = now + self.poll_seconds
+                continue
+            wait = next_poll - now if wait is None else min(wait, next_poll - now)
+            self._wake.wait(max(wait, 0))
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self.dispatcher.shutdown()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="SMS prayer reminder scheduler")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add a subscription")
+    add.add_argument("--phone", required=True)
+    add.add_argument("--lat", type=float, required=True)
+    add.add_argument("--lon", type=float, required=True)
+    add.add_argument("--timezone", required=True, help="IANA zone, e.g. Europe/London")
+    add.add_argument("--method", type=int, default=2)
+    add.add_argument("--school", type=int, default=0, choices=[0, 1])
+    add.add_argument("--lead", type=int, default=5, help="minutes before the prayer")
+
+    remove = commands.add_parser("remove", help="deactivate a subscription")
+    remove.add_argument("id", type=int)
+
+    commands.add_parser("run", help="run the scheduler until interrupted")
+
+    args = parser.parse_args(argv)
+    if args.command == "add":
+        sub_id = add_subscription(args.phone, args.lat, args.lon, args.timezone,
+                                  args.method, args.school, args.lead)
+        print(f"Added subscription {sub_id}")
+    elif args.command == "remove":
+        remove_subscription(args.id)
+        print(f"Removed subscription {args.id}")
+    else:
+        scheduler = NotificationScheduler()
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# service.py
+"""
+Headless JSON timetable service, alongside the Streamlit UI.
+
+    python service.py [--host 0.0.0.0] [--port 8080]
+
+    GET /v1/today?lat=..&lon=..&method=2&school=0
+    GET /v1/next?lat=..&lon=..&method=2&school=0
+    GET /v1/calendar?lat=..&lon=..&method=2&school=0&year=2025&month=3
+    GET /healthz
+    GET /metrics     (Prometheus text format, with PRAYER_METRICS=1)
+
+Runs on a bare asyncio.Protocol with keep-alive. Responses are cached as
+ready-to-send bytes until they expire (local midnight for today/calendar,
+the next prayer for /v1/next), carry ETag and Cache-Control so CDNs and
+clients can cache them, and answer If-None-Match with 304. Cache hits
+never leave the event loop; misses run fetch_prayer_times on a thread.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from api import fetch_prayer_times
+from batch import compute_timetable, row_to_timings
+from config import METHOD_NAMES, SERVICE_CACHE_SIZE
+from instrumentation import ENABLED as METRICS_ENABLED, configure_logging, record_cache, render_prometheus
+from prayer_schedule import compile_schedule
+from tz_index import get_tz
+
+logger = logging.getLogger(__name__)
+
+# Coordinates are rounded to 4 decimals (~11 m) before lookup and caching
+COORD_DECIMALS = 4
+MAX_HEADER_BYTES = 16384
+
+_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 500: "Internal Server Error", 502: "Bad Gateway"}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _location_params(query):
+    def one(name, cast, default=None):
+        values = query.get(name)
+        if not values:
+            if default is None:
+                raise BadRequest(f"missing parameter: {name}")
+            return default
+        try:
+            return cast(values[0])
+        except ValueError:
+            raise BadRequest(f"invalid parameter: {name}")
+
+    lat = round(one("lat", float), COORD_DECIMALS)
+    lon = round(one("lon", float), COORD_DECIMALS)
+    method = one("method", int, 2)
+    school = one("school", int, 0)
+    if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        raise BadRequest("lat/lon out of range")
+    if method not in METHOD_NAMES:
+        raise BadRequest(f"unknown method: {method}")
+    if school not in (0, 1):
+        raise BadRequest("school must be 0 or 1")
+    return lat, lon, method, school, one
+
+
+def _next_midnight(tz, day):
+    return tz.localize(datetime.combine(day + timedelta(days=1), datetime.min.time())).timestamp()
+
+
+def _today(lat, lon, method, school, _):
+    timings, timezone = fetch_prayer_times(lat, lon, method, school)
+    tz = get_tz(timezone)
+    today = datetime.now(tz).date()
+    body = {"date": today.isoformat(), "timezone": timezone, "method": method,
+            "school": school, "timings": timings}
+    return body, _next_midnight(tz, today)
+
+
+def _next(lat, lon, method, school, _):
+    timings, timezone = fetch_prayer_times(lat, lon, method, school)
+    tz = get_tz(timezone)
+    today = datetime.now(tz).date()
+    tomorrow = today + timedelta(days=1)
+    _, table = compute_timetable([lat], [lon], [method], [school], tomorrow, tomorrow, [timezone])
+    schedule = compile_schedule({today: timings, tomorrow: row_to_timings(table[0, 0])}, timezone)
+    i = schedule.next_index()
+    if i is None:
+        return {"timezone": timezone, "next": None}, _next_midnight(tz, today)
+    at = schedule.epochs[i]
+    body = {"timezone": timezone, "next": {
+        "prayer": schedule.names[i],
+        "date": schedule.days[i].isoformat(),
+        "time": datetime.fromtimestamp(at, tz).strftime("%H:%M"),
+        "epoch": int(at),
+    }}
+    # The answer only changes once that prayer has started
+    return body, at
+
+
+def _calendar(lat, lon, method, school, one):
+    _, timezone = fetch_prayer_times(lat, lon, method, school)
+    tz = get_tz(timezone)
+    today = datetime.now(tz).date()
+    year = one("year", int, today.year)
+    month = one("month", int, today.month)
+    if not 1 <= month <= 12 or not 1 <= year <= 9999:
+        raise BadRequest("invalid year/month")
+    first = date(year, month, 1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    dates, table = compute_timetable([lat], [lon], [method], [school], first, last, [timezone])
+    days = [{"date": str(d), "timings": row_to_timings(row)} for d, row in zip(dates, table[0])]
+    body = {"timezone": timezone, "year": year, "month": month, "method": method,
+            "school": school, "days": days}
+    return body, _next_midnight(tz, today)
+
+
+ROUTES = {"/v1/today": _today, "/v1/next": _next, "/v1/calendar": _calendar}
+
+
+class TimetableService:
+    """Routing, response caching and in-flight coalescing; transport-agnostic."""
+
+    def __init__(self, cache_size=SERVICE_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # request target -> (expires_at, etag, body bytes)
+        self._inflight = {}
+        self.stats = {"requests": 0, "hits": 0, "misses": 0, "not_modified": 0, "errors": 0}
+
+    def cached(self, target, now=None):
+        """(etag, body, expires_at) for a fresh cached response, else None. Never blocks."""
+        entry = self._cache.get(target)
+        if entry is None:
+            return None
+        if entry[0] <= (time.time() if now is None else now):
+            del self._cache[target]
+            return None
+        self._cache.move_to_end(target)
+        return entry[1], entry[2], entry[0]
+
+    async def compute(self, target):
+        """Builds (and caches) the response for a miss. Returns (status, etag, body, expires_at)."""
+        parts = urlsplit(target)
+        handler = ROUTES.get(parts.path)
+        if handler is None:
+            return 404, None, _json_bytes({"error": "not found"}), None
+        query = parse_qs(parts.query)
+        try:
+            params = _location_params(query)
+        except BadRequest as e:
+            return 400, None, _json_bytes({"error": str(e)}), None
+
+        # Concurrent misses for the same rounded location share one computation
+        key = (parts.path, params[:4], tuple(sorted((k, v[0]) for k, v in query.items()
+                                                    if k not in ("lat", "lon", "method", "school"))))
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(None, handler, *params)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        try:
+            body, expires_at = await asyncio.shield(future)
+        except BadRequest as e:
+            return 400, None, _json_bytes({"error": str(e)}), None
+        except Exception:
+            logger.exception(f"Failed to serve {target}")
+            self.stats["errors"] += 1
+            return 502, None, _json_bytes({"error": "upstream unavailable"}), None
+
+        data = _json_bytes(body)
+        etag = '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"'
+        self._store(target, expires_at, etag, data)
+        return 200, etag, data, expires_at
+
+    def _store(self, target, expires_at, etag, data):
+        self._cache[target] = (expires_at, etag, data)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+def _json_bytes(obj):
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def build_response(status, body=b"", etag=None, expires_at=None, keep_alive=True, now=None,
+                   content_type="application/json"):
+    headers = [f"HTTP/1.1 {status} {_REASONS[status]}",
+               f"Content-Type: {content_type}",
+               f"Content-Length: {len(body)}"]
+    if etag:
+        headers.append(f"ETag: {etag}")
+    if expires_at is not None:
+        max_age = max(0, int(expires_at - (time.time() if now is None else now)))
+        headers.append(f"Cache-Control: public, max-age={max_age}")
+    else:
+        headers.append("Cache-Control: no-store")
+    headers.append("Connection: keep-alive" if keep_alive else "Connection: close")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode() + body
+
+
+class HttpProtocol(asyncio.Protocol):
+    """Minimal HTTP/1.1 GET server with keep-alive and in-order pipelining."""
+
+    def __init__(self, service):
+        self.service = service
+        self.transport = None
+        self.buffer = b""
+        self.busy = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        if not self.busy:
+            self._process()
+
+    def _process(self):
+        while not self.busy and not self.transport.is_closing():
+            end = self.buffer.find(b"\r\n\r\n")
+            if end < 0:
+                if len(self.buffer) > MAX_HEADER_BYTES:
+                    self._finish(build_response(400, keep_alive=False), False)
+                return
+            head = self.buffer[:end].decode("latin-1")
+            self.buffer = self.buffer[end + 4:]
+            request_line, *header_lines = head.split("\r\n")
+            try:
+                method, target, version = request_line.split(" ", 2)
+            except ValueError:
+                self._finish(build_response(400, keep_alive=False), False)
+                return
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+
+            self.service.stats["requests"] += 1
+            if method != "GET":
+                self._finish(build_response(405, keep_alive=False), False)
+                return
+            if target == "/healthz":
+                self._finish(build_response(200, b'{"ok":true}', keep_alive=keep_alive), keep_alive)
+                continue
+            if target == "/metrics" and METRICS_ENABLED:
+                body = render_prometheus().encode()
+                self._finish(build_response(200, body, keep_alive=keep_alive,
+                                            content_type="text/plain; version=0.0.4"), keep_alive)
+                continue
+
+            hit = self.service.cached(target)
+            if hit is not None:
+                self.service.stats["hits"] += 1
+                record_cache("service", "hit")
+                etag, body, expires_at = hit
+                self._finish(self._conditional(headers, 200, etag, body, expires_at, keep_alive), keep_alive)
+                continue
+
+            self.service.stats["misses"] += 1
+            record_cache("service", "miss")
+            self.busy = True
+            self.transport.pause_reading()
+            task = asyncio.ensure_future(self.service.compute(target))
+            task.add_done_callback(lambda t, h=headers, k=keep_alive: self._on_computed(t, h, k))
+
+    def _conditional(self, headers, status, etag, body, expires_at, keep_alive):
+        if status == 200 and etag and headers.get("if-none-match") == etag:
+            self.service.stats["not_modified"] += 1
+            return build_response(304, etag=etag, expires_at=expires_at, keep_alive=keep_alive)
+        return build_response(status, body, etag, expires_at, keep_alive)
+
+    def _on_computed(self, task, headers, keep_alive):
+        self.busy = False
+        if self.transport.is_closing():
+            return
+        status, etag, body, expires_at = task.result()
+        self._finish(self._conditional(headers, status, etag, body, expires_at, keep_alive), keep_alive)
+        if keep_alive:
+            self.transport.resume_reading()
+            self._process()
+
+    def _finish(self, response, keep_alive):
+        self.transport.write(response)
+        if not keep_alive:
+            self.transport.close()
+
+
+async def serve(host, port):
+    service = TimetableService()
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(lambda: HttpProtocol(service), host, port, reuse_address=True)
+    logger.info(f"Serving timetables on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    configure_logging()
+    parser = argparse.ArgumentParser(description="JSON prayer timetable service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
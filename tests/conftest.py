@@ -0,0 +1,18 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """timetable_cache on an empty SQLite file of its own."""
+    import timetable_cache
+    monkeypatch.setattr(timetable_cache, "CACHE_DB_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(timetable_cache, "_local", threading.local())
+    return timetable_cache
@@ -0,0 +1,27 @@
+import time
+
+import pytest
+
+import api
+from test_http_client import Hung
+
+
+@pytest.fixture
+def hung_aladhan(monkeypatch, cache):
+    server = Hung()
+    monkeypatch.setattr(api, "ALADHAN_API_URL", server.url.rsplit("/v1/", 1)[0])
+    monkeypatch.setattr(api, "PRAYER_TIME_SOURCE", "aladhan")
+    monkeypatch.setattr(api, "ALADHAN_PAGE_DEADLINE", 0.5)
+    monkeypatch.setattr(api, "stored_timings", lambda *args: None)
+    yield server
+    server.close()
+
+
+def test_page_falls_back_to_the_local_engine_at_its_deadline(hung_aladhan):
+    started = time.monotonic()
+    timings, timezone, freshness = api.get_prayer_times(21.4225, 39.8262, 4, 0)
+    assert time.monotonic() - started < 2
+    assert freshness["source"] == "fallback"
+    assert timezone == "Asia/Riyadh"
+    assert timings["Fajr"] != "-----"
+    assert len(hung_aladhan.connections) == 1
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+import requests
+
+import dispatch
+from dispatch import DedupeStore, Message, SmsDispatcher
+
+
+@pytest.fixture
+def dispatcher(tmp_path):
+    sent = []
+
+    def make(**kwargs):
+        d = SmsDispatcher(send=lambda to, body: sent.append(to) or f"SM{len(sent)}",
+                          store=DedupeStore(str(tmp_path / "dispatch.sqlite3")), **kwargs)
+        d.sent = sent
+        return d
+
+    return make
+
+
+def test_messages_past_their_deadline_are_dropped(dispatcher):
+    d = dispatcher(rate=1e6, burst=1e6)
+    now = time.time()
+    messages = [Message("late|Fajr|2026-10-17", "+1", "x", due_at=now - 600, deadline=now - 1),
+                Message("ok|Fajr|2026-10-17", "+2", "x", due_at=now, deadline=now + 600)]
+    assert d.send_batch(messages) == 1
+    d.shutdown()
+    assert d.sent == ["+2"]
+    assert d.stats()["expired"] == 1
+
+
+def test_messages_expiring_in_the_rate_limiter_are_not_sent(dispatcher):
+    # 2 messages per second with a burst of 1: most of 10 outlive a 1 s deadline
+    d = dispatcher(rate=2, burst=1, concurrency=4)
+    now = time.time()
+    messages = [Message(f"{i}|Fajr|2026-10-17", f"+{i}", "x", due_at=now, deadline=now + 1) for i in range(10)]
+    failed = d.send_batch(messages)
+    d.shutdown()
+    stats = d.stats()
+    assert stats["sent"] + stats["expired"] == 10
+    assert failed == stats["expired"] >= 5
+    assert len(d.sent) == stats["sent"]
+
+
+def test_latency_is_measured_from_the_due_time(dispatcher):
+    d = dispatcher(rate=1e6, burst=1e6)
+    now = time.time()
+    d.send_batch([Message("a|Fajr|2026-10-17", "+1", "x", due_at=now - 30, deadline=now + 600)])
+    d.shutdown()
+    assert d.stats()["latency_max"] >= 30
+
+
+def test_without_due_time_latency_starts_at_submission(dispatcher):
+    d = dispatcher(rate=1e6, burst=1e6)
+    d.send_batch([Message("a|Fajr|2026-10-17", "+1", "x")])
+    d.shutdown()
+    assert 0 <= d.stats()["latency_max"] < 5
+
+
+def test_resubmitted_messages_are_sent_once(dispatcher):
+    d = dispatcher(rate=1e6, burst=1e6)
+    messages = [Message("a|Fajr|2026-10-17", "+1", "x"), Message("b|Fajr|2026-10-17", "+2", "x")]
+    assert d.send_batch(messages) == 0
+    assert d.send_batch(messages + messages[:1]) == 0
+    d.shutdown()
+    assert d.sent == ["+1", "+2"]
+    assert d.stats()["sent"] == 2
+    assert d.stats()["duplicates"] == 3
+
+
+def test_restarted_dispatcher_does_not_resend(dispatcher):
+    first = dispatcher(rate=1e6, burst=1e6)
+    first.send_batch([Message("a|Fajr|2026-10-17", "+1", "x")])
+    first.shutdown()
+    # A new process over the same SQLite log, e.g. after a restart
+    second = dispatcher(rate=1e6, burst=1e6)
+    second.send_batch([Message("a|Fajr|2026-10-17", "+1", "x")])
+    second.shutdown()
+    assert first.sent == ["+1"]
+    assert second.stats()["duplicates"] == 1
+
+
+def test_retried_message_is_sent_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(dispatch.random, "uniform", lambda low, high: 0)
+    sent, calls = [], []
+
+    def send(to, body):
+        calls.append(to)
+        if len(calls) == 1:
+            raise requests.exceptions.ConnectionError("reset")
+        sent.append(to)
+        return "SM1"
+
+    d = SmsDispatcher(send=send, store=DedupeStore(str(tmp_path / "dispatch.sqlite3")), rate=1e6, burst=1e6)
+    assert d.send_batch([Message("a|Fajr|2026-10-17", "+1", "x")] * 2) == 0
+    d.shutdown()
+    assert calls == ["+1", "+1"]
+    assert sent == ["+1"]
+    assert d.stats()["retries"] == 1
+    assert d.stats()["duplicates"] == 1
@@ -0,0 +1,248 @@
+import socket
+import threading
+import time
+
+import pytest
+import requests
+
+import http_client
+from stubs import StubServer
+
+
+class Upstream:
+    """Stub whose answers are taken from `statuses` in order, then `default`."""
+
+    def __init__(self, statuses=(), default=200, latency=0.0):
+        self.statuses = list(statuses)
+        self.default = default
+        self.server = StubServer("upstream", self._route, latency).start()
+
+    def _route(self, method, path, query, body):
+        status = self.statuses.pop(0) if self.statuses else self.default
+        return status, {"status": status, "path": path}
+
+    @property
+    def url(self):
+        return self.server.url + "/v1/thing"
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+
+@pytest.fixture
+def upstream():
+    servers = []
+
+    def start(*args, **kwargs):
+        servers.append(Upstream(*args, **kwargs))
+        return servers[-1]
+
+    yield start
+    for s in servers:
+        s.server.stop()
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """Upper bounds of the backoff sleeps, which are shortened to 10 ms steps."""
+    bounds = []
+
+    class Jitter:
+        @staticmethod
+        def uniform(low, high):
+            bounds.append(high)
+            return 0
+
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(http_client, "random", Jitter)
+    return bounds
+
+
+def test_identical_concurrent_gets_share_one_request(upstream):
+    stub = upstream(latency=0.3)
+    before = http_client.stats()["coalesced"]
+    results = [None] * 5
+    barrier = threading.Barrier(5)
+
+    def call(i):
+        barrier.wait()
+        results[i] = http_client.get_json(stub.url, {"b": 2, "a": 1})
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert stub.requests == 1
+    assert all(r is results[0] for r in results)
+    assert http_client.stats()["coalesced"] - before == 4
+
+
+def test_sequential_gets_are_not_coalesced(upstream):
+    stub = upstream()
+    http_client.get_json(stub.url)
+    http_client.get_json(stub.url)
+    assert stub.requests == 2
+
+
+def test_retries_5xx_with_exponential_backoff(upstream, backoffs):
+    stub = upstream(statuses=[503, 502])
+    assert http_client.get_json(stub.url, retries=2)["status"] == 200
+    assert stub.requests == 3
+    assert backoffs == [0.01, 0.02]
+
+
+def test_gives_up_after_retries(upstream, backoffs):
+    stub = upstream(default=500)
+    with pytest.raises(requests.exceptions.HTTPError):
+        http_client.get_json(stub.url, retries=2)
+    assert stub.requests == 3
+
+
+def test_client_errors_are_not_retried(upstream, backoffs):
+    stub = upstream(default=400)
+    with pytest.raises(requests.exceptions.HTTPError):
+        http_client.get_json(stub.url, retries=2)
+    assert stub.requests == 1
+    assert http_client.breaker_state(stub.url) == "closed"
+
+
+def test_connection_errors_are_retried(backoffs):
+    server = StubServer("gone", lambda *args: (200, {})).start()
+    url = server.url
+    server.stop()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        http_client.get_json(url, retries=1, timeout=1)
+    assert backoffs == [0.01]
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(http_client, "HTTP_BREAKER_RESET", 0.2)
+
+
+def test_breaker_opens_then_half_opens_and_closes(upstream, breaker):
+    stub = upstream(default=500)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            http_client.get_json(stub.url, retries=0)
+    assert http_client.breaker_state(stub.url) == "open"
+
+    # Open: fails fast without touching the network
+    with pytest.raises(http_client.CircuitOpenError):
+        http_client.get_json(stub.url, retries=0)
+    assert stub.requests == 2
+
+    time.sleep(0.25)
+    assert http_client.breaker_state(stub.url) == "half-open"
+    stub.default = 200
+    assert http_client.get_json(stub.url, retries=0)["status"] == 200
+    assert stub.requests == 3
+    assert http_client.breaker_state(stub.url) == "closed"
+
+
+def test_failed_probe_reopens_breaker(upstream, breaker):
+    stub = upstream(default=503)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            http_client.get_json(stub.url, retries=0)
+    time.sleep(0.25)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        http_client.get_json(stub.url, retries=0)  # the half-open probe
+    assert stub.requests == 3
+    assert http_client.breaker_state(stub.url) == "open"
+    with pytest.raises(http_client.CircuitOpenError):
+        http_client.get_json(stub.url, retries=0)
+    assert stub.requests == 3
+
+
+def test_half_open_lets_exactly_one_probe_through(upstream, breaker):
+    stub = upstream(statuses=[500, 500], latency=0.0)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            http_client.get_json(stub.url, retries=0)
+    time.sleep(0.25)
+    stub.server.latency = 0.3
+    errors = []
+
+    def probe(path):
+        try:
+            http_client.get_json(stub.server.url + path, retries=0)
+        except http_client.CircuitOpenError as e:
+            errors.append(e)
+
+    # Different paths, so the calls are not coalesced into one
+    threads = [threading.Thread(target=probe, args=(f"/p{i}",)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert stub.requests == 3
+    assert len(errors) == 2
+
+
+class Hung:
+    """Accepts connections and never answers, like an upstream stuck mid-request."""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.connections = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                self.connections.append(self.sock.accept()[0])
+            except OSError:
+                return
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.sock.getsockname()[1]}/v1/thing"
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+        self.sock.close()
+
+
+@pytest.fixture
+def hung():
+    server = Hung()
+    yield server
+    server.close()
+
+
+def test_deadline_bounds_the_call_and_skips_retries(hung, backoffs):
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        http_client.get_json(hung.url, timeout=10, retries=2, deadline=started + 0.5)
+    assert time.monotonic() - started < 1.5
+    assert len(hung.connections) == 1
+    assert backoffs == []
+
+
+def test_coalesced_caller_gives_up_at_its_deadline(hung):
+    errors = []
+
+    def lead():
+        try:
+            http_client.get_json(hung.url, timeout=1.5, retries=0)
+        except requests.exceptions.Timeout as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    time.sleep(0.2)
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        http_client.get_json(hung.url, deadline=started + 0.3)
+    assert time.monotonic() - started < 1.0
+    leader.join()
+    assert len(errors) == 1 and len(hung.connections) == 1
@@ -0,0 +1,110 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+import pytz
+
+from astro import TIMING_KEYS, compute_prayer_times
+from batch import compute_timetable, to_utc_epochs
+from config import PRAYER_ORDER
+from prayer_schedule import CompiledSchedule, epochs_from_timetable, next_prayer_many, stack_schedules
+
+LONDON = (51.5074, -0.1278, "Europe/London")
+TZ = pytz.timezone("Europe/London")
+
+
+def _days(first, count, lat=LONDON[0], lon=LONDON[1], timezone=LONDON[2]):
+    days = [first + timedelta(days=i) for i in range(count)]
+    return {day: compute_prayer_times(lat, lon, 3, 0, timezone, day)[0] for day in days}
+
+
+def _epoch(day, hhmm):
+    hour, minute = map(int, hhmm.split(":"))
+    return TZ.localize(datetime(day.year, day.month, day.day, hour, minute)).timestamp()
+
+
+@pytest.mark.parametrize("first, shift", [
+    (date(2026, 3, 28), -3600),  # clocks go forward at 01:00 on the 29th
+    (date(2026, 10, 24), 3600),  # and back at 02:00 on the 25th
+])
+def test_after_isha_the_next_prayer_is_tomorrows_fajr_across_dst(first, shift):
+    days = _days(first, 2)
+    second = first + timedelta(days=1)
+    schedule = CompiledSchedule.from_days(days, LONDON[2])
+    now = _epoch(first, days[first]["Isha"]) + 60
+
+    name, when, remaining = schedule.next_prayer(now)
+
+    assert name == "Fajr (Tomorrow)"
+    assert when.date() == second and when.strftime("%H:%M") == days[second]["Fajr"]
+    assert when.utcoffset() == TZ.localize(datetime(second.year, second.month, second.day, 12)).utcoffset()
+    # The wall-clock gap between the two times is off by the hour the clocks moved
+    wall = (datetime.combine(second, datetime.strptime(days[second]["Fajr"], "%H:%M").time())
+            - datetime.combine(first, datetime.strptime(days[first]["Isha"], "%H:%M").time()))
+    assert remaining == wall.total_seconds() + shift - 60
+
+
+def test_after_the_switch_the_next_prayer_is_todays():
+    days = _days(date(2026, 3, 28), 2)
+    day = date(2026, 3, 29)
+    schedule = CompiledSchedule.from_days(days, LONDON[2])
+    now = TZ.localize(datetime(2026, 3, 29, 2, 30)).timestamp()  # BST, 30 min after the switch
+
+    name, when, remaining = schedule.next_prayer(now)
+
+    assert name == "Fajr"
+    assert when.strftime("%H:%M") == days[day]["Fajr"]
+    assert remaining == _epoch(day, days[day]["Fajr"]) - now
+
+
+def test_each_prayer_is_next_until_it_starts():
+    day = date(2026, 3, 29)
+    days = _days(day, 2)
+    schedule = CompiledSchedule.from_days(days, LONDON[2])
+    for prayer in PRAYER_ORDER:
+        at = _epoch(day, days[day][prayer])
+        assert schedule.next_prayer(at - 1)[0] == prayer
+        assert schedule.next_prayer(at)[0] != prayer  # strictly after `now`
+
+
+def test_no_later_prayer():
+    days = _days(date(2026, 3, 28), 1)
+    schedule = CompiledSchedule.from_days(days, LONDON[2])
+    assert schedule.next_prayer(_epoch(date(2026, 3, 28), days[date(2026, 3, 28)]["Isha"]) + 1) == (None, None, 0)
+
+
+def test_missing_times_are_skipped():
+    day = date(2026, 6, 21)
+    schedule = CompiledSchedule.from_days({day: {"Fajr": "-----", "Dhuhr": "13:02"}}, "Europe/Oslo")
+    assert schedule.names == ["Dhuhr"]
+
+
+def test_next_prayer_many_matches_compiled_schedules():
+    # London and New York across both March switches (the US one is two weeks earlier)
+    locations = [LONDON, (40.7128, -74.0060, "America/New_York")]
+    first, last = date(2026, 3, 7), date(2026, 3, 30)
+    columns = [TIMING_KEYS.index(p) for p in PRAYER_ORDER]
+    dates, table = compute_timetable([l[0] for l in locations], [l[1] for l in locations], [3, 3], [0, 0],
+                                     first, last, [l[2] for l in locations])
+    matrix, order = epochs_from_timetable(to_utc_epochs(dates, table[:, :, columns], [l[2] for l in locations]))
+
+    schedules = [CompiledSchedule.from_days(_days(first, (last - first).days + 1, *loc), loc[2])
+                 for loc in locations]
+    assert np.array_equal(stack_schedules(schedules), matrix)
+
+    start = datetime(2026, 3, 7, tzinfo=pytz.utc).timestamp()
+    nows = start + np.arange(0, 23 * 86400, 3547.0)  # every ~hour, drifting through the day
+    rows = np.arange(len(nows)) % len(locations)
+    index, remaining = next_prayer_many(matrix, rows, nows)
+    for row, now, i, left in zip(rows, nows, index, remaining):
+        name, when, seconds = schedules[row].next_prayer(now)
+        day, prayer = divmod(order[row, i], len(PRAYER_ORDER))
+        assert (PRAYER_ORDER[prayer], dates[day]) == (schedules[row].names[i], schedules[row].days[i])
+        assert left == when.timestamp() - now and int(left) == seconds
+
+
+def test_next_prayer_many_past_the_last_entry():
+    days = _days(date(2026, 3, 28), 1)
+    matrix = stack_schedules([CompiledSchedule.from_days(days, LONDON[2])])
+    index, remaining = next_prayer_many(matrix, [0], [matrix[0, -1]])
+    assert index[0] == -1 and remaining[0] == np.inf
@@ -0,0 +1,137 @@
+import time
+from concurrent.futures import wait
+from datetime import date, datetime, timezone
+from urllib.parse import parse_qs
+
+import pytest
+
+import dispatch
+import scheduler as scheduler_module
+from astro import compute_prayer_times
+from config import PRAYER_ORDER, SMS_LATE_GRACE_SECONDS
+from dispatch import DedupeStore, SmsDispatcher
+from notifier import reminder_body
+from scheduler import NotificationScheduler, Subscription, add_subscription, load_subscriptions, remove_subscription
+from stubs import TWILIO_ENV, StubServer, _twilio
+
+# Midnight UTC, so the first window is the whole of 28 March
+START = datetime(2026, 3, 28, tzinfo=timezone.utc).timestamp()
+LONDON = Subscription(1, "+447700900001", 51.5074, -0.1278, "Europe/London", 2, 0, 0)
+
+
+class Clock:
+    """Stands in for dispatch's `time` module so deadlines follow the scheduler's `now`."""
+
+    def __init__(self, now):
+        self.now = now
+        self.monotonic = time.monotonic
+        self.sleep = time.sleep
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(START)
+    monkeypatch.setattr(dispatch, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    sent = []
+    dispatcher = SmsDispatcher(send=lambda to, body: sent.append((to, body)) or f"SM{len(sent)}",
+                               store=DedupeStore(str(tmp_path / "dispatch.sqlite3")), rate=1e6, burst=1e6)
+    s = NotificationScheduler(dispatcher)
+    s.sent = sent
+    yield s
+    dispatcher.shutdown()
+
+
+def _first_fire_time(s):
+    s.add([LONDON], now=START)
+    return START + s.run_pending(now=START)
+
+
+def test_lead_zero_reminder_is_sent_at_the_prayer_time(scheduler, clock):
+    fire_at = _first_fire_time(scheduler)
+    clock.now = fire_at
+    scheduler.run_pending(now=fire_at)
+    scheduler.dispatcher.shutdown()
+    assert [body.split(" at ")[0] for _, body in scheduler.sent] == ["🕌 Reminder: Fajr"]
+    assert scheduler.dispatcher.stats()["expired"] == 0
+
+
+def test_reminder_past_its_grace_period_is_dropped(scheduler, clock):
+    fire_at = _first_fire_time(scheduler)
+    clock.now = fire_at + SMS_LATE_GRACE_SECONDS + 1
+    scheduler.run_pending(now=fire_at)
+    scheduler.dispatcher.shutdown()
+    assert scheduler.sent == []
+    assert scheduler.dispatcher.stats()["expired"] == 1
+
+
+class SyncDispatcher(SmsDispatcher):
+    """Waits for each batch so the test clock cannot move past a deadline mid-send."""
+
+    def submit(self, messages):
+        futures = super().submit(messages)
+        wait(futures)
+        return futures
+
+
+@pytest.fixture
+def twilio(monkeypatch):
+    """bench/stubs' Twilio, recording each message's form; notifier is pointed at it."""
+    messages = []
+
+    def route(method, path, query, body):
+        messages.append({k: v[0] for k, v in parse_qs(body).items()})
+        return _twilio(method, path, query, body)
+
+    server = StubServer("twilio", route).start()
+    for name, value in {**TWILIO_ENV, "TWILIO_API_URL": server.url}.items():
+        monkeypatch.setenv(name, value)
+    server.messages = messages
+    yield server
+    server.stop()
+
+
+def _run_until(s, clock, end):
+    """Steps the scheduler from event to event, as run_forever would, until `end`."""
+    now = clock.now
+    while now < end:
+        clock.now = now
+        wait_for = s.run_pending(now=now)
+        now = end if wait_for is None else now + max(wait_for, 0)
+
+
+def test_reminders_reach_twilio_over_two_days(tmp_path, monkeypatch, clock, twilio):
+    monkeypatch.setattr(scheduler_module, "SCHEDULER_DB_PATH", str(tmp_path / "scheduler.sqlite3"))
+    add_subscription("+447700900001", 51.5074, -0.1278, "Europe/London", 3, 0, 10)
+    leeds = add_subscription("+447700900002", 53.8008, -1.5491, "Europe/London", 3, 0, 10)
+    dispatcher = SyncDispatcher(store=DedupeStore(str(tmp_path / "dispatch.sqlite3")), rate=1e6, burst=1e6)
+    s = NotificationScheduler(dispatcher)
+
+    s.add(load_subscriptions(), now=START)
+    _run_until(s, clock, START + 86400 - scheduler_module.PLAN_AHEAD)
+    # Gone before the second day is planned (at 23:50 UTC, by the "plan" event)
+    remove_subscription(leeds)
+    s._poll()
+    _run_until(s, clock, START + 2 * 86400)
+    dispatcher.shutdown()
+
+    expected = [(phone, reminder_body(prayer, compute_prayer_times(lat, lon, 3, 0, "Europe/London", day)[0][prayer]))
+                for day, subs in [(date(2026, 3, 28), [("+447700900001", 51.5074, -0.1278),
+                                                       ("+447700900002", 53.8008, -1.5491)]),
+                                  (date(2026, 3, 29), [("+447700900001", 51.5074, -0.1278)])]
+                for prayer in PRAYER_ORDER for phone, lat, lon in subs]
+    assert sorted((m["To"], m["Body"]) for m in twilio.messages) == sorted(expected)
+    assert {m["From"] for m in twilio.messages} == {TWILIO_ENV["TWILIO_PHONE_NUMBER"]}
+    # The third day was planned at 23:50 on the second and has not started
+    assert s.stats == {"scheduled": 20, "dispatched": 15}
+    stats = dispatcher.stats()
+    assert (stats["sent"], stats["expired"], stats["failed"]) == (15, 0, 0)
+    # Each went out exactly `lead` minutes early by the scheduler's clock
+    assert stats["latency_max"] == 0
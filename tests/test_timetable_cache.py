@@ -0,0 +1,40 @@
+import time
+from datetime import date
+
+from astro import compute_prayer_times
+from config import NEIGHBOUR_MAX_ERROR, NEIGHBOUR_RADIUS_KM
+
+# Reykjavik on 1 June: 2 km north the engine's times move by ~20 s, 4 km north by ~40 s
+LAT, LON, TZ = 64.1466, -21.9426, "Atlantic/Reykjavik"
+DAY = date(2026, 6, 1)
+
+
+def _put(cache, lat, lon):
+    cache.put(lat, lon, 2, 0, DAY, compute_prayer_times(lat, lon, 2, 0, TZ, DAY)[0], TZ)
+
+
+def test_neighbour_over_the_error_bound_is_rejected(cache):
+    _put(cache, LAT + 0.036, LON)
+    assert cache._distance_km(LAT, LON, LAT + 0.036, LON) < NEIGHBOUR_RADIUS_KM
+    assert cache.get_nearby(LAT, LON, 2, 0, DAY, TZ) is None
+
+
+def test_neighbour_within_the_error_bound_is_reused(cache):
+    _put(cache, LAT + 0.036, LON)
+    _put(cache, LAT + 0.018, LON)
+    timings, error = cache.get_nearby(LAT, LON, 2, 0, DAY, TZ)
+    assert 0 < error <= NEIGHBOUR_MAX_ERROR
+    assert timings == compute_prayer_times(LAT + 0.018, LON, 2, 0, TZ, DAY)[0]
+
+
+def test_neighbour_must_share_the_timezone(cache):
+    cache.put(LAT + 0.018, LON, 2, 0, DAY, compute_prayer_times(LAT + 0.018, LON, 2, 0, TZ, DAY)[0], "UTC")
+    assert cache.get_nearby(LAT, LON, 2, 0, DAY, TZ) is None
+
+
+def test_polar_lookups_are_skipped_quickly(cache):
+    assert 0 < len(cache._cells_within(81.0, 0.0, NEIGHBOUR_RADIUS_KM)) <= cache.NEIGHBOUR_MAX_CELLS
+    started = time.perf_counter()
+    assert cache._cells_within(89.95, 0.0, NEIGHBOUR_RADIUS_KM) == []
+    assert cache.get_nearby(89.95, 0.0, 2, 0, DAY, "UTC") is None
+    assert time.perf_counter() - started < 0.1
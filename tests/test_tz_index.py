@@ -0,0 +1,62 @@
+import gzip
+import json
+
+import pytest
+import pytz
+
+import tz_index
+
+
+@pytest.fixture(scope="module")
+def shipped():
+    with gzip.open(tz_index.SHIPPED_INDEX, "rb") as f:
+        return tz_index.TzIndex(f.read())
+
+
+def test_shipped_index_is_exact_and_passes_reference_cities(shipped):
+    assert shipped.exact
+    assert tz_index.check(shipped) == []
+
+
+def test_shipped_zones_are_known_to_pytz(shipped):
+    assert set(shipped.names[1:]) <= set(pytz.all_timezones)
+
+
+def test_open_sea_is_left_to_the_nominal_zone(shipped):
+    assert shipped.zone_at(0.0, -140.0) is None
+
+
+def test_polygons_with_holes(tmp_path):
+    square = [[10, 10], [20, 10], [20, 20], [10, 20], [10, 10]]
+    hole = [[14, 14], [16, 14], [16, 16], [14, 16], [14, 14]]
+    inner = hole
+    path = tmp_path / "combined.json"
+    path.write_text(json.dumps({"features": [
+        {"properties": {"tzid": "Asia/Dubai"}, "geometry": {"type": "Polygon", "coordinates": [square, hole]}},
+        {"properties": {"tzid": "Asia/Tehran"}, "geometry": {"type": "MultiPolygon", "coordinates": [[inner]]}},
+    ]}))
+    index = tz_index.TzIndex(tz_index.encode(tz_index.build_from_geojson(str(path), sub=4)))
+    assert index.exact
+    assert index.zone_at(12, 12) == "Asia/Dubai"
+    assert index.zone_at(15, 15) == "Asia/Tehran"
+    assert index.zone_at(19.9, 19.9) == "Asia/Dubai"
+    assert index.zone_at(20.3, 15) == "Asia/Dubai"  # coastal fill
+    assert index.zone_at(25, 15) is None
+
+
+def test_exact_lookups_ignore_a_point_index(monkeypatch):
+    points = [("Asia/Kolkata", 28.6, 77.2), ("Asia/Karachi", 24.9, 67.0)]
+    built = tz_index.build_from_points(sub=1, points=points)
+    monkeypatch.setattr(tz_index, "_index", tz_index.TzIndex(tz_index.encode(built)))
+    assert tz_index.timezone_at(31.6, 74.9) in ("Asia/Kolkata", "Asia/Karachi")
+    assert tz_index.timezone_at(31.6, 74.9, exact=True) is None
+
+
+def test_stale_index_file_is_replaced_by_the_shipped_one(tmp_path, monkeypatch):
+    path = tmp_path / "tz_index.bin"
+    built = tz_index.build_from_points(sub=1, points=[("Asia/Kolkata", 28.6, 77.2)])
+    path.write_bytes(tz_index.encode(built))
+    monkeypatch.setattr(tz_index, "TZ_INDEX_PATH", str(path))
+    monkeypatch.setattr(tz_index, "_index", None)
+    assert tz_index.timezone_at(31.634, 74.8723, exact=True) == "Asia/Kolkata"
+    assert tz_index._index.exact
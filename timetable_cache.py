@@ -0,0 +1,313 @@
+# timetable_cache.py
+"""
+Persistent timetable cache shared by every process on the host.
+
+Entries live in SQLite keyed by (geohash cell, method, school, local date),
+so nearby users share entries, restarts start warm, and a day's times are
+kept until evicted rather than for an hour. Eviction is least-recently-used
+once the table grows past CACHE_MAX_ENTRIES.
+
+Each entry also records the coordinates it was computed for, which makes
+the cache a spatial index of known locations: get_nearby serves a miss from
+the nearest entry within NEIGHBOUR_RADIUS_KM, found through the geohash
+cells around the requester. A neighbour is only used when the local engine
+puts its times within NEIGHBOUR_MAX_ERROR seconds of the requester's own for
+every prayer on that day, and not looked for at all where the radius spans
+more than NEIGHBOUR_MAX_CELLS cells (near the poles). Aladhan runs the same algorithm, so the bound
+holds for its timetables too, up to its rounding to the minute.
+"""
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from astro import TIMING_KEYS, compute_day, utc_offset_hours
+from config import (
+    CACHE_DB_PATH, CACHE_GEOHASH_PRECISION, CACHE_MAX_ENTRIES, NEIGHBOUR_MAX_CELLS, NEIGHBOUR_MAX_ERROR,
+    NEIGHBOUR_RADIUS_KM,
+)
+from instrumentation import count, observe, record_cache
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Writes between size checks; COUNT(*) is a table scan in SQLite
+_EVICT_EVERY = 64
+
+_local = threading.local()
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "stale_hits": 0, "nearby_hits": 0, "writes": 0, "evictions": 0}
+
+_EARTH_RADIUS_KM = 6371.0
+_KM_PER_DEGREE = math.pi * _EARTH_RADIUS_KM / 180
+_ERROR_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 45, 60)
+_DISTANCE_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 25)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS timetables (
+    cell      TEXT    NOT NULL,
+    method    INTEGER NOT NULL,
+    school    INTEGER NOT NULL,
+    day       TEXT    NOT NULL,
+    timings   TEXT    NOT NULL,
+    last_used REAL    NOT NULL,
+    lat       REAL,
+    lon       REAL,
+    PRIMARY KEY (cell, method, school, day)
+);
+CREATE INDEX IF NOT EXISTS timetables_last_used ON timetables (last_used);
+CREATE TABLE IF NOT EXISTS cells (
+    cell     TEXT PRIMARY KEY,
+    timezone TEXT NOT NULL
+);
+"""
+
+
+def geohash(lat, lon, precision=CACHE_GEOHASH_PRECISION):
+    """Standard base-32 geohash; precision 6 is a cell of roughly 1.2 km x 0.6 km."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(CACHE_DB_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _add_origin_columns(conn)
+        _drop_guessed_timezones(conn)
+        _local.conn = conn
+    return conn
+
+
+def _add_origin_columns(conn):
+    # Caches created before entries recorded their coordinates; their rows
+    # keep NULLs and are never offered as neighbours
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(timetables)")}
+    for column in ("lat", "lon"):
+        if column not in columns:
+            try:
+                conn.execute(f"ALTER TABLE timetables ADD COLUMN {column} REAL")
+            except sqlite3.OperationalError:
+                pass  # added by another process in the meantime
+
+
+def _drop_guessed_timezones(conn):
+    # Caches from before user_version 1 may hold zones guessed from the
+    # nearest zone.tab city; dropping their cells turns those timetables
+    # into misses, which are refetched and stored with a checked zone
+    if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+        conn.execute("DELETE FROM cells")
+        conn.execute("PRAGMA user_version = 1")
+
+
+def _count(name, n=1):
+    with _lock:
+        _counters[name] += n
+        return _counters[name]
+
+
+def get_timezone(lat, lon):
+    """Timezone previously recorded for the cell containing (lat, lon), or None."""
+    row = _connect().execute(
+        "SELECT timezone FROM cells WHERE cell = ?", (geohash(lat, lon),)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def get(lat, lon, method, school, day):
+    """Returns cached (timings, timezone) for the local date `day`, or None."""
+    cell = geohash(lat, lon)
+    conn = _connect()
+    row = conn.execute(
+        "SELECT t.timings, c.timezone FROM timetables t JOIN cells c ON c.cell = t.cell "
+        "WHERE t.cell = ? AND t.method = ? AND t.school = ? AND t.day = ?",
+        (cell, method, school, day.isoformat()),
+    ).fetchone()
+    if row is None:
+        _count("misses")
+        record_cache("timetable", "miss")
+        return None
+    _count("hits")
+    record_cache("timetable", "hit")
+    conn.execute(
+        "UPDATE timetables SET last_used = ? WHERE cell = ? AND method = ? AND school = ? AND day = ?",
+        (time.time(), cell, method, school, day.isoformat()),
+    )
+    return json.loads(row[0]), row[1]
+
+
+def get_latest(lat, lon, method, school, day):
+    """
+    Most recent entry on or before `day`, for serving while a refresh runs.
+    Returns (entry_day, timings, timezone) or None.
+    """
+    row = _connect().execute(
+        "SELECT t.day, t.timings, c.timezone FROM timetables t JOIN cells c ON c.cell = t.cell "
+        "WHERE t.cell = ? AND t.method = ? AND t.school = ? AND t.day <= ? "
+        "ORDER BY t.day DESC LIMIT 1",
+        (geohash(lat, lon), method, school, day.isoformat()),
+    ).fetchone()
+    if row is None:
+        return None
+    _count("stale_hits")
+    record_cache("timetable", "stale")
+    return date.fromisoformat(row[0]), json.loads(row[1]), row[2]
+
+
+def get_nearby(lat, lon, method, school, day, timezone):
+    """
+    Timetable of the nearest cached location within NEIGHBOUR_RADIUS_KM in the
+    same timezone, for when (lat, lon) itself missed. Returns
+    (timings, error_seconds) or None, where error_seconds is the largest
+    difference the local engine finds between the two locations' times on `day`.
+    """
+    if NEIGHBOUR_RADIUS_KM <= 0:
+        return None
+    cells = _cells_within(lat, lon, NEIGHBOUR_RADIUS_KM)
+    if not cells:
+        count("neighbour_skipped_total")
+        record_cache("neighbour", "miss")
+        return None
+    conn = _connect()
+    rows = conn.execute(
+        "SELECT t.cell, t.lat, t.lon, t.timings FROM timetables t JOIN cells c ON c.cell = t.cell "
+        f"WHERE t.cell IN ({', '.join('?' * len(cells))}) AND t.method = ? AND t.school = ? "
+        "AND t.day = ? AND c.timezone = ? AND t.lat IS NOT NULL",
+        (*cells, method, school, day.isoformat(), timezone),
+    ).fetchall()
+    candidates = sorted(
+        (distance, row) for row in rows
+        if (distance := _distance_km(lat, lon, row[1], row[2])) <= NEIGHBOUR_RADIUS_KM
+    )
+    if candidates:
+        offset = utc_offset_hours(timezone, day)
+        own = compute_day(lat, lon, method, school, day, offset)
+        for distance, (cell, n_lat, n_lon, timings) in candidates:
+            error = _max_error_seconds(own, compute_day(n_lat, n_lon, method, school, day, offset))
+            if error <= NEIGHBOUR_MAX_ERROR:
+                _count("nearby_hits")
+                record_cache("neighbour", "hit")
+                observe("neighbour_error_seconds", error, _ERROR_BUCKETS)
+                observe("neighbour_distance_km", distance, _DISTANCE_BUCKETS)
+                conn.execute(
+                    "UPDATE timetables SET last_used = ? WHERE cell = ? AND method = ? AND school = ? AND day = ?",
+                    (time.time(), cell, method, school, day.isoformat()),
+                )
+                return json.loads(timings), error
+        # Close enough, but the times differ too much (e.g. at high latitudes)
+        count("neighbour_rejected_total")
+    record_cache("neighbour", "miss")
+    return None
+
+
+def _cells_within(lat, lon, radius_km, precision=CACHE_GEOHASH_PRECISION, max_cells=NEIGHBOUR_MAX_CELLS):
+    """
+    Geohash cells covering the bounding box of a circle around (lat, lon), or
+    [] if that would take more than max_cells (the box widens without bound
+    towards the poles: 4,248 cells at 88°, 168,858 at 89.95°).
+    """
+    lat_bits = 5 * precision // 2
+    height = 180 / 2 ** lat_bits
+    width = 360 / 2 ** (5 * precision - lat_bits)
+    d_lat = radius_km / _KM_PER_DEGREE
+    d_lon = min(180.0, d_lat / max(math.cos(math.radians(lat)), 1e-6))
+
+    def steps(center, half, step):
+        # Points no further apart than a cell, so every cell in the span is hit
+        n = math.ceil(2 * half / step)
+        return [center - half + 2 * half * i / n for i in range(n + 1)] if n else [center]
+
+    # One sample per cell and a row or column more: an upper bound on the count
+    if (math.ceil(2 * d_lat / height) + 1) * (math.ceil(2 * d_lon / width) + 1) > max_cells:
+        return []
+    return sorted({
+        geohash(max(-90.0, min(90.0, a)), (o + 180) % 360 - 180)
+        for a in steps(lat, d_lat, height) for o in steps(lon, d_lon, width)
+    })
+
+
+def _distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance."""
+    d_lat, d_lon = math.radians(lat2 - lat1), math.radians(lon2 - lon1)
+    a = (math.sin(d_lat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lon / 2) ** 2)
+    return 2 * _EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def _max_error_seconds(a, b):
+    """Largest difference between two compute_day results; inf if a time exists in only one."""
+    worst = 0.0
+    for key in TIMING_KEYS:
+        if math.isnan(a[key]) or math.isnan(b[key]):
+            if math.isnan(a[key]) != math.isnan(b[key]):
+                return math.inf
+            continue
+        diff = (a[key] - b[key] + 12) % 24 - 12
+        worst = max(worst, abs(diff) * 3600)
+    return worst
+
+
+def put_many(lat, lon, method, school, timezone, days):
+    """Stores {date: timings} for one location and evicts LRU entries if over the limit."""
+    cell = geohash(lat, lon)
+    now = time.time()
+    conn = _connect()
+    with conn:
+        conn.execute("BEGIN")
+        conn.execute("INSERT OR REPLACE INTO cells (cell, timezone) VALUES (?, ?)", (cell, timezone))
+        conn.executemany(
+            "INSERT OR REPLACE INTO timetables (cell, method, school, day, timings, last_used, lat, lon) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(cell, method, school, day.isoformat(), json.dumps(timings), now, lat, lon)
+             for day, timings in days.items()],
+        )
+    writes = _count("writes", len(days))
+    if writes // _EVICT_EVERY != (writes - len(days)) // _EVICT_EVERY:
+        _evict(conn)
+
+
+def put(lat, lon, method, school, day, timings, timezone):
+    put_many(lat, lon, method, school, timezone, {day: timings})
+
+
+def _evict(conn):
+    excess = conn.execute("SELECT COUNT(*) FROM timetables").fetchone()[0] - CACHE_MAX_ENTRIES
+    if excess > 0:
+        conn.execute(
+            "DELETE FROM timetables WHERE rowid IN "
+            "(SELECT rowid FROM timetables ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        _count("evictions", excess)
+        logging.info(f"Timetable cache evicted {excess} entries")
+
+
+def stats():
+    """Hit/miss/stale-hit/nearby-hit/write/eviction counters for this process plus the shared entry count."""
+    with _lock:
+        result = dict(_counters)
+    result["entries"] = _connect().execute("SELECT COUNT(*) FROM timetables").fetchone()[0]
+    lookups = result["hits"] + result["misses"]
+    result["hit_rate"] = result["hits"] / lookups if lookups else 0.0
+    return result
+
@@ -0,0 +1,285 @@
+# timetable_store.py
+"""
+Compact binary timetables for many locations, read through a memory map.
+
+Layout (little-endian):
+
+    header     magic "PTTS", version, key/location/day counts, first day
+    names      TIMING_KEYS and timezone names, newline separated
+    locations  one LOCATION_DTYPE record per location (id, lat, lon, ...)
+    table      uint16 minutes since local midnight, [location][day][key],
+               batch.MISSING where a time does not occur
+
+A year of 11 timings is 8 KB per location, so a whole network of mosques
+fits in a few megabytes that every process shares through the page cache.
+
+    python timetable_store.py build locations.csv --start 2026-01-01 --days 365
+    python timetable_store.py build locations.csv --source aladhan --start 2026-03-01 --days 31
+    python timetable_store.py info
+
+locations.csv columns: id, lat, lon, method, school and optionally timezone
+(looked up with tz_index when blank).
+"""
+import argparse
+import csv
+import logging
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from datetime import date, timedelta
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from astro import TIMING_KEYS
+from batch import MISSING, compute_timetable
+from config import CACHE_GEOHASH_PRECISION, TIMETABLE_STORE_PATH
+from timetable_cache import geohash
+from tz_index import timezone_at
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PTTS"
+VERSION = 1
+# magic, version, key count, location count, day count, first day ordinal,
+# key names length, timezone names length
+_HEADER = struct.Struct("<4sHHIIIII")
+LOCATION_DTYPE = np.dtype([
+    ("id", "S32"), ("lat", "<f8"), ("lon", "<f8"),
+    ("method", "u1"), ("school", "u1"), ("timezone", "<u2"),
+])
+# Locations computed per compute_timetable call while writing
+WRITE_CHUNK = 512
+
+
+class Location(NamedTuple):
+    id: str
+    lat: float
+    lon: float
+    method: int = 2
+    school: int = 0
+    timezone: Optional[str] = None
+
+
+def read_locations(path):
+    """Locations from a CSV with id, lat, lon[, method, school, timezone] columns."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            Location(row["id"], float(row["lat"]), float(row["lon"]),
+                     int(row.get("method") or 2), int(row.get("school") or 0),
+                     row.get("timezone") or None)
+            for row in csv.DictReader(f)
+        ]
+
+
+def _align(offset, n=8):
+    return offset + (-offset % n)
+
+
+# ---------- reader ----------
+
+class DayTimings(Mapping):
+    """
+    Read-only {prayer: "HH:MM"} view over one uint16 row of the store.
+    Behaves like the dicts from fetch_prayer_times; missing times are absent.
+    """
+
+    __slots__ = ("row", "positions")
+
+    def __init__(self, row, positions):
+        self.row = row
+        self.positions = positions
+
+    def __getitem__(self, key):
+        minutes = int(self.row[self.positions[key]])
+        if minutes == MISSING:
+            raise KeyError(key)
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def __iter__(self):
+        return (key for key, i in self.positions.items() if self.row[i] != MISSING)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __reduce__(self):
+        # Pickles (e.g. into st.cache_data) as a plain dict, not the mapping
+        return dict, (dict(self),)
+
+
+class TimetableStore:
+    """Memory-mapped timetable file; all arrays are views into the mapping."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_keys, n_locations, n_days, first, keys_len, tz_len = \
+            _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a timetable store")
+        offset = _HEADER.size
+        self.keys = self._mm[offset:offset + keys_len].decode().split("\n")
+        offset += keys_len
+        self.timezones = self._mm[offset:offset + tz_len].decode().split("\n")
+        offset = _align(offset + tz_len)
+        self.locations = np.frombuffer(self._mm, LOCATION_DTYPE, n_locations, offset)
+        offset = _align(offset + n_locations * LOCATION_DTYPE.itemsize)
+        self.table = np.frombuffer(self._mm, "<u2", n_locations * n_days * n_keys, offset) \
+            .reshape(n_locations, n_days, n_keys)
+        self.start = date.fromordinal(first)
+        self.n_days = n_days
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self._ids = {loc_id.decode(): i for i, loc_id in enumerate(self.locations["id"])}
+        self._cells = None
+
+    def __len__(self):
+        return len(self.locations)
+
+    def index(self, location_id):
+        return self._ids.get(location_id)
+
+    def find(self, lat, lon, method, school):
+        """Index of a stored location in the same geohash cell with this method/school, or None."""
+        if self._cells is None:
+            self._cells = {
+                (geohash(rec["lat"], rec["lon"], CACHE_GEOHASH_PRECISION), int(rec["method"]),
+                 int(rec["school"])): i
+                for i, rec in enumerate(self.locations)
+            }
+        return self._cells.get((geohash(lat, lon, CACHE_GEOHASH_PRECISION), method, school))
+
+    def timezone(self, i):
+        return self.timezones[self.locations[i]["timezone"]]
+
+    def minutes(self, i, day):
+        """uint16 row for location i on `day` (a view, no copy), or None outside the stored range."""
+        j = (day - self.start).days
+        if not 0 <= j < self.n_days:
+            return None
+        return self.table[i, j]
+
+    def timings(self, i, day):
+        """DayTimings view for location i on `day`, or None outside the stored range."""
+        row = self.minutes(i, day)
+        return None if row is None else DayTimings(row, self.positions)
+
+    def close(self):
+        self.locations = self.table = None
+        self._mm.close()
+
+
+# ---------- writer ----------
+
+def write_store(path, locations, start, n_days, rows, keys=TIMING_KEYS):
+    """
+    Streams a store to `path`. `locations` must have their timezone set;
+    `rows` yields uint16 arrays of shape (k, n_days, len(keys)) covering the
+    locations in order. The file is written to a temporary name and renamed.
+    """
+    zones = sorted({loc.timezone for loc in locations})
+    zone_ids = {name: i for i, name in enumerate(zones)}
+    index = np.zeros(len(locations), LOCATION_DTYPE)
+    for i, loc in enumerate(locations):
+        index[i] = (loc.id.encode()[:32], loc.lat, loc.lon, loc.method, loc.school, zone_ids[loc.timezone])
+
+    keys_blob = "\n".join(keys).encode()
+    tz_blob = "\n".join(zones).encode()
+    tmp = f"{path}.tmp"
+    written = 0
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(keys), len(locations), n_days, start.toordinal(),
+                             len(keys_blob), len(tz_blob)))
+        f.write(keys_blob + tz_blob)
+        f.write(b"\0" * (_align(f.tell()) - f.tell()))
+        f.write(index.tobytes())
+        f.write(b"\0" * (_align(f.tell()) - f.tell()))
+        for block in rows:
+            f.write(np.ascontiguousarray(block, dtype="<u2").tobytes())
+            written += len(block)
+    if written != len(locations):
+        os.remove(tmp)
+        raise ValueError(f"wrote {written} location rows for {len(locations)} locations")
+    os.replace(tmp, path)
+
+
+def _with_timezones(locations):
+    return [loc if loc.timezone else loc._replace(timezone=timezone_at(loc.lat, loc.lon))
+            for loc in locations]
+
+
+def build_from_batch(path, locations, start, n_days):
+    """Computes every location locally with batch.compute_timetable, WRITE_CHUNK at a time."""
+    locations = _with_timezones(locations)
+    end = start + timedelta(days=n_days - 1)
+
+    def rows():
+        for i in range(0, len(locations), WRITE_CHUNK):
+            chunk = locations[i:i + WRITE_CHUNK]
+            _, table = compute_timetable(
+                [l.lat for l in chunk], [l.lon for l in chunk], [l.method for l in chunk],
+                [l.school for l in chunk], start, end, [l.timezone for l in chunk],
+            )
+            yield table
+
+    write_store(path, locations, start, n_days, rows())
+    return locations
+
+
+def parse_minutes(value):
+    try:
+        hour, minute = map(int, value.split(":"))
+    except (AttributeError, ValueError):
+        return MISSING
+    return hour * 60 + minute
+
+
+def build_from_aladhan(path, locations, start, n_days):
+    """Fills the store from Aladhan calendar responses, one request per location-month."""
+    from api import fetch_aladhan_month
+
+    days = [start + timedelta(days=j) for j in range(n_days)]
+    months = sorted({(d.year, d.month) for d in days})
+    tables, resolved = [], []
+    for loc in locations:
+        table = np.full((1, n_days, len(TIMING_KEYS)), MISSING, dtype=np.uint16)
+        timezone = loc.timezone
+        for year, month in months:
+            month_days, timezone = fetch_aladhan_month(loc.lat, loc.lon, loc.method, loc.school, year, month)
+            for j, day in enumerate(days):
+                if day in month_days:
+                    table[0, j] = [parse_minutes(month_days[day].get(k)) for k in TIMING_KEYS]
+        tables.append(table)
+        resolved.append(loc._replace(timezone=timezone))
+    write_store(path, resolved, start, n_days, tables)
+    return resolved
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Binary timetable store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a store from a locations CSV")
+    build.add_argument("locations")
+    build.add_argument("--start", type=date.fromisoformat, default=date.today())
+    build.add_argument("--days", type=int, default=365)
+    build.add_argument("--source", choices=["batch", "aladhan"], default="batch")
+    build.add_argument("--out", default=TIMETABLE_STORE_PATH or "timetables.bin")
+    info = commands.add_parser("info", help="summarize a store")
+    info.add_argument("path", nargs="?", default=TIMETABLE_STORE_PATH or "timetables.bin")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        builder = build_from_aladhan if args.source == "aladhan" else build_from_batch
+        locations = builder(args.out, read_locations(args.locations), args.start, args.days)
+        print(f"Wrote {args.out}: {len(locations)} locations x {args.days} days "
+              f"({os.path.getsize(args.out) / 1e6:.1f} MB)")
+    else:
+        store = TimetableStore(args.path)
+        end = store.start + timedelta(days=store.n_days - 1)
+        print(f"{args.path}: {len(store)} locations, {store.start} to {end}, "
+              f"{len(store.timezones)} timezones, keys {', '.join(store.keys)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+# tz_index.py
+"""
+Offline (lat, lon) -> IANA timezone lookup.
+
+The index is a two-level grid stored in one memory-mapped file
+(TZ_INDEX_PATH): a 1° x 1° table whose entries are either a zone id (the
+whole tile is in one zone) or a pointer to a SUB x SUB block of finer
+cells for tiles a border runs through. A lookup is two array reads.
+
+    python tz_index.py build --timezonefinder [--out tz_index.bin.gz]
+    python tz_index.py build --geojson combined.json [--sub 32]
+    python tz_index.py check
+
+The shipped index (tz_index.bin.gz, unpacked to TZ_INDEX_PATH on first use)
+is rasterized from the timezone-boundary-builder polygons, as bundled with
+the timezonefinder package (6.x, which includes the data) or from a GeoJSON
+release (combined.json, features with a "tzid" property). Open sea is left
+to the nominal Etc/GMT zone, which is how those polygons define it too.
+
+Without polygons, `build` falls back to the tz database's zone.tab
+reference points plus SEED_POINTS (nearest reference city). That is only a
+guess near borders and across DST rules, so such an index is marked
+approximate and timezone_at(..., exact=True) ignores it.
+"""
+import argparse
+import gzip
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+from functools import lru_cache
+
+import pytz
+
+from astro import nominal_timezone
+from config import TZ_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TZIX"
+VERSION = 2
+# magic, version, sub, zone count, names length, block count, flags
+_HEADER = struct.Struct("<4sHHIIII")
+FLAG_EXACT = 1  # built from zone polygons rather than nearest reference points
+SHIPPED_INDEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tz_index.bin.gz")
+ROWS, COLS = 180, 360
+DEFAULT_SUB = 16
+# Polygon builds are finer, ~3.5 km cells, for towns right on a border
+POLYGON_SUB = 32
+# Nearest-reference-city builds leave points farther than this to the nominal zone
+MAX_POINT_DISTANCE_KM = 1500
+# Polygon builds give sea cells within this many cells of land the land's zone,
+# so coastal towns whose cell centre is offshore are not left to Etc/GMT
+COAST_CELLS = 2
+EARTH_RADIUS_KM = 6371.0
+
+# Extra (zone, lat, lon) points for point-based builds: zone.tab has one city
+# per zone, so large zones lose their edges to smaller neighbours without these
+SEED_POINTS = [
+    ("Asia/Riyadh", 21.4225, 39.8262), ("Asia/Riyadh", 21.5433, 39.1728),
+    ("Asia/Riyadh", 24.4672, 39.6024), ("Asia/Riyadh", 26.4207, 50.0888),
+    ("Asia/Riyadh", 28.3835, 36.5662), ("Asia/Riyadh", 17.4924, 44.1277),
+    ("Africa/Cairo", 24.0889, 32.8998), ("Africa/Cairo", 31.2001, 29.9187),
+    ("Africa/Khartoum", 19.6158, 37.2164), ("Asia/Karachi", 31.5204, 74.3587),
+    ("Asia/Karachi", 34.0151, 71.5249), ("Asia/Karachi", 30.1798, 66.975),
+    ("Asia/Kolkata", 28.6139, 77.209), ("Asia/Kolkata", 19.076, 72.8777),
+    ("Asia/Kolkata", 17.385, 78.4867), ("Asia/Kolkata", 26.1445, 91.7362),
+    ("Asia/Tehran", 36.2605, 59.6168), ("Asia/Tehran", 38.0962, 46.2738),
+    ("Asia/Tehran", 29.5918, 52.5837), ("Europe/Istanbul", 39.9334, 32.8597),
+    ("Europe/Istanbul", 37.9144, 40.2306), ("Asia/Baghdad", 30.5085, 47.7804),
+    ("Asia/Baghdad", 36.34, 43.13), ("Africa/Algiers", 22.785, 5.5228),
+    ("Africa/Lagos", 12.0022, 8.592), ("Asia/Jakarta", 3.5952, 98.6722),
+    ("Asia/Jakarta", -7.2575, 112.7521), ("Asia/Makassar", -5.1477, 119.4327),
+    ("Asia/Kuching", 5.9804, 116.0735), ("Asia/Dhaka", 22.3569, 91.7832),
+    ("Asia/Kabul", 34.3529, 62.204), ("Asia/Kabul", 36.709, 67.1109),
+    ("Asia/Shanghai", 39.9042, 116.4074), ("Asia/Shanghai", 30.5728, 104.0668),
+    ("Europe/Moscow", 59.9311, 30.3609), ("Europe/Moscow", 55.7963, 49.1088),
+    ("America/New_York", 33.749, -84.388), ("America/New_York", 25.7617, -80.1918),
+    ("America/New_York", 42.3601, -71.0589), ("America/Chicago", 29.7604, -95.3698),
+    ("America/Chicago", 44.9778, -93.265), ("America/Chicago", 32.7767, -96.797),
+    ("America/Denver", 35.0844, -106.6504), ("America/Denver", 40.7608, -111.891),
+    ("America/Los_Angeles", 37.7749, -122.4194), ("America/Los_Angeles", 47.6062, -122.3321),
+    ("America/Toronto", 45.4215, -75.6972), ("America/Toronto", 45.5017, -73.5673),
+    ("America/Winnipeg", 49.8951, -97.1384), ("America/Vancouver", 49.2827, -123.1207),
+    ("Australia/Sydney", -32.9283, 151.7817), ("Australia/Melbourne", -37.8136, 144.9631),
+    ("Australia/Perth", -31.9505, 115.8605), ("Australia/Darwin", -23.698, 133.8807),
+    ("America/Sao_Paulo", -15.7975, -47.8919), ("America/Sao_Paulo", -22.9068, -43.1729),
+]
+
+# (name, lat, lon, expected zone) checked by `python tz_index.py check`. None
+# of these is a zone.tab or SEED_POINTS city; most sit near a border, in a
+# half-hour zone, or next to a zone with different DST rules.
+REFERENCE_CITIES = [
+    ("Amritsar", 31.6340, 74.8723, "Asia/Kolkata"),
+    ("Srinagar", 34.0837, 74.7973, "Asia/Kolkata"),
+    ("Jammu", 32.7266, 74.8570, "Asia/Kolkata"),
+    ("Agartala", 23.8315, 91.2868, "Asia/Kolkata"),
+    ("Shillong", 25.5788, 91.8933, "Asia/Kolkata"),
+    ("Sylhet", 24.8949, 91.8687, "Asia/Dhaka"),
+    ("Birgunj", 27.0104, 84.8777, "Asia/Kathmandu"),
+    ("Gwadar", 25.1264, 62.3225, "Asia/Karachi"),
+    ("Zahedan", 29.4963, 60.8629, "Asia/Tehran"),
+    ("Kandahar", 31.6289, 65.7372, "Asia/Kabul"),
+    ("Andijan", 40.7821, 72.3442, "Asia/Tashkent"),
+    ("Osh", 40.5283, 72.7985, "Asia/Bishkek"),
+    ("Khujand", 40.2826, 69.6221, "Asia/Dushanbe"),
+    ("Ufa", 54.7388, 55.9721, "Asia/Yekaterinburg"),
+    ("Orenburg", 51.7682, 55.0969, "Asia/Yekaterinburg"),
+    ("Grozny", 43.3178, 45.6985, "Europe/Moscow"),
+    ("Van", 38.5012, 43.3729, "Europe/Istanbul"),
+    ("Erbil", 36.1911, 44.0092, "Asia/Baghdad"),
+    ("Hail", 27.5114, 41.7208, "Asia/Riyadh"),
+    ("Aqaba", 29.5321, 35.0063, "Asia/Amman"),
+    ("Kassala", 15.4510, 36.4000, "Africa/Khartoum"),
+    ("Maiduguri", 11.8311, 13.1510, "Africa/Lagos"),
+    ("Tetouan", 35.5785, -5.3684, "Africa/Casablanca"),
+    ("Badajoz", 38.8794, -6.9707, "Europe/Madrid"),
+    ("Elvas", 38.8815, -7.1628, "Europe/Lisbon"),
+    ("Brest (Belarus)", 52.0976, 23.7341, "Europe/Minsk"),
+    ("Lviv", 49.8397, 24.0297, "Europe/Kyiv"),
+    ("Sovetsk", 55.0817, 21.8886, "Europe/Kaliningrad"),
+    ("Gdansk", 54.3520, 18.6466, "Europe/Warsaw"),
+    ("Denpasar", -8.6705, 115.2126, "Asia/Makassar"),
+    ("Balikpapan", -1.2379, 116.8529, "Asia/Makassar"),
+    ("Ambon", -3.6954, 128.1814, "Asia/Jayapura"),
+    ("Miri", 4.3995, 113.9914, "Asia/Kuching"),
+    ("Lhasa", 29.6520, 91.1721, "Asia/Shanghai"),
+    ("Mildura", -34.2080, 142.1246, "Australia/Melbourne"),
+    ("Renmark", -34.1757, 140.7469, "Australia/Adelaide"),
+    ("Toowoomba", -27.5598, 151.9507, "Australia/Brisbane"),
+    ("Calgary", 51.0447, -114.0719, "America/Edmonton"),
+    ("Saskatoon", 52.1579, -106.6702, "America/Regina"),
+    ("Kansas City", 39.0997, -94.5786, "America/Chicago"),
+    ("Nashville", 36.1627, -86.7816, "America/Chicago"),
+    ("Pensacola", 30.4213, -87.2169, "America/Chicago"),
+    ("Amarillo", 35.2220, -101.8313, "America/Chicago"),
+    ("Gary", 41.5934, -87.3464, "America/Chicago"),
+    ("Grand Rapids", 42.9634, -85.6681, "America/Detroit"),
+    ("Bloomington (Indiana)", 39.1653, -86.5264, "America/Indiana/Indianapolis"),
+    ("El Paso", 31.7619, -106.4850, "America/Denver"),
+    ("Window Rock", 35.6803, -109.0525, "America/Denver"),
+    ("Tucson", 32.2226, -110.9747, "America/Phoenix"),
+    ("Hilo", 19.7071, -155.0885, "Pacific/Honolulu"),
+    ("Mexicali", 32.6245, -115.4523, "America/Tijuana"),
+    ("Saltillo", 25.4232, -100.9963, "America/Monterrey"),
+    ("Corumba", -19.0089, -57.6515, "America/Campo_Grande"),
+    ("Goiania", -16.6869, -49.2648, "America/Sao_Paulo"),
+    ("Valparaiso", -33.0472, -71.6127, "America/Santiago"),
+]
+
+_lock = threading.Lock()
+_index = None
+
+
+@lru_cache(maxsize=None)
+def get_tz(name):
+    """pytz timezone for an IANA name, built once per process."""
+    return pytz.timezone(name)
+
+
+# ---------- reader ----------
+
+class TzIndex:
+    """Read-only view over an index file's bytes (an mmap or a bytes object)."""
+
+    def __init__(self, buf):
+        magic, version, sub, n_zones, names_len, n_blocks, flags = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a timezone index file of this version")
+        self.sub = sub
+        self.exact = bool(flags & FLAG_EXACT)
+        offset = _HEADER.size
+        self.names = [None] + bytes(buf[offset:offset + names_len]).decode().split("\n")
+        offset += names_len
+        offset += -offset % 4
+        view = memoryview(buf)
+        self._tiles = view[offset:offset + ROWS * COLS * 4].cast("i")
+        offset += ROWS * COLS * 4
+        self._cells = view[offset:offset + n_blocks * sub * sub * 2].cast("H")
+        self._buf = buf  # keep the mapping alive
+
+    def zone_at(self, lat, lon):
+        """IANA name at (lat, lon), or None where the index has no zone."""
+        y = lat + 90.0
+        x = (lon + 180.0) % 360.0
+        row = min(int(y), ROWS - 1)
+        col = min(int(x), COLS - 1)
+        entry = self._tiles[row * COLS + col]
+        if entry < 0:
+            sub = self.sub
+            fy = min(int((y - row) * sub), sub - 1)
+            fx = min(int((x - col) * sub), sub - 1)
+            entry = self._cells[((-entry - 1) * sub + fy) * sub + fx]
+        return self.names[entry]
+
+
+def _open(path):
+    try:
+        with open(path, "rb") as f:
+            return TzIndex(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError) as e:
+        logger.info(f"Timezone index {path} not usable ({e})")
+        return None
+
+
+def _install(data, source):
+    """Writes index bytes to TZ_INDEX_PATH and maps it, or keeps them in memory if that fails."""
+    try:
+        _write(TZ_INDEX_PATH, data)
+    except OSError as e:
+        logger.warning(f"Could not write timezone index ({e}); keeping it in memory")
+        return TzIndex(data)
+    logger.info(f"Installed timezone index at {TZ_INDEX_PATH} from {source}")
+    return _open(TZ_INDEX_PATH)
+
+
+def _load():
+    global _index
+    if _index is not None:
+        return _index
+    with _lock:
+        if _index is not None:
+            return _index
+        index = _open(TZ_INDEX_PATH) if os.path.exists(TZ_INDEX_PATH) else None
+        if index is None or not index.exact:
+            # An approximate or outdated file is replaced by the shipped one
+            if os.path.exists(SHIPPED_INDEX):
+                with gzip.open(SHIPPED_INDEX, "rb") as f:
+                    index = _install(f.read(), SHIPPED_INDEX)
+            elif index is None:
+                logger.warning("No shipped timezone index; building an approximate one from zone.tab")
+                index = _install(encode(build_from_points()), "zone.tab")
+        _index = index
+        return _index
+
+
+def timezone_at(lat, lon, exact=False):
+    """
+    IANA zone name for (lat, lon) from the offline index, falling back to
+    the nominal Etc/GMT zone for the longitude at sea. With exact=True,
+    returns None rather than a guess from an approximate (point-based) index.
+    """
+    index = _load()
+    if exact and not index.exact:
+        return None
+    return index.zone_at(lat, lon) or nominal_timezone(lon)
+
+
+# ---------- builder ----------
+
+def _grid_centers(sub):
+    import numpy as np
+    step = 1.0 / sub
+    lats = -90 + (np.arange(ROWS * sub) + 0.5) * step
+    lons = -180 + (np.arange(COLS * sub) + 0.5) * step
+    return lats, lons
+
+
+def _unit_vectors(lats, lons):
+    import numpy as np
+    lat, lon = np.radians(lats), np.radians(lons)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _read_zone_tab():
+    """(zone, lat, lon) for every zone.tab entry, coordinates in degrees."""
+    path = os.path.join(os.path.dirname(pytz.__file__), "zoneinfo", "zone.tab")
+    points = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            coords, zone = line.split("\t")[1:3]
+            zone = zone.strip()
+            # ISO 6709: +DDMM[SS]+DDDMM[SS]
+            split = max(coords.rfind("+"), coords.rfind("-"))
+            points.append((zone, _iso6709(coords[:split]), _iso6709(coords[split:])))
+    return points
+
+
+def _iso6709(value):
+    sign = -1 if value[0] == "-" else 1
+    digits = value[1:]
+    degree_digits = 2 if len(digits) in (4, 6) else 3
+    parts = [digits[:degree_digits], digits[degree_digits:degree_digits + 2], digits[degree_digits + 2:]]
+    return sign * (int(parts[0]) + int(parts[1]) / 60 + (int(parts[2]) if parts[2] else 0) / 3600)
+
+
+def build_from_points(sub=DEFAULT_SUB, points=None):
+    """
+    Raster of zone ids (ROWS*sub, COLS*sub) assigning each cell the zone of the
+    nearest zone.tab reference point or seed point. Returns (names, raster,
+    exact) with exact False: borders only follow the points approximately.
+    """
+    import numpy as np
+    points = points or _read_zone_tab() + SEED_POINTS
+    names = sorted({p[0] for p in points})
+    ids = np.array([names.index(p[0]) + 1 for p in points], dtype=np.uint16)
+    refs = _unit_vectors(np.array([p[1] for p in points]), np.array([p[2] for p in points]))
+    limit = MAX_POINT_DISTANCE_KM / EARTH_RADIUS_KM
+
+    lats, lons = _grid_centers(sub)
+    raster = np.zeros((ROWS * sub, COLS * sub), dtype=np.uint16)
+    tile_radius = math.radians(0.75)  # >= half the diagonal of any 1° tile
+    for row in range(ROWS):
+        for col in range(COLS):
+            center = _unit_vectors(np.array(row - 89.5), np.array(col - 179.5))
+            dist = np.arccos(np.clip(refs @ center, -1, 1))
+            nearest = dist.min()
+            candidates = np.nonzero(dist <= nearest + 2 * tile_radius)[0]
+            ys, xs = slice(row * sub, (row + 1) * sub), slice(col * sub, (col + 1) * sub)
+            if len(candidates) == 1 and (nearest + tile_radius < limit or nearest - tile_radius > limit):
+                raster[ys, xs] = ids[candidates[0]] if nearest < limit else 0
+                continue
+            cells = _unit_vectors(*np.meshgrid(lats[ys], lons[xs], indexing="ij"))
+            cell_dist = np.arccos(np.clip(cells @ refs[candidates].T, -1, 1))
+            best = cell_dist.argmin(axis=-1)
+            raster[ys, xs] = np.where(cell_dist.min(axis=-1) < limit, ids[candidates][best], 0)
+    return names, raster, False
+
+
+def _rasterize(zones, sub):
+    """
+    Even-odd scanline fill of {zone: [polygon, ...]}, each polygon a list of
+    rings given as (lons, lats) sequences; holes cancel out under even-odd.
+    A cell belongs to a polygon when its centre does. Returns (names, raster).
+    """
+    import numpy as np
+    step = 1.0 / sub
+    names = sorted(zones)
+    raster = np.zeros((ROWS * sub, COLS * sub), dtype=np.uint16)
+    for zone_id, name in enumerate(names, 1):
+        for polygon in zones[name]:
+            x0 = np.concatenate([np.asarray(ring[0], dtype=float) for ring in polygon])
+            y0 = np.concatenate([np.asarray(ring[1], dtype=float) for ring in polygon])
+            x1 = np.concatenate([np.roll(np.asarray(ring[0], dtype=float), -1) for ring in polygon])
+            y1 = np.concatenate([np.roll(np.asarray(ring[1], dtype=float), -1) for ring in polygon])
+            # Rows whose centre lies in [min(y0, y1), max(y0, y1)) cross the edge
+            first = np.ceil((np.minimum(y0, y1) + 90) / step - 0.5).astype(np.int64)
+            stop = np.ceil((np.maximum(y0, y1) + 90) / step - 0.5).astype(np.int64)
+            counts = stop - first
+            edges = np.repeat(np.arange(len(x0)), counts)
+            if not len(edges):
+                continue
+            rows = np.repeat(first, counts) + np.arange(len(edges)) - np.repeat(np.cumsum(counts) - counts, counts)
+            y = -90 + (rows + 0.5) * step
+            e0, e1 = (x0[edges], y0[edges]), (x1[edges], y1[edges])
+            xs = e0[0] + (y - e0[1]) * (e1[0] - e0[0]) / (e1[1] - e0[1])
+            order = np.lexsort((xs, rows))
+            rows, cols = rows[order], np.ceil((xs[order] + 180) / step - 0.5).astype(np.int64)
+            for row, start, end in zip(rows[0::2], cols[0::2], cols[1::2]):
+                raster[row, max(start, 0):min(end, COLS * sub)] = zone_id
+    return names, raster
+
+
+def _fill_coast(raster, cells=COAST_CELLS):
+    """Gives empty cells within `cells` steps of a zone that zone's id (first neighbour wins)."""
+    import numpy as np
+    for _ in range(cells):
+        grown = raster.copy()
+        for shift, axis in ((1, 0), (-1, 0), (1, 1), (-1, 1)):
+            neighbour = np.roll(raster, shift, axis=axis)
+            if axis == 0:  # no wrap across the poles
+                neighbour[0 if shift == 1 else -1] = 0
+            empty = grown == 0
+            grown[empty] = neighbour[empty]
+        raster = grown
+    return raster
+
+
+def build_from_timezonefinder(sub=POLYGON_SUB):
+    """
+    Rasterizes the timezone-boundary-builder polygons bundled with timezonefinder
+    (6.x). The Etc/ ocean zones are skipped: nominal_timezone covers open sea.
+    Returns (names, raster, exact).
+    """
+    from timezonefinder import TimezoneFinder
+    finder = TimezoneFinder()
+    zones = {}
+    for name in finder.timezone_names:
+        if name.startswith("Etc/"):
+            continue
+        # [[polygon, hole, ...], ...] with each ring as ([lngs], [lats])
+        zones[name] = finder.get_geometry(tz_name=name, coords_as_pairs=False)
+    names, raster = _rasterize(zones, sub)
+    return names, _fill_coast(raster), True
+
+
+def build_from_geojson(path, sub=POLYGON_SUB):
+    """Rasterizes timezone polygons (features with a "tzid" property). Returns (names, raster, exact)."""
+    import json
+    with open(path, encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    zones = {}
+    for feat in features:
+        name = feat["properties"]["tzid"]
+        if name.startswith("Etc/"):
+            continue
+        geometry = feat["geometry"]
+        polygons = geometry["coordinates"]
+        if geometry["type"] == "Polygon":
+            polygons = [polygons]
+        zones.setdefault(name, []).extend(
+            [[tuple(zip(*ring)) for ring in polygon] for polygon in polygons])
+    names, raster = _rasterize(zones, sub)
+    return names, _fill_coast(raster), True
+
+
+def encode(built):
+    """Packs (names, raster, exact) into the two-level index file format."""
+    import numpy as np
+    names, raster, exact = built
+    sub = raster.shape[0] // ROWS
+    tiles = raster.reshape(ROWS, sub, COLS, sub).swapaxes(1, 2)
+    uniform = (tiles.min(axis=(2, 3)) == tiles.max(axis=(2, 3)))
+    table = tiles[:, :, 0, 0].astype(np.int32)
+    mixed = np.nonzero(~uniform)
+    table[mixed] = -1 - np.arange(len(mixed[0]), dtype=np.int32)
+    blocks = np.ascontiguousarray(tiles[mixed], dtype=np.uint16)
+
+    names_blob = "\n".join(names).encode()
+    flags = FLAG_EXACT if exact else 0
+    header = _HEADER.pack(MAGIC, VERSION, sub, len(names), len(names_blob), len(blocks), flags)
+    padding = b"\0" * (-(len(header) + len(names_blob)) % 4)
+    return header + names_blob + padding + table.astype("<i4").tobytes() + blocks.astype("<u2").tobytes()
+
+
+def _write(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def write_index(path, built):
+    """Writes the encoded index to path, gzipped when path ends in .gz. Returns the size written."""
+    data = encode(built)
+    if path.endswith(".gz"):
+        data = gzip.compress(data, mtime=0)
+    _write(path, data)
+    return len(data)
+
+
+def _offsets(name):
+    """UTC offsets of a zone in mid-January and mid-July, which tells DST rules apart."""
+    from datetime import datetime
+    tz = get_tz(name)
+    return tuple(tz.utcoffset(datetime(2026, month, 15, 12)) for month in (1, 7))
+
+
+def check(index=None):
+    """
+    Reference cities whose looked-up zone keeps different time from the
+    expected one, as (city, got, expected). Zones that only differ in name
+    (Europe/Kiev and Europe/Kyiv) count as matches.
+    """
+    index = index or _load()
+    mismatches = []
+    for city, lat, lon, zone in REFERENCE_CITIES:
+        got = index.zone_at(lat, lon) or nominal_timezone(lon)
+        if got != zone and _offsets(got) != _offsets(zone):
+            mismatches.append((city, got, zone))
+    return mismatches
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Offline timezone index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="(re)build the index file")
+    source = build.add_mutually_exclusive_group()
+    source.add_argument("--timezonefinder", action="store_true",
+                        help="polygons bundled with the timezonefinder package")
+    source.add_argument("--geojson", help="timezone-boundary-builder combined.json")
+    build.add_argument("--sub", type=int, help=f"cells per 1° tile side (default {POLYGON_SUB} "
+                                               f"for polygons, {DEFAULT_SUB} for points)")
+    build.add_argument("--out", default=TZ_INDEX_PATH)
+    commands.add_parser("check", help="look up the reference cities")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        if args.timezonefinder:
+            built = build_from_timezonefinder(args.sub or POLYGON_SUB)
+        elif args.geojson:
+            built = build_from_geojson(args.geojson, args.sub or POLYGON_SUB)
+        else:
+            built = build_from_points(args.sub or DEFAULT_SUB)
+        size = write_index(args.out, built)
+        kind = "exact" if built[2] else "approximate"
+        print(f"Wrote {args.out} ({size / 1e6:.1f} MB, {len(built[0])} zones, {kind})")
+    else:
+        mismatches = check()
+        for city, got, expected in mismatches:
+            print(f"{city}: got {got}, expected {expected}")
+        print(f"{len(REFERENCE_CITIES) - len(mismatches)}/{len(REFERENCE_CITIES)} reference cities match")
+        raise SystemExit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,18 @@
 import streamlit as st
+import streamlit.components.v1 as components
 from datetime import datetime, timedelta
-import pytz
-import time as time_sleep
-# Ensure PRAYER_ORDER, REGION_RECOMMENDATIONS, METHOD_NAMES, METHOD_DESCRIPTIONS are imported
-from config import METHOD_NAMES, REGION_RECOMMENDATIONS, METHOD_DESCRIPTIONS, PRAYER_ORDER 
+import time
+from config import METHOD_NAMES, REGION_RECOMMENDATIONS, METHOD_DESCRIPTIONS
 from geo import location_ui
-from api import fetch_prayer_times
-from notifier import send_sms
+from api import fetch_method_comparison, get_prayer_times, stored_timings
+from astro import compute_prayer_times
+from prayer_schedule import compile_schedule
+from scheduler import add_subscription
+from tz_index import get_tz
+from instrumentation import configure_logging, start_metrics_server, timed
+from warmup import start_warmup
 
+@timed()
 def render_header():
     """Renders the main header and sets page config."""
     st.set_page_config(page_title="Islamic Prayer Times", page_icon="🕌", layout="centered")
@@ -17,6 +22,7 @@ def render_header():
         "with a live countdown to the next prayer."
     )
 
+@timed()
 def render_settings_in_sidebar():
     """Renders all settings (location, calculation, madhab) in the Streamlit sidebar."""
     st.sidebar.title("📍 Location Input")
@@ -45,38 +51,49 @@ def render_settings_in_sidebar():
         
     return lat, lon, city, method, school
 
-def get_next_prayer(times, timezone):
+@timed()
+def get_next_prayer(times, timezone, tomorrow_times=None):
     """Calculates the next prayer, its time, and the remaining time in seconds."""
-    user_tz = pytz.timezone(timezone)
-    now_utc = datetime.now(pytz.utc)
-    now_local = now_utc.astimezone(user_tz)
+    today = datetime.now(get_tz(timezone)).date()
+    # Without tomorrow's timetable, today's times stand in for it
+    days = {today: times, today + timedelta(days=1): tomorrow_times or times}
+    return compile_schedule(days, timezone).next_prayer()
 
-    for prayer in PRAYER_ORDER:
-        if prayer in times:
-            try:
-                prayer_time_obj = datetime.strptime(times[prayer], "%H:%M").time()
-                prayer_datetime = user_tz.localize(datetime.combine(now_local.date(), prayer_time_obj))
-
-                if prayer_datetime > now_local:
-                    time_diff_seconds = (prayer_datetime - now_local).total_seconds()
-                    return prayer, prayer_datetime, int(time_diff_seconds)
-            except ValueError:
-                continue
-    
-    # If all prayers are done, find Fajr of the next day
-    try:
-        fajr_time_str = times.get("Fajr")
-        if fajr_time_str:
-            fajr_time_obj = datetime.strptime(fajr_time_str, "%H:%M").time()
-            tomorrow_date = now_local.date() + timedelta(days=1)
-            fajr_datetime = user_tz.localize(datetime.combine(tomorrow_date, fajr_time_obj))
-            time_diff_seconds = (fajr_datetime - now_local).total_seconds()
-            return "Fajr (Tomorrow)", fajr_datetime, int(time_diff_seconds)
-    except (ValueError, KeyError):
-        pass
-
-    return None, None, 0
+@timed()
+def render_countdown(prayer_dt):
+    """
+    Live countdown that ticks in the browser, so the script run returns
+    immediately instead of holding a server thread until prayer time.
+    """
+    target_ms = int(prayer_dt.timestamp() * 1000)
+    server_now_ms = int(time.time() * 1000)
+    components.html(
+        f"""
+        <div id="countdown" style="text-align: center; color: #4CAF50; font-family: sans-serif;
+             font-size: 2rem; font-weight: 600;">⏳ --:--:--</div>
+        <script>
+        const target = {target_ms};
+        const skew = {server_now_ms} - Date.now();  // trust the server clock
+        const el = document.getElementById("countdown");
+        function tick() {{
+            const now = Date.now() + skew;
+            const left = Math.max(0, Math.floor((target - now) / 1000));
+            if (left === 0) {{
+                el.style.fontSize = "1.1rem";
+                el.textContent = "🎉 Prayer time has begun! Refresh for new times.";
+                return;
+            }}
+            const pad = n => String(n).padStart(2, "0");
+            el.textContent = `⏳ ${{pad(Math.floor(left / 3600))}}:${{pad(Math.floor(left % 3600 / 60))}}:${{pad(left % 60)}}`;
+            setTimeout(tick, 1000 - (now % 1000));
+        }}
+        tick();
+        </script>
+        """,
+        height=70,
+    )
 
+@timed()
 def render_prayer_times_tab(times, timezone, next_prayer_info):
     """Renders the main tab with prayer times and the next prayer countdown."""
     st.header("Today's Prayer Schedule", anchor=False)
@@ -108,52 +125,54 @@ def render_prayer_times_tab(times, timezone, next_prayer_info):
         st.subheader(f"Next Prayer: {prayer_name} at {prayer_dt.strftime('%H:%M')}", anchor=False)
         
         # Live Countdown Timer (fixed size, takes less vertical space)
-        countdown_col, sms_col = st.columns([0.7, 0.3]) # Adjust column ratio
-        
-        with countdown_col:
-            countdown_placeholder = st.empty()
-            
-            while total_seconds > 0:
-                hours, remainder = divmod(total_seconds, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                
-                # Make countdown large and clear
-                countdown_text = f"<h2 style='text-align: center; color: #4CAF50;'>⏳ {hours:02}:{minutes:02}:{seconds:02}</h2>"
-                countdown_placeholder.markdown(countdown_text, unsafe_allow_html=True)
-                
-                time_sleep.sleep(1)
-                total_seconds -= 1
-                if total_seconds < 1:
-                    countdown_placeholder.success("Prayer time has begun! Refresh for new times.", icon="🎉")
-                    break
-        with sms_col:
-            st.markdown("<div style='height: 40px;'></div>", unsafe_allow_html=True) # Spacer
-            if next_prayer_info[2] <= 5 * 60: # within 5 minutes
-                if st.button("Send SMS Reminder", type="primary", use_container_width=True):
-                    with st.spinner("Sending SMS..."):
-                        result = send_sms(prayer_name, prayer_dt.strftime('%H:%M'))
-                        if "Error" in result:
-                            st.error(result)
-                        else:
-                            st.success(f"✅ SMS sent successfully! SID: {result}")
-            else:
-                st.info("SMS option appears 5 min before prayer.", icon="⏱️")
+        render_countdown(prayer_dt)
     else:
         st.success("All prayers for today seem to be complete. See you tomorrow for Fajr!", icon="✅")
 
 
-def render_details_tab(times):
-    """Renders the secondary tab with additional times and regional recommendations."""
-    print("DEBUG: Entering render_details_tab") # Debug print
-    
+@timed()
+def render_sms_signup(lat, lon, timezone, method, school):
+    """Subscribes a phone number to daily reminders sent by the scheduler process."""
+    with st.expander("🔔 SMS prayer reminders"):
+        with st.form("sms_signup", clear_on_submit=True):
+            phone = st.text_input("Phone number", placeholder="+15551234567")
+            lead = st.number_input("Minutes before each prayer", min_value=0, max_value=120, value=5)
+            if st.form_submit_button("Subscribe", type="primary"):
+                if not phone.startswith("+") or not phone[1:].isdigit():
+                    st.error("Enter the number in international format, e.g. +15551234567.")
+                else:
+                    add_subscription(phone, lat, lon, timezone, method, school, int(lead))
+                    st.success(f"✅ Reminders for {phone} will be sent {int(lead)} min before each prayer.")
+
+
+@timed()
+def render_method_comparison(rows, method, times=None, school=0):
+    """
+    Table of today's times under every calculation method; the selected one is
+    marked and, given the main tab's `times`, shows exactly those times.
+    """
+    st.subheader("Compare Calculation Methods", anchor=False)
+    st.caption("Today's times for your location under each method. Only Asr depends on the madhab.")
+    selected = METHOD_NAMES[method]
+    shown = {}
+    if times:
+        shown = {key: times[key] for key in ("Fajr", "Sunrise", "Dhuhr", "Maghrib", "Isha") if key in times}
+        if "Asr" in times:
+            shown["Asr (Hanafi)" if school == 1 else "Asr"] = times["Asr"]
+    table = [dict(row, **shown, Method=f"✅ {row['Method']}") if row["Method"] == selected else row
+             for row in rows]
+    st.dataframe(table, hide_index=True, use_container_width=True)
+
+
+@timed()
+def render_details_tab(times, comparison=None, method=None, school=0):
+    """Renders the secondary tab with additional times, a method comparison and regional recommendations."""
     st.subheader("Additional Times", anchor=False)
     
     # Filter out main prayers and sunrise from additional times
     main_prayers_and_sunrise = {"Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha"}
     other_times = {k: v for k, v in times.items() if k not in main_prayers_and_sunrise}
     
-    print(f"DEBUG: other_times (from API response): {other_times}") # Debug print
-    
     if other_times:
         # Display as a table for better readability
         st.table(other_times)
@@ -161,10 +180,10 @@ def render_details_tab(times):
         # This message will now be explicitly shown if no additional times are provided by API
         st.info("No additional times available with the selected calculation method or API response.", icon="💡")
 
+    if comparison:
+        render_method_comparison(comparison, method, times, school)
+
     st.subheader("Regional Method Recommendations", anchor=False)
-    
-    print(f"DEBUG: REGION_RECOMMENDATIONS content: {REGION_RECOMMENDATIONS}") # Debug print
-    print(f"DEBUG: METHOD_NAMES content: {METHOD_NAMES}") # Debug print
 
     if REGION_RECOMMENDATIONS and METHOD_NAMES:
         for region, methods in REGION_RECOMMENDATIONS.items():
@@ -176,9 +195,26 @@ def render_details_tab(times):
             st.text(f"**{region}:** {method_list}") # Keeping bold for region, simplifying list join
     else:
         st.warning("Regional recommendations not available. Check config.py.", icon="⚠️")
-    print("DEBUG: Exiting render_details_tab") # Debug print
 
 
+@timed()
+def render_freshness(freshness):
+    """Tells the user when the times shown are not freshly fetched."""
+    if freshness["stale"]:
+        st.warning(
+            f"Showing the last known timetable (from {freshness['as_of']:%d %b %Y}) while fresh "
+            "times are fetched in the background. Refresh the page in a moment.",
+            icon="🕒"
+        )
+    elif freshness["source"] == "fallback":
+        st.info(
+            "The prayer times service is unreachable, so these times were calculated "
+            "locally and the timezone may be approximate.",
+            icon="🛰️"
+        )
+
+
+@timed()
 def render_footer():
     """Renders the footer."""
     st.divider()
@@ -192,6 +228,8 @@ def render_footer():
 
 def main():
     """Main function to run the Streamlit app."""
+    configure_logging()
+    start_metrics_server()
     render_header() # Renders main title and intro
 
     # Render settings in the sidebar and get inputs
@@ -204,12 +242,13 @@ def main():
     try:
         # Fetch prayer times and timezone once
         with st.spinner("Fetching prayer times..."):
-            times, timezone = fetch_prayer_times(lat, lon, method, school)
+            times, timezone, freshness = get_prayer_times(lat, lon, method, school)
         
         # Display current location and time at the top of the main content
         st.markdown(f"### Prayer times for **{city or 'Your Location'}** ({timezone})")
+        render_freshness(freshness)
         
-        current_time_display = datetime.now(pytz.timezone(timezone)).strftime("%H:%M:%S")
+        current_time_display = datetime.now(get_tz(timezone)).strftime("%H:%M:%S")
         st.metric("Current Local Time", current_time_display, help=f"Your device's local time: {datetime.now().strftime('%H:%M:%S')}")
         
         st.markdown(f"Calculation Method: **{METHOD_NAMES[method]}**")
@@ -219,16 +258,26 @@ def main():
         tab1, tab2 = st.tabs(["Prayer Times", "Details & Recommendations"])
 
         with tab1:
-            render_prayer_times_tab(times, timezone, get_next_prayer(times, timezone))
+            tomorrow = datetime.now(get_tz(timezone)).date() + timedelta(days=1)
+            stored = stored_timings(lat, lon, method, school, tomorrow)
+            if stored:
+                tomorrow_times = stored[0]
+            else:
+                tomorrow_times, _ = compute_prayer_times(lat, lon, method, school, timezone, tomorrow)
+            render_prayer_times_tab(times, timezone, get_next_prayer(times, timezone, tomorrow_times))
+            render_sms_signup(lat, lon, timezone, method, school)
 
         with tab2:
-            render_details_tab(times) # This should now display content if data is present
+            today = datetime.now(get_tz(timezone)).date()
+            comparison = fetch_method_comparison(round(lat, 4), round(lon, 4), timezone, today)
+            render_details_tab(times, comparison, method, school) # This should now display content if data is present
             
     except Exception as e:
         st.error(f"❌ Failed to fetch prayer times: {e}", icon="🔥")
         st.warning("Please check your internet connection or try different settings in the sidebar.", icon="💡")
     
     render_footer() # Renders footer
+    start_warmup() # Fills the cache for popular locations once the first page is out
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,130 @@
+# warmup.py
+"""
+Startup warm-up: caches the timetables of popular locations before their
+first visitors arrive.
+
+    python warmup.py [locations.csv] [--days 2]
+
+The locations CSV has the timetable_store.read_locations columns (id, lat,
+lon and optionally method, school, timezone) and defaults to
+config.WARMUP_LOCATIONS. Timezones are resolved and their tz objects built,
+then the days around today are computed for every location in one batch
+pass (or, with PRAYER_TIME_SOURCE=aladhan, the current month is pulled from
+Aladhan) and written to the persistent timetable cache. Run it once before
+starting the app replicas that share the cache; the app itself calls
+start_warmup() after its first render, in a background thread.
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from config import PRAYER_TIME_SOURCE, WARMUP_DAYS, WARMUP_LOCATIONS
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_started = False
+
+
+def warm_up(locations, days=WARMUP_DAYS):
+    """Caches `days` days of timetables (from today) for each Location. Returns stats."""
+    import timetable_cache
+    from tz_index import get_tz, timezone_at
+
+    started = time.perf_counter()
+    timezones = [loc.timezone or timetable_cache.get_timezone(loc.lat, loc.lon) or timezone_at(loc.lat, loc.lon)
+                 for loc in locations]
+    for name in set(timezones):
+        get_tz(name)
+    if PRAYER_TIME_SOURCE == "aladhan":
+        failed = _prefetch_from_aladhan(locations)
+    else:
+        _compute_locally(locations, timezones, days)
+        failed = 0
+    stats = {"locations": len(locations), "failed": failed, "days": days,
+             "seconds": round(time.perf_counter() - started, 3)}
+    logger.info(f"Warm-up done: {stats}")
+    return stats
+
+
+def _compute_locally(locations, timezones, days):
+    import timetable_cache
+    from batch import compute_timetable, row_to_timings
+
+    # Local dates run from a day behind UTC to a day ahead of it
+    start = datetime.now(pytz.utc).date() - timedelta(days=1)
+    end = start + timedelta(days=days + 1)
+    dates, table = compute_timetable([loc.lat for loc in locations], [loc.lon for loc in locations],
+                                     [loc.method for loc in locations], [loc.school for loc in locations],
+                                     start, end, timezones)
+    dates = dates.astype(object)
+    for loc, timezone, rows in zip(locations, timezones, table):
+        timetable_cache.put_many(loc.lat, loc.lon, loc.method, loc.school, timezone,
+                                 {day: row_to_timings(row) for day, row in zip(dates, rows)})
+
+
+def _prefetch_from_aladhan(locations):
+    import requests
+
+    from api import prefetch_month
+
+    today = datetime.now(pytz.utc).date()
+    failed = 0
+    for loc in locations:
+        try:
+            prefetch_month(loc.lat, loc.lon, loc.method, loc.school, today.year, today.month)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Warm-up of {loc.id} from Aladhan failed: {e}")
+            failed += 1
+    return failed
+
+
+def start_warmup(path=WARMUP_LOCATIONS, days=WARMUP_DAYS):
+    """Runs warm_up for the locations CSV in a daemon thread, once per process. No-op when unset."""
+    global _started
+    if not path:
+        return None
+    with _lock:
+        if _started:
+            return None
+        _started = True
+    thread = threading.Thread(target=_warm_up_file, args=(path, days), name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def _warm_up_file(path, days):
+    from timetable_store import read_locations
+
+    try:
+        warm_up(read_locations(path), days)
+    except Exception as e:
+        # Only the cache stays cold; requests compute their own timetables
+        logger.warning(f"Warm-up from {path} failed: {e}")
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Prefill the timetable cache for popular locations")
+    parser.add_argument("locations", nargs="?", default=WARMUP_LOCATIONS,
+                        help="CSV with id, lat, lon[, method, school, timezone] (default: WARMUP_LOCATIONS)")
+    parser.add_argument("--days", type=int, default=WARMUP_DAYS)
+    args = parser.parse_args(argv)
+    if not args.locations:
+        parser.error("no locations CSV given and WARMUP_LOCATIONS is not set")
+
+    from timetable_store import read_locations
+
+    stats = warm_up(read_locations(args.locations), args.days)
+    print(json.dumps(stats))
+    if stats["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()